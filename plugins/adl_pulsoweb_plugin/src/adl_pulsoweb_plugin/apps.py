@@ -9,5 +9,8 @@ class PluginNameConfig(AppConfig):
 
     def ready(self):
         from .plugins import PulsoWebPlugin
+        # Connects the receivers keeping the context snapshots and the
+        # compiled variable mappings fresh.
+        from . import mappings, snapshots  # noqa: F401
 
         plugin_registry.register(PulsoWebPlugin())
@@ -0,0 +1,267 @@
+import json
+
+import httpx
+import requests
+
+from .client import (
+    COMPRESS_REQUESTS,
+    CONTEXT_PATH,
+    DEFAULT_TIMEOUT,
+    POOL_MAXSIZE,
+    TransferSize,
+    category_for_status,
+    encode_payload,
+    parse_observation_data,
+)
+from .breaker import CircuitBreaker
+from .context import PulsoWebContext
+from .context_cache import aget_or_refresh_context
+from .ratelimit import get_rate_limiter
+
+
+def _httpx_timeout(timeout):
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+    else:
+        connect = read = timeout
+
+    # pool=None: a fan-out queues for a free socket for as long as it takes,
+    # rather than failing calls the source never saw.
+    return httpx.Timeout(read, connect=connect, pool=None)
+
+
+def _as_requests_error(e):
+    """
+    Returns the requests exception a blocking client would have raised for an
+    httpx transport failure.
+
+    Core resolves ConnectionError and ReadTimeout from the type alone, and the
+    source checks catch requests.RequestException, so both clients must fail
+    in one vocabulary.
+    """
+
+    if isinstance(e, httpx.ConnectTimeout):
+        return requests.ConnectTimeout(str(e))
+
+    if isinstance(e, httpx.ReadTimeout):
+        return requests.ReadTimeout(str(e))
+
+    if isinstance(e, httpx.TimeoutException):
+        return requests.Timeout(str(e))
+
+    return requests.ConnectionError(str(e))
+
+
+def _as_requests_response(response):
+    converted = requests.Response()
+    converted.status_code = response.status_code
+    converted.reason = response.reason_phrase
+    converted.url = str(response.url)
+    converted.headers.update(response.headers)
+    converted._content = response.content
+
+    return converted
+
+
+class AsyncPulsoWebClient:
+    """
+    The asyncio counterpart of PulsoWebClient, for fanning many calls out
+    from one event loop.
+
+    It shares the blocking client's context cache and raises the same
+    exceptions, stamped the same way. Use it as an async context manager, or
+    call aclose() when done: the pooled connections are its own.
+    """
+
+    def __init__(self, baseurl, token, connection_id, use_cache=True, timeout=None, retries=None,
+                 max_connections=None, compress_requests=None):
+        self.baseurl = baseurl
+        self.token = token
+        self.connection_id = connection_id
+        self.use_cache = use_cache
+        self.timeout = DEFAULT_TIMEOUT if timeout is None else timeout
+        self.retries = retries
+        self.max_connections = POOL_MAXSIZE if max_connections is None else max_connections
+        self.compress_requests = COMPRESS_REQUESTS if compress_requests is None else compress_requests
+        self.last_transfer = None
+        self._client = None
+        self._indexed_context = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            # httpx retries only connection failures, which is the part of
+            # urllib3's policy a POST may safely repeat.
+            transport = httpx.AsyncHTTPTransport(
+                retries=self.retries or 0,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+            )
+            self._client = httpx.AsyncClient(transport=transport, timeout=_httpx_timeout(self.timeout))
+
+        return self._client
+
+    async def post(self, path, payload=None):
+        if payload is None:
+            payload = {}
+
+        payload = {
+            "key": self.token,
+            **payload
+        }
+
+        url = f"{self.baseurl}/{path}/"
+
+        # Behind the same circuit as PulsoWebClient, source checks excepted.
+        breaker = CircuitBreaker(self.connection_id) if self.use_cache else None
+
+        if breaker is not None:
+            await breaker.acheck()
+
+        try:
+            response = await self._send(url, payload)
+        except requests.RequestException as e:
+            if breaker is not None:
+                await breaker.arecord_failure(e)
+
+            raise
+
+        if breaker is not None:
+            await breaker.arecord_success()
+
+        try:
+            data = response.json()
+        except json.JSONDecodeError as e:
+            raise requests.exceptions.JSONDecodeError(e.msg, e.doc, e.pos) from e
+
+        size, wire_size = response.adl_request_bytes
+        # httpx counts the bytes it downloaded before decoding.
+        self.last_transfer = TransferSize(path, size, wire_size, len(response.content),
+                                          response.num_bytes_downloaded)
+
+        return data
+
+    async def _send(self, url, payload):
+        """
+        Sends the call and returns the response once its status is known to
+        be good, raising what PulsoWebClient raises otherwise.
+        """
+
+        body, headers, size = encode_payload(payload, self.compress_requests)
+
+        try:
+            # Rate limited as PulsoWebClient is, source checks excepted.
+            if self.use_cache:
+                limiter = get_rate_limiter(self.baseurl)
+
+                async with limiter:
+                    response = await self._get_client().post(url, content=body, headers=headers)
+
+                await limiter.arecord(response)
+            else:
+                response = await self._get_client().post(url, content=body, headers=headers)
+        except httpx.TransportError as e:
+            raise _as_requests_error(e) from e
+
+        response.adl_request_bytes = (size, len(body))
+
+        if response.is_error:
+            converted = _as_requests_response(response)
+            error = requests.HTTPError(f"{response.status_code} Error: {response.reason_phrase} for url: {url}",
+                                       response=converted)
+
+            # Stamped exactly as PulsoWebClient.post() stamps.
+            category = category_for_status(response.status_code)
+
+            if category:
+                error.adl_category = category
+                error.adl_layer = 5
+
+            raise error
+
+        return response
+
+    async def get_context(self):
+        # As in PulsoWebClient.get_context(): a source check never reads or
+        # writes the cache.
+        if not self.use_cache:
+            return await self.post(CONTEXT_PATH)
+
+        return (await self.get_indexed_context()).raw
+
+    async def get_indexed_context(self):
+        """
+        Returns the context as a PulsoWebContext, fetched and indexed once
+        for the life of this client.
+        """
+
+        if self._indexed_context is None:
+            if self.use_cache:
+                context = await aget_or_refresh_context(self.connection_id, lambda: self.post(CONTEXT_PATH))
+            else:
+                context = PulsoWebContext(await self.post(CONTEXT_PATH))
+
+            self._indexed_context = context
+
+        return self._indexed_context
+
+    async def get_observations_metadata(self):
+        return (await self.get_indexed_context()).observations
+
+    async def get_granularities_metadata(self):
+        return (await self.get_indexed_context()).granularities
+
+    async def get_stations_metadata(self):
+        return (await self.get_indexed_context()).stations
+
+    async def get_granularities(self):
+        return await self.get_granularities_metadata()
+
+    async def get_observations_for_granular(self, gran_code, include_stations_count=True):
+        context = await self.get_indexed_context()
+        return context.get_observations_for_granular(gran_code, include_stations_count)
+
+    async def get_stations_with_obs(self, obs_code):
+        return (await self.get_indexed_context()).get_stations_with_obs(obs_code)
+
+    async def get_stations_for_granularity(self, gran_code):
+        return (await self.get_indexed_context()).get_stations_for_granularity(gran_code)
+
+    async def get_structured_data(self):
+        return (await self.get_indexed_context()).get_structured_data()
+
+    async def get_observation_by_code(self, obs_code):
+        return (await self.get_indexed_context()).get_observation_by_code(obs_code)
+
+    async def get_granularity_by_code(self, gran_code):
+        return (await self.get_indexed_context()).get_granularity_by_code(gran_code)
+
+    async def get_observation_data(self, station_code, observations, start_date, end_date):
+        payload = {
+            "station": station_code,
+            "observations": observations,
+            "from": start_date,
+            "to": end_date
+        }
+
+        response = await self.post("get_data", payload)
+
+        return parse_observation_data(response)
+
+    async def get_logs(self, start_date, end_date):
+        payload = {
+            "from": start_date,
+            "to": end_date
+        }
+
+        return await self.post("get_logs", payload)
@@ -0,0 +1,83 @@
+from datetime import timedelta
+
+# The most raw items one get_data call should return. Sized to come back well
+# inside DEFAULT_TIMEOUT's read timeout on a slow link.
+MAX_ITEMS_PER_CALL = 20000
+
+# The density the first chunk of a window is sized for, per observation. The
+# context names granularities but carries no duration for them, so the first
+# chunk assumes the finest resolution PulsoWeb stations report at, ten
+# minutes; every later chunk is sized from the density the source actually
+# returned.
+ASSUMED_ITEMS_PER_HOUR = 6
+
+MIN_CHUNK = timedelta(hours=1)
+MAX_CHUNK = timedelta(days=31)
+
+
+class BackfillPlanner:
+    """
+    Splits a window into consecutive chunks, each sized so that one get_data
+    call returns at most MAX_ITEMS_PER_CALL items.
+
+    Iterate it for (start, end) pairs and report each chunk's item count to
+    record() before taking the next: the next chunk is resized from it.
+    Adjacent chunks share their boundary instant, because whether the source
+    treats "to" as inclusive is not documented, and a shared instant is
+    merged where a skipped one would be lost.
+    """
+
+    def __init__(self, start_date, end_date, observation_count):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.observation_count = max(observation_count, 1)
+        self.items_per_hour = ASSUMED_ITEMS_PER_HOUR * self.observation_count
+        self._last_span = None
+
+    @property
+    def chunk_span(self):
+        # Whole hours, so chunk boundaries read cleanly in logs.
+        hours = int(MAX_ITEMS_PER_CALL / max(self.items_per_hour, 1))
+
+        return min(max(timedelta(hours=hours), MIN_CHUNK), MAX_CHUNK)
+
+    def record(self, sources_count):
+        """
+        Resizes the next chunk from the density the last one came back with.
+        An empty chunk says nothing about density, a station offline for a
+        month included, so it leaves the size alone.
+        """
+
+        if self._last_span is None or not sources_count:
+            return
+
+        self.items_per_hour = sources_count / (self._last_span / timedelta(hours=1))
+
+    def __iter__(self):
+        # A window with no length is still asked for, once, as it always was:
+        # what the source says about it is the source's to say.
+        if self.start_date >= self.end_date:
+            self._last_span = None
+            yield self.start_date, self.end_date
+            return
+
+        chunk_start = self.start_date
+
+        while chunk_start < self.end_date:
+            chunk_end = min(chunk_start + self.chunk_span, self.end_date)
+            self._last_span = chunk_end - chunk_start
+
+            yield chunk_start, chunk_end
+
+            chunk_start = chunk_end
+
+
+def merge_records(merged, records):
+    """
+    Merges one chunk's records into `merged`, a dict keyed by observation
+    time, so a row on a shared chunk boundary is one row.
+    """
+
+    for record in records:
+        row = merged.setdefault(record["observation_time"], {})
+        row.update(record)
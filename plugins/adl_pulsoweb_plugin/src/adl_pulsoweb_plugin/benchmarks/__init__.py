@@ -0,0 +1,8 @@
+"""
+Offline benchmarks for the client and the context index, over synthetic
+PulsoWeb payloads. Run them with ``python -m adl_pulsoweb_plugin.benchmarks``;
+see ``__main__`` for the options.
+
+``stub_server`` is a fake PulsoWeb API serving the same payloads over HTTP,
+and ``load`` drives the plugin against it end to end.
+"""
@@ -0,0 +1,75 @@
+"""
+Runs the benchmarks and prints a table, optionally saving the results as a
+baseline or comparing them against one:
+
+    python -m adl_pulsoweb_plugin.benchmarks --save baseline.json
+    python -m adl_pulsoweb_plugin.benchmarks --compare baseline.json
+
+A comparison exits non-zero when any benchmark is slower than the baseline by
+more than --tolerance. Baselines are only comparable on the machine that
+wrote them.
+"""
+
+import argparse
+import json
+import sys
+
+from django.conf import settings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m adl_pulsoweb_plugin.benchmarks")
+    parser.add_argument("--stations", type=int, default=10_000)
+    parser.add_argument("--observations", type=int, default=500)
+    parser.add_argument("--granularities", type=int, default=10)
+    parser.add_argument("--data-observations", type=int, default=10,
+                        help="observation codes in each synthetic get_data body")
+    parser.add_argument("--hours", type=int, default=24 * 31,
+                        help="hours of ten-minute data in each synthetic get_data body")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save", metavar="PATH")
+    parser.add_argument("--compare", metavar="PATH")
+    parser.add_argument("--tolerance", type=float, default=1.5,
+                        help="the slowdown over the baseline that fails a comparison")
+    args = parser.parse_args(argv)
+
+    # Outside a configured project, the little the client reads from
+    # settings is left at its defaults.
+    if not settings.configured:
+        settings.configure()
+
+    from .suite import run_all
+
+    results = run_all(args.stations, args.observations, args.granularities, args.data_observations,
+                      args.hours, args.repeat)
+
+    print(f"{'benchmark':<42} {'seconds':>10} {'throughput':>22} {'peak MiB':>10}")
+
+    for result in results:
+        throughput = f"{result.throughput:,.0f} {result.unit}/s"
+        print(f"{result.name:<42} {result.seconds:>10.4f} {throughput:>22} {result.peak_bytes / 2 ** 20:>10.1f}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({result.name: {"seconds": result.seconds, "peak_bytes": result.peak_bytes}
+                       for result in results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+        regressions = [result for result in results
+                       if result.name in baseline
+                       and result.seconds > baseline[result.name]["seconds"] * args.tolerance]
+
+        for result in regressions:
+            print(f"REGRESSION {result.name}: {result.seconds:.4f}s against "
+                  f"{baseline[result.name]['seconds']:.4f}s", file=sys.stderr)
+
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+r"""
+An end-to-end load harness: drives PulsoWebPlugin.get_connection_data(), and
+so get_station_data() for every link, across N synthetic station links
+against the fake server in stub_server, and reports calls per second,
+latency percentiles and the worker's peak memory. Run it in the ADL project's
+environment, with DJANGO_SETTINGS_MODULE set:
+
+    python -m adl_pulsoweb_plugin.benchmarks.load --links 500 --workers 8 \
+        --hours 24 --latency lognormal:0.2,0.5
+
+The fake server runs in a process of its own, so the memory reported is the
+worker's alone. The links are not saved and no database is touched; with the
+cache in use, the run does share the project's cache, under a connection id
+no real connection has.
+"""
+
+import argparse
+import datetime
+import math
+import resource
+import sys
+import time
+import uuid
+from typing import NamedTuple
+
+import requests
+
+from ..client import POOL_MAXSIZE, PulsoWebClient
+from .stub_server import STATS_PATH, StubServerProcess, add_stub_arguments, config_from_arguments
+
+
+class SyntheticConnection:
+    """
+    A connection as get_station_data() duck-types it, pointing at the fake
+    server. Nothing is read from or written to the database.
+    """
+
+    name = "PulsoWeb load harness"
+
+    def __init__(self, url, token, observation_codes, use_cache=True, pool_maxsize=None):
+        self.id = f"load-{uuid.uuid4().hex}"
+        self.api_base_url = url
+        self.api_token = token
+        self.observation_codes = list(observation_codes)
+        self.use_cache = use_cache
+        self.pool_maxsize = pool_maxsize
+        self.logs_cursor = None
+
+    def get_api_client(self, use_cache=None, timeout=None, retries=None, pool_maxsize=None):
+        return PulsoWebClient(self.api_base_url, self.api_token, self.id,
+                              use_cache=self.use_cache if use_cache is None else use_cache,
+                              timeout=timeout, retries=retries,
+                              pool_maxsize=pool_maxsize or self.pool_maxsize)
+
+    def save_logs_cursor(self, cursor):
+        self.logs_cursor = cursor
+
+    def get_latest_observation_times(self, station_links):
+        # Nothing is saved by the harness.
+        return {}
+
+
+class SyntheticStationLink:
+    """
+    A station link with no row behind it. The backfill checkpoint is kept on
+    the instance only, so a run that stops partway resumes within the same
+    harness process just as a saved link would.
+    """
+
+    def __init__(self, connection, code):
+        self.network_connection = connection
+        self.pulsoweb_station_code = code
+        self.station_id = code
+        self.adl_sources_count = None
+        self.backfill_start = None
+        self.backfill_end = None
+        self.backfill_cursor = None
+
+    def get_backfill_resume_date(self, start_date, end_date):
+        # Lazy: the model module needs the Django apps loaded.
+        from ..models import PulsoWebStationLink
+
+        return PulsoWebStationLink.get_backfill_resume_date(self, start_date, end_date)
+
+    def save_backfill_checkpoint(self, start_date=None, end_date=None, cursor=None):
+        self.backfill_start = start_date
+        self.backfill_end = end_date
+        self.backfill_cursor = cursor
+
+    def get_latest_observation_time(self):
+        # Nothing is saved by the harness: every round fetches its whole
+        # window.
+        return None
+
+    def get_variable_mappings(self):
+        # No mappings: nothing is converted, and values go to core as sent.
+        return []
+
+
+def percentile(values, share):
+    """The nearest-rank percentile of `values`, for share between 0 and 1."""
+
+    if not values:
+        return None
+
+    ordered = sorted(values)
+    rank = max(math.ceil(share * len(ordered)), 1)
+
+    return ordered[rank - 1]
+
+
+def peak_rss_bytes():
+    # Kilobytes on Linux, bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class LoadReport(NamedTuple):
+    """
+    One load run: the station fetches get_station_data() made and how many
+    raised, the calls the server answered by "path status", each fetch's
+    latency in seconds, and the worker's peak resident memory.
+    """
+
+    links: int
+    workers: int
+    seconds: float
+    fetches: int
+    failures: int
+    calls: dict
+    latencies: list
+    peak_rss_bytes: int
+
+    @property
+    def requests(self):
+        return sum(self.calls.values())
+
+    @property
+    def requests_per_second(self):
+        return self.requests / self.seconds if self.seconds else float("inf")
+
+    @property
+    def fetches_per_second(self):
+        return self.fetches / self.seconds if self.seconds else float("inf")
+
+    def latency(self, share):
+        return percentile(self.latencies, share)
+
+
+def _server_calls(url):
+    root = url.rsplit("/", 1)[0]
+
+    return requests.get(f"{root}{STATS_PATH}", timeout=10).json()
+
+
+def run_load(url, token, observation_codes, links=100, workers=None, start_date=None, end_date=None,
+             rounds=1, use_cache=True):
+    """
+    Fetches `links` synthetic station links through the plugin, `rounds`
+    times over, `workers` at a time, and returns a LoadReport.
+
+    The concurrency limits of a real run all apply: the connection-level
+    thread pool and, with the cache in use, the shared rate limiter, with
+    its per-host cap, and the circuit breaker. use_cache=False measures the
+    client without them.
+    """
+
+    # Lazy: the plugin module needs the Django apps loaded.
+    from ..plugins import MAX_WORKERS, PulsoWebPlugin
+
+    workers = workers or MAX_WORKERS
+
+    if end_date is None:
+        end_date = datetime.datetime.now(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+    if start_date is None:
+        start_date = end_date - datetime.timedelta(hours=1)
+
+    connection = SyntheticConnection(url, token, observation_codes, use_cache=use_cache,
+                                     pool_maxsize=max(POOL_MAXSIZE, workers))
+    station_links = [SyntheticStationLink(connection, code) for code in range(1, links + 1)]
+
+    plugin = PulsoWebPlugin()
+    get_station_data = plugin.get_station_data
+    latencies = []
+
+    def timed_get_station_data(station_link, start_date=None, end_date=None):
+        started = time.perf_counter()
+
+        try:
+            return get_station_data(station_link, start_date, end_date)
+        finally:
+            # list.append is atomic; no lock needed across the pool.
+            latencies.append(time.perf_counter() - started)
+
+    plugin.get_station_data = timed_get_station_data
+
+    calls_before = _server_calls(url)
+    failures = 0
+    started = time.perf_counter()
+
+    for _ in range(rounds):
+        results = plugin.get_connection_data(connection, start_date, end_date, station_links=station_links,
+                                             max_workers=workers)
+        failures += sum(1 for result in results if result.error is not None)
+
+    seconds = time.perf_counter() - started
+    calls_after = _server_calls(url)
+
+    calls = {key: count - calls_before.get(key, 0) for key, count in calls_after.items()
+             if count != calls_before.get(key, 0)}
+
+    return LoadReport(links, workers, seconds, links * rounds, failures, calls, latencies, peak_rss_bytes())
+
+
+def print_report(report, file=sys.stdout):
+    def ms(value):
+        return "-" if value is None else f"{value * 1000:.1f} ms"
+
+    print(f"links {report.links}, workers {report.workers}, {report.seconds:.2f}s", file=file)
+    print(f"station fetches  {report.fetches} ({report.failures} failed), "
+          f"{report.fetches_per_second:,.1f}/s", file=file)
+    print(f"server calls     {report.requests}, {report.requests_per_second:,.1f}/s", file=file)
+
+    for key, count in sorted(report.calls.items()):
+        print(f"  {key:<24} {count}", file=file)
+
+    print(f"fetch latency    p50 {ms(report.latency(0.50))}, p95 {ms(report.latency(0.95))}, "
+          f"p99 {ms(report.latency(0.99))}", file=file)
+    print(f"worker peak RSS  {report.peak_rss_bytes / 2 ** 20:.1f} MiB", file=file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m adl_pulsoweb_plugin.benchmarks.load")
+    parser.add_argument("--links", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="threads fetching links at once; the plugin's MAX_WORKERS when omitted")
+    parser.add_argument("--hours", type=int, default=1, help="the window each link fetches")
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--data-observations", type=int, default=10,
+                        help="observation codes the synthetic connection maps")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="bypass the shared cache, rate limiter and circuit breaker")
+    parser.add_argument("--url", help="an already running fake server's API base URL")
+    add_stub_arguments(parser)
+    args = parser.parse_args(argv)
+
+    import django
+
+    django.setup()
+
+    config = config_from_arguments(args)
+    observation_codes = [f"OBS{code:04}" for code in range(min(args.data_observations, config.observations))]
+
+    end_date = datetime.datetime.now(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+    start_date = end_date - datetime.timedelta(hours=args.hours)
+
+    def run(url):
+        return run_load(url, config.token, observation_codes, links=args.links, workers=args.workers,
+                        start_date=start_date, end_date=end_date, rounds=args.rounds,
+                        use_cache=not args.no_cache)
+
+    if args.url:
+        report = run(args.url)
+    else:
+        with StubServerProcess(config) as server:
+            report = run(server.url)
+
+    print_report(report)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,357 @@
+r"""
+A fake PulsoWeb REST server, serving get_context, get_data and get_logs from
+synthetic payloads with configurable latency and injected errors. Run it
+alone with
+
+    python -m adl_pulsoweb_plugin.benchmarks.stub_server --port 8765 \
+        --latency lognormal:0.2,0.5 --error 503:0.02
+
+and point a connection's API base URL at http://127.0.0.1:8765/rest, or let
+the load harness start one for itself.
+"""
+
+import argparse
+import datetime
+import functools
+import gzip
+import json
+import math
+import multiprocessing
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple
+
+from . import synthetic
+
+BASE_PATH = "/rest"
+STATS_PATH = "/_stats/"
+TOKEN = "stub-token"
+
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+class Latency(NamedTuple):
+    """
+    How long the server takes over a call, in seconds: "fixed" waits a,
+    "uniform" between a and b, and "lognormal" has median a and shape b.
+    """
+
+    distribution: str = "fixed"
+    a: float = 0.0
+    b: float = 0.0
+
+    def sample(self, rng):
+        if self.distribution == "uniform":
+            return rng.uniform(self.a, self.b)
+
+        if self.distribution == "lognormal":
+            return rng.lognormvariate(math.log(self.a), self.b) if self.a > 0 else 0.0
+
+        return self.a
+
+    @classmethod
+    def parse(cls, value):
+        """Reads "fixed:0.1", "uniform:0.05,0.3" or "lognormal:0.2,0.5"."""
+
+        distribution, _, params = value.partition(":")
+
+        if distribution not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"unknown latency distribution {distribution!r}")
+
+        numbers = [float(param) for param in params.split(",") if param]
+
+        return cls(distribution, *numbers)
+
+
+class StubConfig(NamedTuple):
+    """
+    What the fake server serves and how it misbehaves.
+
+    `errors` maps an HTTP status to the share of calls answered with it, for
+    example {503: 0.05, 401: 0.01}; any call may draw one. A call whose key
+    is not `token` is always answered 401. The context has the given numbers
+    of stations, observations and granularities, and get_data sends one item
+    per observation every `step_minutes` of the window asked for.
+    """
+
+    latency: Latency = Latency()
+    errors: dict = {}
+    token: str = TOKEN
+    stations: int = 100
+    observations: int = 20
+    granularities: int = 3
+    step_minutes: int = 10
+    null_rate: float = 0.0
+    logs_per_station: int = 1
+    seed: int = 0
+
+
+@functools.lru_cache(maxsize=256)
+def _data_body(observations, start, end, step_minutes, null_rate):
+    # Every station asked for the same window gets the same body, so a load
+    # run measures the client rather than the stub building payloads.
+    start = datetime.datetime.strptime(start, DATE_FORMAT)
+    end = datetime.datetime.strptime(end, DATE_FORMAT)
+    hours = max(1, math.ceil((end - start).total_seconds() / 3600))
+
+    body = synthetic.make_data(observations, hours=hours, step_minutes=step_minutes, start=start,
+                               null_rate=null_rate)
+
+    return json.dumps(body).encode()
+
+
+class StubPulsoWebServer(ThreadingHTTPServer):
+    """
+    The fake server. Bind port 0 for a free port; `url` is the API base URL
+    to configure a connection with. Counts of calls per path and status are
+    kept in `stats`, and served as JSON from /_stats/.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        super().__init__((host, port), StubRequestHandler)
+
+        self.config = config or StubConfig()
+        self.rng = random.Random(self.config.seed)
+        self.rng_lock = threading.Lock()
+        self.stats = {}
+        self.stats_lock = threading.Lock()
+        self.context = synthetic.make_context(self.config.stations, self.config.observations,
+                                              self.config.granularities, seed=self.config.seed)
+        self.context_body = json.dumps(self.context).encode()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+
+        return f"http://{host}:{port}{BASE_PATH}"
+
+    def start(self):
+        """Serves from a daemon thread until stop()."""
+
+        self._thread = threading.Thread(target=self.serve_forever, name="pulsoweb-stub", daemon=True)
+        self._thread.start()
+
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def draw(self):
+        """Returns the delay and the injected status, if any, for one call."""
+
+        with self.rng_lock:
+            delay = self.config.latency.sample(self.rng)
+            roll = self.rng.random()
+
+        for status, rate in self.config.errors.items():
+            if roll < rate:
+                return delay, int(status)
+
+            roll -= rate
+
+        return delay, None
+
+    def count(self, path, status):
+        key = f"{path} {status}"
+
+        with self.stats_lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def logs_body(self, payload):
+        # One upload entry per station, spread over the window asked for.
+        start = datetime.datetime.strptime(payload["from"], DATE_FORMAT)
+        end = datetime.datetime.strptime(payload["to"], DATE_FORMAT)
+        span = max((end - start).total_seconds(), 0)
+
+        stations = self.context["stations"]
+        total = len(stations) * self.config.logs_per_station
+
+        entries = []
+
+        for index, station in enumerate(stations):
+            for n in range(self.config.logs_per_station):
+                position = index * self.config.logs_per_station + n + 1
+                date = start + datetime.timedelta(seconds=span * position / (total + 1))
+                entries.append({"date": date.strftime(DATE_FORMAT), "station": station["code"],
+                                "message": "Data uploaded"})
+
+        return json.dumps(entries).encode()
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        # Thousands of calls a run; nothing worth printing.
+        pass
+
+    def do_GET(self):
+        if self.path != STATS_PATH:
+            return self.reply(404, {"error": "not found"})
+
+        with self.server.stats_lock:
+            stats = dict(self.server.stats)
+
+        self.reply(200, stats, count=False)
+
+    def do_POST(self):
+        server = self.server
+        path = self.path.rstrip("/").rpartition("/")[2]
+
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+
+        delay, status = server.draw()
+
+        if delay:
+            time.sleep(delay)
+
+        if not self.path.startswith(f"{BASE_PATH}/") or path not in ("get_context", "get_data", "get_logs"):
+            return self.reply(404, {"error": "not found"}, path=path)
+
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            return self.reply(400, {"error": "malformed body"}, path=path)
+
+        if payload.get("key") != server.config.token:
+            return self.reply(401, {"error": "invalid key"}, path=path)
+
+        if status is not None:
+            return self.reply(status, {"error": f"injected {status}"}, path=path)
+
+        if path == "get_context":
+            return self.reply(200, server.context_body, path=path)
+
+        if path == "get_logs":
+            return self.reply(200, server.logs_body(payload), path=path)
+
+        content = _data_body(tuple(payload.get("observations") or ()), payload["from"], payload["to"],
+                             server.config.step_minutes, server.config.null_rate)
+
+        self.reply(200, content, path=path)
+
+    def reply(self, status, body, path=None, count=True):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+
+        if count:
+            self.server.count(path, status)
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _serve(config, host, port, conn):
+    server = StubPulsoWebServer(config, host, port)
+    conn.send(server.url)
+    conn.close()
+    server.serve_forever()
+
+
+class StubServerProcess:
+    """
+    Runs the fake server in a process of its own, so the stub's CPU and
+    memory never count against the worker being measured.
+    """
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or StubConfig()
+        self.host = host
+        self.port = port
+        self.url = None
+        self._process = None
+
+    def start(self):
+        parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+
+        self._process = multiprocessing.Process(target=_serve, name="pulsoweb-stub", daemon=True,
+                                                args=(self.config, self.host, self.port, child_conn))
+        self._process.start()
+        self.url = parent_conn.recv()
+
+        return self
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def parse_errors(values):
+    """Reads --error values such as "503:0.05" into StubConfig.errors."""
+
+    errors = {}
+
+    for value in values or ():
+        status, _, rate = value.partition(":")
+        errors[int(status)] = float(rate)
+
+    return errors
+
+
+def add_stub_arguments(parser):
+    parser.add_argument("--latency", type=Latency.parse, default=Latency(),
+                        help='"fixed:SECONDS", "uniform:LOW,HIGH" or "lognormal:MEDIAN,SIGMA"')
+    parser.add_argument("--error", action="append", metavar="STATUS:RATE",
+                        help="answer a share of calls with STATUS; repeatable")
+    parser.add_argument("--stations", type=int, default=StubConfig.stations)
+    parser.add_argument("--observations", type=int, default=StubConfig.observations)
+    parser.add_argument("--granularities", type=int, default=StubConfig.granularities)
+    parser.add_argument("--step-minutes", type=int, default=StubConfig.step_minutes)
+    parser.add_argument("--null-rate", type=float, default=StubConfig.null_rate)
+
+
+def config_from_arguments(args):
+    return StubConfig(latency=args.latency, errors=parse_errors(args.error), stations=args.stations,
+                      observations=args.observations, granularities=args.granularities,
+                      step_minutes=args.step_minutes, null_rate=args.null_rate)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m adl_pulsoweb_plugin.benchmarks.stub_server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_stub_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = StubPulsoWebServer(config_from_arguments(args), args.host, args.port)
+    print(f"Serving a fake PulsoWeb API at {server.url} (key {server.config.token!r})")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import json
+import time
+import tracemalloc
+from typing import NamedTuple
+from unittest import mock
+
+from ..client import PulsoWebClient
+from ..context import PulsoWebContext
+from . import synthetic
+
+
+class BenchmarkResult(NamedTuple):
+    """
+    One benchmark's measurements: the best of its timed runs, the work each
+    run did (calls, items, rows, whatever `unit` names), and the peak memory
+    Python allocated during one further run.
+    """
+
+    name: str
+    seconds: float
+    work: int
+    unit: str
+    peak_bytes: int
+
+    @property
+    def throughput(self):
+        return self.work / self.seconds if self.seconds else float("inf")
+
+
+def measure(name, run, work, unit, repeat=3):
+    """
+    Times run() `repeat` times and keeps the best, then runs it once more
+    under tracemalloc for its peak. Timed runs are not traced: tracing slows
+    allocation-heavy code several times over.
+    """
+
+    best = None
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return BenchmarkResult(name, best, work, unit, peak)
+
+
+def stub_client(body):
+    """
+    Returns a client whose transport answers every call with `body`, and the
+    patcher doing it; start and stop the patcher around the calls. Nothing
+    is cached, rate limited or shared between calls.
+    """
+
+    client = PulsoWebClient("https://pulsoweb.invalid/rest", "a-token", None, use_cache=False)
+
+    # Encoded here, once, so the timed runs measure parsing and not
+    # serialising the body.
+    content = json.dumps(body).encode()
+    patcher = mock.patch.object(client, "_send_post",
+                                side_effect=lambda *args, **kwargs: synthetic.make_content_response(content))
+
+    return client, patcher
+
+
+def context_benchmarks(stations=synthetic.STATIONS, observations=synthetic.OBSERVATIONS,
+                       granularities=synthetic.GRANULARITIES, repeat=3):
+    raw = synthetic.make_context(stations, observations, granularities)
+    context = PulsoWebContext(raw)
+    granularity_codes = [gran["code"] for gran in raw["granularities"]]
+    observation_codes = [obs["code"] for obs in raw["observations"]]
+
+    def observations_for_granular():
+        for code in granularity_codes:
+            context.get_observations_for_granular(code)
+
+    def stations_with_obs():
+        for code in observation_codes:
+            context.get_stations_with_obs(code)
+
+    return [
+        measure("context.index", lambda: PulsoWebContext(raw), stations, "stations", repeat),
+        measure("context.get_observations_for_granular", observations_for_granular,
+                len(granularity_codes), "calls", repeat),
+        measure("context.get_structured_data", context.get_structured_data, 1, "calls", repeat),
+        measure("context.get_stations_with_obs", stations_with_obs, len(observation_codes), "calls", repeat),
+    ]
+
+
+def observation_data_benchmarks(observations=10, hours=24 * 31, repeat=3):
+    codes = [f"OBS{code:04}" for code in range(observations)]
+    body = synthetic.make_data(codes, hours=hours)
+    items = sum(len(series) for series in body.values())
+
+    client, patcher = stub_client(body)
+
+    def parse(**kwargs):
+        return lambda: client.get_observation_data(5, codes, "from", "to", **kwargs)
+
+    with patcher:
+        return [
+            measure("get_observation_data", parse(), items, "items", repeat),
+            measure("get_observation_data.stream", parse(stream=True), items, "items", repeat),
+            measure("get_observation_data.columnar", parse(columnar=True), items, "items", repeat),
+        ]
+
+
+def run_all(stations=synthetic.STATIONS, observations=synthetic.OBSERVATIONS,
+            granularities=synthetic.GRANULARITIES, data_observations=10, hours=24 * 31, repeat=3):
+    return (context_benchmarks(stations, observations, granularities, repeat)
+            + observation_data_benchmarks(data_observations, hours, repeat))
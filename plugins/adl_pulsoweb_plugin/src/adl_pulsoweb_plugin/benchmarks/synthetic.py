@@ -0,0 +1,101 @@
+import datetime
+import io
+import json
+import random
+
+import requests
+
+# The shape of a large tenant, as the benchmarks default to it.
+STATIONS = 10_000
+OBSERVATIONS = 500
+GRANULARITIES = 10
+OBSERVATIONS_PER_STATION = 20
+
+UNITS = ["°C", "%", "hPa", "m/s", "mm", "W/m²"]
+
+
+def make_context(stations=STATIONS, observations=OBSERVATIONS, granularities=GRANULARITIES,
+                 observations_per_station=OBSERVATIONS_PER_STATION, seed=0):
+    """
+    Returns a get_context body with the given numbers of stations,
+    observations and granularities. Observations are spread over the
+    granularities in turn, and each station reports a random sample of
+    observations_per_station of them. The same seed gives the same body.
+    """
+
+    rng = random.Random(seed)
+
+    granularity_list = [{"code": code, "label": f"Granularity {code}"} for code in range(granularities)]
+
+    observation_list = [{
+        "code": f"OBS{code:04}",
+        "label": f"Observation {code}",
+        "unit": UNITS[code % len(UNITS)],
+        "description": f"Synthetic observation {code}",
+        "granularity": code % granularities if granularities else None,
+    } for code in range(observations)]
+
+    observation_codes = [obs["code"] for obs in observation_list]
+    per_station = min(observations_per_station, observations)
+
+    station_list = [{
+        "code": code,
+        "name": f"Station {code}",
+        "observations": rng.sample(observation_codes, per_station),
+    } for code in range(1, stations + 1)]
+
+    return {
+        "stations": station_list,
+        "observations": observation_list,
+        "granularities": granularity_list,
+    }
+
+
+def make_data(observations=("TEMP", "RH"), hours=24, step_minutes=10,
+              start=datetime.datetime(2026, 1, 1), null_rate=0.0, seed=0):
+    """
+    Returns a get_data body: per observation code, one item every
+    step_minutes over `hours` from `start`. A share null_rate of the values
+    are null, as a source sends a missing reading.
+    """
+
+    rng = random.Random(seed)
+    steps = hours * 60 // step_minutes
+
+    body = {}
+
+    for obs_code in observations:
+        items = []
+
+        for step in range(steps):
+            date = start + datetime.timedelta(minutes=step * step_minutes)
+            value = None if rng.random() < null_rate else round(rng.uniform(-10, 40), 1)
+            items.append({"date": date.strftime("%Y-%m-%dT%H:%M:%S"), "value": value})
+
+        body[obs_code] = items
+
+    return body
+
+
+def make_response(body, status_code=200):
+    """
+    Returns a requests.Response carrying `body` as JSON, readable both whole
+    and as a stream, as a stubbed transport returns it.
+    """
+
+    return make_content_response(json.dumps(body).encode(), status_code)
+
+
+def make_content_response(content, status_code=200):
+    """
+    The same from a body already encoded, so a transport answering many
+    calls with one body encodes it once.
+    """
+
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = content
+    response.raw = io.BytesIO(content)
+    response.headers["Content-Type"] = "application/json"
+
+    return response
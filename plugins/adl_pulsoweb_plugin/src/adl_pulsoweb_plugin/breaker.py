@@ -0,0 +1,163 @@
+import logging
+import time
+
+import requests
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Consecutive failures that open a connection's circuit. Counted across every
+# worker, and only failures that say the source itself is unwell: a refused
+# or timed-out connection, or a 5xx.
+BREAKER_THRESHOLD = 5
+
+# How long an open circuit fails calls without sending them. Past it, one
+# call at a time is let through as a probe: success closes the circuit, and
+# failure opens it for another period.
+BREAKER_OPEN_SECONDS = 120
+
+# How long one worker holds the right to probe. A probe outlives it only by
+# hanging for longer than the read timeout.
+BREAKER_PROBE_LEASE = 90
+
+# How long a failure count lingers with no new failure. A count that old is
+# not "consecutive" in any sense an outage is.
+BREAKER_FAILURE_TTL = 600
+
+# How long an open circuit's record is kept at all, so one for a connection
+# since deleted does not stay in the cache for ever.
+BREAKER_STATE_TTL = 24 * 3600
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """
+    Raised in place of a call while the connection's circuit is open.
+
+    A ConnectionError, so core and the source checks treat it as the outage
+    it stands for. Stamped with the category of the failure that opened the
+    circuit, where that failure carried one.
+    """
+
+
+def _counts(error):
+    if isinstance(error, CircuitOpenError):
+        return False
+
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+
+    return getattr(error, "adl_category", None) == "PROTOCOL_ERROR"
+
+
+class CircuitBreaker:
+    """
+    A connection's circuit, shared by every worker through the Django cache.
+
+    Call check() before sending, then record_success() or record_failure()
+    with what came of it; on an event loop, their a-prefixed forms, which
+    make the cache calls off it.
+    """
+
+    def __init__(self, connection_id):
+        self.connection_id = connection_id
+        self.key = f"pulsoweb_breaker_{connection_id}"
+        # What check() read, so a healthy call's success writes nothing.
+        self._clean = False
+
+    def _open_key(self):
+        return f"{self.key}_open"
+
+    def _failures_key(self):
+        return f"{self.key}_failures"
+
+    def _probe_key(self):
+        return f"{self.key}_probe"
+
+    def check(self):
+        """
+        Returns when a call may be sent, and raises CircuitOpenError when it
+        may not.
+        """
+
+        found = cache.get_many([self._open_key(), self._failures_key()])
+        state = found.get(self._open_key())
+        self._clean = not found
+
+        if state is None:
+            return
+
+        if time.time() >= state["until"] and cache.add(self._probe_key(), 1, BREAKER_PROBE_LEASE):
+            logger.info(f"[ADL_PULSOWEB_PLUGIN] Probing connection {self.connection_id}, whose circuit is open.")
+            return
+
+        error = CircuitOpenError(f"PulsoWeb connection {self.connection_id} failed {BREAKER_THRESHOLD} calls in a "
+                                 f"row; calls are not sent until a probe succeeds.")
+
+        if state.get("category"):
+            error.adl_category = state["category"]
+            error.adl_layer = 5
+
+        raise error
+
+    def record_success(self):
+        """
+        Closes the circuit. Any answer from the host counts, a 401 included:
+        it proves the source is up, which is all the circuit is about.
+        """
+
+        if self._clean:
+            return
+
+        if cache.get(self._open_key()) is not None:
+            logger.info(f"[ADL_PULSOWEB_PLUGIN] Connection {self.connection_id} answered; closing its circuit.")
+
+        cache.delete_many([self._open_key(), self._failures_key(), self._probe_key()])
+
+    def record_failure(self, error):
+        """
+        Counts a failed call, opening the circuit at BREAKER_THRESHOLD. A
+        failure that says nothing of the source's health is an answer, and
+        closes it instead.
+        """
+
+        if not _counts(error):
+            self.record_success()
+            return
+
+        self._clean = False
+
+        failures_key = self._failures_key()
+        cache.add(failures_key, 0, BREAKER_FAILURE_TTL)
+
+        try:
+            failures = cache.incr(failures_key)
+        except ValueError:
+            # Expired between add() and incr().
+            failures = 1
+            cache.set(failures_key, failures, BREAKER_FAILURE_TTL)
+        else:
+            # incr() keeps the expiry add() set; the count lives on from the
+            # latest failure, not the first.
+            cache.touch(failures_key, BREAKER_FAILURE_TTL)
+
+        if failures < BREAKER_THRESHOLD:
+            return
+
+        cache.set(self._open_key(), {
+            "until": time.time() + BREAKER_OPEN_SECONDS,
+            "category": getattr(error, "adl_category", None),
+        }, BREAKER_STATE_TTL)
+        cache.delete(self._probe_key())
+
+        logger.warning(f"[ADL_PULSOWEB_PLUGIN] Opening the circuit of connection {self.connection_id} after "
+                       f"{failures} failed calls in a row: {error}")
+
+    async def acheck(self):
+        await sync_to_async(self.check)()
+
+    async def arecord_success(self):
+        await sync_to_async(self.record_success)()
+
+    async def arecord_failure(self, error):
+        await sync_to_async(self.record_failure)(error)
@@ -0,0 +1,151 @@
+import datetime
+import logging
+from datetime import timedelta
+from datetime import timezone as dt_timezone
+from typing import NamedTuple
+
+from django.conf import settings
+from django.utils import timezone as dj_timezone
+
+from .instrumentation import emit
+
+logger = logging.getLogger(__name__)
+
+# Whether a connection's run, run_process() or get_connection_data(), reads
+# the source's upload logs first and fetches only the stations that logged an
+# upload since the last run. Off by default. A Django setting of the same name
+# says otherwise.
+LOG_DRIVEN = False
+
+# How far before the cursor each read of the logs starts, so an upload logged
+# late is still seen. A station seen again is fetched again, but only from
+# what core has not saved.
+LOGS_OVERLAP = timedelta(minutes=10)
+
+
+def log_driven_enabled():
+    return getattr(settings, "ADL_PULSOWEB_LOG_DRIVEN", LOG_DRIVEN)
+
+
+def _api_date(value):
+    # PulsoWeb API expects dates as UTC string format
+    if value.tzinfo is not None:
+        value = value.astimezone(dt_timezone.utc).replace(tzinfo=None)
+
+    return value.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+class StationChanges(NamedTuple):
+    """
+    What one read of the logs says. `stations` holds the codes of the
+    stations that logged an upload, or is None where the logs could not tell
+    and every station is fetched. `cursor` is where the next read starts,
+    once every fetch of this run has succeeded.
+    """
+
+    stations: frozenset
+    cursor: datetime.datetime
+
+    def needs_fetch(self, station_link, latest_times):
+        """
+        Whether a link is fetched this run. `latest_times` maps station ids
+        to the latest time core has saved for them, as
+        get_latest_observation_times() returns it.
+        """
+
+        if self._fetch_regardless(station_link):
+            return True
+
+        # A link never fetched has history to collect whether or not its
+        # station uploads now.
+        return latest_times.get(station_link.station_id) is None
+
+    def select(self, network_connection, station_links):
+        """
+        Returns, for each link in order, whether it is fetched. The latest
+        saved times of the links the logs leave out are loaded in one query,
+        rather than one per idle link.
+        """
+
+        if self.stations is None:
+            return [True] * len(station_links)
+
+        idle = [station_link for station_link in station_links if not self._fetch_regardless(station_link)]
+        latest_times = network_connection.get_latest_observation_times(idle) if idle else {}
+
+        return [self.needs_fetch(station_link, latest_times) for station_link in station_links]
+
+    def _fetch_regardless(self, station_link):
+        if self.stations is None or str(station_link.pulsoweb_station_code) in self.stations:
+            return True
+
+        # A link still backfilling has history to collect whether or not its
+        # station uploads now.
+        return station_link.backfill_cursor is not None
+
+
+def parse_log_stations(entries):
+    """
+    Returns the codes of the stations a get_logs response names, as strings.
+    Any entry naming a station counts: fetching a station with nothing new
+    costs one call, missing one loses its data until it uploads again.
+    """
+
+    if not isinstance(entries, list):
+        raise ValueError(f"Expected a list of log entries, got {type(entries).__name__}.")
+
+    stations = set()
+
+    for entry in entries:
+        code = entry.get("station") if isinstance(entry, dict) else None
+
+        if code is not None:
+            stations.add(str(code))
+
+    return frozenset(stations)
+
+
+def detect_station_changes(network_connection, pulsoweb_client, now=None, end_date=None):
+    """
+    Reads the connection's upload logs from its cursor up to now, in one
+    get_logs call, and returns the StationChanges they show.
+
+    The cursor returned is the end of the window the run fetches, end_date,
+    where that is before now: an upload logged after the window closed, of
+    data inside it, is then still read by the next run. A naive end_date is
+    UTC, as the API reads it.
+
+    A connection whose logs were never read, or whose logs cannot be read or
+    parsed, has every station fetched: the logs only ever narrow a run, never
+    lose data from it.
+    """
+
+    now = now or dj_timezone.now()
+
+    next_cursor = now
+
+    if end_date is not None:
+        if end_date.tzinfo is None:
+            end_date = end_date.replace(tzinfo=dt_timezone.utc)
+
+        next_cursor = min(now, end_date)
+
+    cursor = network_connection.logs_cursor
+
+    if cursor is None:
+        logger.info(f"[ADL_PULSOWEB_PLUGIN] No logs read yet for {network_connection.name}; "
+                    f"fetching every station once.")
+        return StationChanges(None, next_cursor)
+
+    try:
+        entries = pulsoweb_client.get_logs(_api_date(cursor - LOGS_OVERLAP), _api_date(now))
+        stations = parse_log_stations(entries)
+    except Exception:
+        logger.warning(f"[ADL_PULSOWEB_PLUGIN] Could not read the logs of {network_connection.name}; "
+                       f"fetching every station.", exc_info=True)
+        emit("logs.failed", 1)
+        return StationChanges(None, next_cursor)
+
+    emit("logs.stations", len(stations))
+
+    return StationChanges(stations, next_cursor)
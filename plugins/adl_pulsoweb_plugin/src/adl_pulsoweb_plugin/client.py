@@ -1,15 +1,47 @@
 import datetime
+import gzip
+import json
+import logging
+import os
+import socket
+import threading
+from typing import NamedTuple
 
 import requests
-from django.core.cache import cache
 from requests.adapters import HTTPAdapter, Retry
+from urllib3.connection import HTTPConnection
 
+from .breaker import CircuitBreaker
+from .context import PulsoWebContext
+from .context_cache import get_or_refresh_context
+from .instrumentation import emit, timed
+from .ratelimit import get_rate_limiter
+from .singleflight import flight_key, single_flight
+
+logger = logging.getLogger(__name__)
 
 # Connect and read timeouts applied to every request. Without a bound, a hung
 # source wedges the ingestion worker instead of failing the run.
 DEFAULT_TIMEOUT = (10, 60)
 
-CONTEXT_CACHE_TIMEOUT = 3600
+# Sockets each pooled session keeps open to its host. It must be at least the
+# number of threads posting through one session at once: urllib3 discards
+# every socket above it after use, and the next call pays the handshake again.
+POOL_MAXSIZE = 10
+
+# Seconds a pooled socket may sit idle before the kernel starts keep-alive
+# probes, so a socket a NAT or firewall silently dropped between hourly runs
+# is found dead rather than hung on.
+KEEPALIVE_IDLE = 60
+
+# Whether request bodies are gzipped, and from what size. Off by default: no
+# PulsoWeb tenant has been seen to advertise support for compressed request
+# bodies, and a get_data payload is a few hundred bytes. Responses need no
+# setting: every encoding the installed decoders support (gzip and deflate
+# always, br and zstd with brotli and zstandard installed) is offered on
+# every call, and the source picks.
+COMPRESS_REQUESTS = False
+REQUEST_COMPRESSION_MIN_BYTES = 1024
 
 # The path get_context() dials, relative to the connection's API base URL.
 CONTEXT_PATH = "get_context"
@@ -42,121 +74,376 @@ def category_for_status(status_code):
     return None
 
 
+def _socket_options():
+    options = HTTPConnection.default_socket_options + [
+        (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+    ]
+
+    # Linux only; elsewhere the system default idle time applies.
+    if hasattr(socket, "TCP_KEEPIDLE"):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, KEEPALIVE_IDLE))
+
+    return options
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    """An adapter whose pooled sockets carry TCP keep-alive."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs.setdefault("socket_options", _socket_options())
+        super().init_poolmanager(*args, **kwargs)
+
+
+# One long-lived session per (connection, retry policy) in each process, so a
+# run over hundreds of station links pays the TCP and TLS handshake once
+# rather than once per call. Keyed on the retry policy too: a source check
+# (retries=0) and the ingestion path (retries=None) must not share an adapter.
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _build_session(retries, pool_maxsize):
+    # allowed_methods=False applies the policy to POST too, which urllib3's
+    # default set excludes. Every call this client makes is a POST. With no
+    # policy, max_retries=0 is requests' own default, so the ingestion path
+    # behaves as a bare requests.post() did.
+    max_retries = 0 if retries is None else Retry(total=retries, allowed_methods=False)
+    adapter = KeepAliveAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=max_retries)
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    return session
+
+
+def get_session(connection_id, baseurl, retries=None, pool_maxsize=POOL_MAXSIZE):
+    """
+    Returns the pooled session for a connection, building it on first use.
+
+    A session built for other settings is closed and replaced, so an edited
+    base URL or pool size takes effect in every worker on its next call
+    without a restart. So is one inherited across a fork: its sockets belong
+    to the parent, and two processes reading one socket corrupt both streams.
+    """
+
+    key = (connection_id, retries)
+    settings = (baseurl, pool_maxsize)
+    pid = os.getpid()
+
+    with _sessions_lock:
+        entry = _sessions.get(key)
+
+        if entry is not None:
+            entry_pid, entry_settings, session = entry
+
+            if entry_pid == pid and entry_settings == settings:
+                return session
+
+            # A forked child only drops its reference: closing would shut
+            # sockets the parent is still using.
+            if entry_pid == pid:
+                session.close()
+
+        session = _build_session(retries, pool_maxsize)
+        _sessions[key] = (pid, settings, session)
+
+        return session
+
+
+def close_sessions(connection_id=None):
+    """
+    Closes the pooled sessions of one connection, or of every connection when
+    none is given.
+    """
+
+    pid = os.getpid()
+
+    with _sessions_lock:
+        for key in list(_sessions):
+            if connection_id is not None and key[0] != connection_id:
+                continue
+
+            entry_pid, _, session = _sessions.pop(key)
+
+            if entry_pid == pid:
+                session.close()
+
+
+def parse_observation_data(response):
+    """
+    Collapses a get_data response into one record per timestamp.
+
+    Returns the records and the count of raw items the response carried.
+    """
+
+    # The raw items the response carried, counted after parsing and before
+    # the per-timestamp collapse below. Not len(records): that is
+    # post-conversion, would duplicate records_count, and moves with our
+    # own reshaping — so a bug of ours would read as a source fault. The
+    # payload carries from/to, so the source restricts to the window and
+    # no local bound applies.
+    sources_count = sum(len(obs_data) for obs_data in response.values())
+
+    records = {}
+
+    for obs_code, obs_data in response.items():
+        for item in obs_data:
+            date = item["date"]
+            if date not in records:
+                records[date] = {"observation_time": datetime.datetime.strptime(date, "%Y-%m-%dT%H:%M:%S")}
+            records[date][obs_code] = item["value"]
+
+    return list(records.values()), sources_count
+
+
+def parse_observation_columns(response):
+    """
+    The columnar form of parse_observation_data(): returns an
+    ObservationColumns and the count of raw items.
+    """
+
+    # Lazy: only a columnar call needs NumPy loaded.
+    from .columns import ObservationColumns
+
+    sources_count = sum(len(obs_data) for obs_data in response.values())
+
+    series = [(obs_code, [item["date"] for item in obs_data], [item["value"] for item in obs_data])
+              for obs_code, obs_data in response.items()]
+
+    return ObservationColumns.from_series(series), sources_count
+
+
+def parse_observation_stream(stream, columnar=False):
+    """
+    The incremental form of parse_observation_data(), reading a get_data body
+    from a file-like object. Each item is merged into its timestamp's record
+    as soon as it is parsed, so nothing but the records and the item in hand
+    is ever held. With columnar=True, items are gathered per series instead
+    and an ObservationColumns is returned.
+    """
+
+    # Lazy: only a streamed call needs the incremental parser loaded.
+    import ijson
+
+    sources_count = 0
+    records = {}
+    series = {}
+
+    depth = 0
+    obs_code = None
+    key = None
+    item = None
+
+    try:
+        for event, value in ijson.basic_parse(stream, use_float=True):
+            if event in ("start_map", "start_array"):
+                depth += 1
+
+                if depth == 1 and event != "start_map":
+                    raise ValueError("a get_data body must be an object")
+
+                if depth == 3 and event == "start_map":
+                    item = {}
+            elif event in ("end_map", "end_array"):
+                if depth == 3 and item is not None:
+                    sources_count += 1
+
+                    date = item["date"]
+                    if columnar:
+                        dates, values = series.setdefault(obs_code, ([], []))
+                        dates.append(date)
+                        values.append(item["value"])
+                    else:
+                        if date not in records:
+                            records[date] = {"observation_time": datetime.datetime.strptime(date, "%Y-%m-%dT%H:%M:%S")}
+                        records[date][obs_code] = item["value"]
+
+                    item = None
+
+                depth -= 1
+            elif event == "map_key":
+                if depth == 1:
+                    obs_code = value
+                elif depth == 3:
+                    key = value
+            elif depth == 3 and item is not None:
+                item[key] = value
+    except (ijson.JSONError, ValueError) as e:
+        # The same type a whole-body decode raises, so callers catching it
+        # need not know which parser ran.
+        raise requests.exceptions.JSONDecodeError(str(e), "", 0) from e
+
+    if columnar:
+        from .columns import ObservationColumns
+
+        columns = ObservationColumns.from_series(
+            (obs_code, dates, values) for obs_code, (dates, values) in series.items())
+
+        return columns, sources_count
+
+    return list(records.values()), sources_count
+
+
+class TransferSize(NamedTuple):
+    """
+    The bytes one call moved, as decoded and as sent over the wire. A count
+    the transport could not tell is None.
+    """
+
+    path: str
+    request_bytes: int = None
+    request_wire_bytes: int = None
+    response_bytes: int = None
+    response_wire_bytes: int = None
+
+
+def encode_payload(payload, compress=False):
+    """
+    Serialises a payload as requests' json= would, gzipping it where asked
+    and large enough to gain. Returns the body, its headers and its size
+    before compression.
+    """
+
+    body = json.dumps(payload, allow_nan=False).encode()
+    headers = {"Content-Type": "application/json"}
+    size = len(body)
+
+    if compress and size >= REQUEST_COMPRESSION_MIN_BYTES:
+        body = gzip.compress(body)
+        headers["Content-Encoding"] = "gzip"
+
+    return body, headers, size
+
+
+def _wire_bytes(response):
+    # urllib3 counts what it pulled off the socket, before decoding.
+    try:
+        count = response.raw.tell()
+    except Exception:
+        return None
+
+    return count if isinstance(count, int) else None
+
+
+class _CountingReader:
+    """A file-like wrapper counting the bytes read through it."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.count = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.count += len(data)
+
+        return data
+
+
 class PulsoWebClient:
-    def __init__(self, baseurl, token, connection_id, use_cache=True, timeout=None, retries=None):
+    def __init__(self, baseurl, token, connection_id, use_cache=True, timeout=None, retries=None,
+                 pool_maxsize=None, compress_requests=None):
         self.baseurl = baseurl
         self.token = token
         self.connection_id = connection_id
         self.use_cache = use_cache
         self.timeout = DEFAULT_TIMEOUT if timeout is None else timeout
         self.retries = retries
+        self.pool_maxsize = POOL_MAXSIZE if pool_maxsize is None else pool_maxsize
+        self.compress_requests = COMPRESS_REQUESTS if compress_requests is None else compress_requests
+        self._indexed_context = None
 
-    def get_observations_metadata(self):
-        context = self.get_context()
-        observations = context["observations"]
+        # The sizes of the last call this client made.
+        self.last_transfer = None
 
-        return observations
+    def get_indexed_context(self):
+        """
+        Returns the context as a PulsoWebContext, fetched and indexed once
+        for the life of this client.
+        """
 
-    def get_granularities_metadata(self):
-        context = self.get_context()
+        if self._indexed_context is None:
+            with timed("context", connection=self.connection_id) as tags:
+                if self.use_cache:
+                    fetched = []
 
-        granularities = context["granularities"]
-        return granularities
+                    def fetch():
+                        fetched.append(True)
+                        return self.post(CONTEXT_PATH)
 
-    def get_stations_metadata(self):
-        context = self.get_context()
-        stations = context["stations"]
-        return stations
+                    context = get_or_refresh_context(self.connection_id, fetch)
 
-    def get_observations_for_granular(self, gran_code, include_stations_count=True):
-        observations_list = self.get_observations_metadata()
-        gran_obs_list = []
-
-        for obs in observations_list:
-            if str(obs["granularity"]) == str(gran_code):
-                gran_obs = {
-                    "code": obs["code"],
-                    "label": obs["label"],
-                    "unit": obs["unit"],
-                    "description": obs["description"],
-                }
-                if include_stations_count:
-                    stations_count = len(self.get_stations_with_obs(obs["code"]))
-                    gran_obs["stations_count"] = stations_count
-                gran_obs_list.append(gran_obs)
-
-        if include_stations_count:
-            # sort by stations count
-            gran_obs_list = sorted(gran_obs_list, key=lambda x: x["stations_count"], reverse=True)
-
-        return gran_obs_list
+                    # A stale hit's refresh runs in the background, and is
+                    # timed there as "refresh".
+                    tags["result"] = "miss" if fetched else "hit"
+                else:
+                    context = PulsoWebContext(self.post(CONTEXT_PATH))
+                    tags["result"] = "uncached"
 
-    def get_stations_with_obs(self, obs_code):
-        stations = self.get_stations_metadata()
-        obs_stations = []
-        for station in stations:
-            if obs_code in station["observations"]:
-                station_info = {
-                    "code": station["code"],
-                    "name": station["name"],
-                }
-                obs_stations.append(station_info)
+            self._indexed_context = context
 
-        # sort by name
-        # obs_stations = sorted(obs_stations, key=lambda x: x["name"], reverse=True)
+        return self._indexed_context
 
-        return obs_stations
+    def get_observations_metadata(self):
+        return self.get_indexed_context().observations
 
-    def get_stations_for_granularity(self, gran_code):
-        observations = self.get_observations_for_granular(gran_code)
+    def get_granularities_metadata(self):
+        return self.get_indexed_context().granularities
 
-        stations = []
+    def get_stations_metadata(self):
+        return self.get_indexed_context().stations
+
+    def get_observations_for_granular(self, gran_code, include_stations_count=True):
+        return self.get_indexed_context().get_observations_for_granular(gran_code, include_stations_count)
 
-        for obs in observations:
-            obs_code = obs["code"]
-            obs_stations = self.get_stations_with_obs(obs_code)
-            stations.extend(obs_stations)
+    def get_stations_with_obs(self, obs_code):
+        return self.get_indexed_context().get_stations_with_obs(obs_code)
 
-        return stations
+    def get_stations_for_granularity(self, gran_code):
+        return self.get_indexed_context().get_stations_for_granularity(gran_code)
 
     def get_structured_data(self):
-        gran_metadata = self.get_granularities_metadata()
+        return self.get_indexed_context().get_structured_data()
 
-        data = []
+    def get_observation_by_code(self, obs_code):
+        return self.get_indexed_context().get_observation_by_code(obs_code)
 
-        for gran in gran_metadata:
-            gran_data = {
-                "granularity": gran,
-                "stations": [],
-            }
+    def post(self, path, payload=None):
+        with timed("post", path=path):
+            with timed("post.network", path=path):
+                response = self._post_response(path, payload)
+                content = response.content
 
-            gran_code = gran["code"]
-            observations = self.get_observations_for_granular(gran_code)
+            with timed("post.decode", path=path):
+                data = response.json()
 
-            for obs in observations:
-                obs_code = obs["code"]
-                stations = self.get_stations_with_obs(obs_code)
+        self._record_transfer(path, response, len(content) if isinstance(content, bytes) else None)
 
-                for station in stations:
-                    gran_data["stations"].append({
-                        "code": station["code"],
-                        "name": station["name"],
-                    })
+        return data
 
-            data.append(gran_data)
+    def _record_transfer(self, path, response, response_bytes):
+        sizes = getattr(response, "adl_request_bytes", None)
+        request_bytes, request_wire_bytes = sizes if isinstance(sizes, tuple) else (None, None)
 
-        return data
+        self.last_transfer = TransferSize(path, request_bytes, request_wire_bytes, response_bytes,
+                                          _wire_bytes(response))
 
-    def get_observation_by_code(self, obs_code):
-        observations = self.get_observations_metadata()
+        logger.debug(f"[ADL_PULSOWEB_PLUGIN] {path}: sent {request_wire_bytes} of {request_bytes} byte(s), "
+                     f"received {self.last_transfer.response_wire_bytes} for {response_bytes}.")
 
-        for obs in observations:
-            if obs["code"] == obs_code:
-                return obs
+        for name, count in (("bytes_sent", request_wire_bytes),
+                            ("bytes_received", self.last_transfer.response_wire_bytes),
+                            ("bytes_decoded", response_bytes)):
+            if count is not None:
+                emit(name, count, "bytes", path=path)
 
-        return None
+    def _post_response(self, path, payload=None, stream=False):
+        """
+        Sends the call and returns the response once its status is known to
+        be good. A streamed response's body is still unread, and the caller
+        must close it.
+        """
 
-    def post(self, path, payload=None):
         if payload is None:
             payload = {}
 
@@ -166,74 +453,99 @@ class PulsoWebClient:
         }
 
         url = f"{self.baseurl}/{path}/"
-        response = self._send_post(url, payload)
+
+        # Like the rate limit, the circuit is for the ingestion path: a
+        # source check must see the source as it is, not as it last was.
+        breaker = CircuitBreaker(self.connection_id) if self.use_cache else None
+
+        if breaker is not None:
+            breaker.check()
 
         try:
-            response.raise_for_status()
-        except requests.HTTPError as e:
-            category = category_for_status(response.status_code)
-
-            # Stamped in place, so the original type survives for core's own
-            # type table and the traceback is kept. A status carrying no
-            # honest category is left unstamped: declining falls through to
-            # core's read-time tier, which stays revisable.
-            if category:
-                e.adl_category = category
-                e.adl_layer = 5
+            response = self._send_post(url, payload, stream=stream)
+
+            try:
+                response.raise_for_status()
+            except requests.HTTPError as e:
+                category = category_for_status(response.status_code)
+
+                # Stamped in place, so the original type survives for core's
+                # own type table and the traceback is kept. A status carrying
+                # no honest category is left unstamped: declining falls
+                # through to core's read-time tier, which stays revisable.
+                if category:
+                    e.adl_category = category
+                    e.adl_layer = 5
+
+                raise
+        except requests.RequestException as e:
+            if breaker is not None:
+                breaker.record_failure(e)
 
             raise
 
-        return response.json()
+        if breaker is not None:
+            breaker.record_success()
 
-    def _send_post(self, url, payload):
-        if self.retries is None:
-            return requests.post(url, json=payload, timeout=self.timeout)
+        return response
 
-        # allowed_methods=False applies the policy to POST too, which urllib3's
-        # default set excludes. Every call this client makes is a POST.
-        retry = Retry(total=self.retries, allowed_methods=False)
-        adapter = HTTPAdapter(max_retries=retry)
+    def _send_post(self, url, payload, stream=False):
+        session = get_session(self.connection_id, self.baseurl, self.retries, self.pool_maxsize)
+        body, headers, size = encode_payload(payload, self.compress_requests)
 
-        with requests.Session() as session:
-            session.mount("http://", adapter)
-            session.mount("https://", adapter)
+        # A source check is not rate limited: it has a probe's budget to
+        # answer in, and waiting behind an ingestion run would spend it.
+        if not self.use_cache:
+            response = session.post(url, data=body, headers=headers, timeout=self.timeout, stream=stream)
+        else:
+            # The slot is held until the response headers are in; a streamed
+            # body is read after it is freed.
+            limiter = get_rate_limiter(self.baseurl)
 
-            return session.post(url, json=payload, timeout=self.timeout)
+            with limiter:
+                response = session.post(url, data=body, headers=headers, timeout=self.timeout, stream=stream)
 
-    def get_granularities(self):
-        context = self.get_context()
-        granularities = context["granularities"]
-        return granularities
+            limiter.record(response)
 
-    def get_granularity_by_code(self, gran_code):
-        granularities = self.get_granularities()
+        # Carried on the response to where its body's size is known.
+        response.adl_request_bytes = (size, len(body))
 
-        for gran in granularities:
-            if str(gran["code"]) == str(gran_code):
-                return gran
+        return response
 
-        return None
+    def get_granularities(self):
+        return self.get_indexed_context().granularities
 
-    def get_context(self):
-        cache_key = f"pulsoweb_context_{self.connection_id}"
+    def get_granularity_by_code(self, gran_code):
+        return self.get_indexed_context().get_granularity_by_code(gran_code)
 
+    def get_context(self):
         # A source check must never read or write this cache: a cached context
         # would report OK while the source is down, and a check's context
-        # should not become the ingestion path's.
-        if self.use_cache:
-            context = cache.get(cache_key)
-
-            if context and context.get("stations"):
-                return context
-
-        context = self.post(CONTEXT_PATH)
+        # should not become the ingestion path's. Its body is returned raw,
+        # unindexed, for the check to judge.
+        if not self.use_cache:
+            return self.post(CONTEXT_PATH)
+
+        return self.get_indexed_context().raw
+
+    def get_observation_data(self, station_code, observations, start_date, end_date, stream=False,
+                             columnar=False):
+        """
+        Returns the station's records for the window, one per timestamp, and
+        the count of raw items the source sent.
+
+        With stream=True the body is parsed as it arrives instead of being
+        decoded whole first, so a long window never holds the raw body, the
+        decoded document and the records at once. With columnar=True the
+        records are an ObservationColumns rather than a list of dicts; its
+        to_records() gives the dicts back.
+
+        Identical calls in flight at the same time, in this process or, with
+        the cache in use and a window not streamed, in any worker, share one
+        call to the source and one parsed result. Each caller is handed dict
+        rows of its own, so one editing its rows never edits another's.
+        """
 
-        if self.use_cache:
-            cache.set(cache_key, context, CONTEXT_CACHE_TIMEOUT)
-
-        return context
-
-    def get_observation_data(self, station_code, observations, start_date, end_date):
         path = "get_data"
 
         payload = {
@@ -243,26 +555,52 @@ class PulsoWebClient:
             "to": end_date
         }
 
-        response = self.post(path, payload)
-
-        # The raw items the response carried, counted after parsing and before
-        # the per-timestamp collapse below. Not len(records): that is
-        # post-conversion, would duplicate records_count, and moves with our
-        # own reshaping — so a bug of ours would read as a source fault. The
-        # payload carries from/to, so the source restricts to the window and
-        # no local bound applies.
-        sources_count = sum(len(obs_data) for obs_data in response.values())
-
-        records = {}
-
-        for obs_code, obs_data in response.items():
-            for item in obs_data:
-                date = item["date"]
-                if date not in records:
-                    records[date] = {"observation_time": datetime.datetime.strptime(date, "%Y-%m-%dT%H:%M:%S")}
-                records[date][obs_code] = item["value"]
-
-        return list(records.values()), sources_count
+        # The parsed form is part of the key: a columnar caller cannot be
+        # handed dict rows.
+        key = flight_key(self.connection_id, path, {**payload, "columnar": columnar})
+
+        # A streamed window is too large to hand another worker through the
+        # cache; it is still shared between this process's threads.
+        records, sources_count = single_flight(key,
+                                               lambda: self._fetch_observation_data(path, payload, stream,
+                                                                                    columnar),
+                                               shared=self.use_cache and not stream)
+
+        # Columns are never edited in place: convert_columns() builds new
+        # ones.
+        if not columnar:
+            records = [dict(record) for record in records]
+
+        return records, sources_count
+
+    def _fetch_observation_data(self, path, payload, stream, columnar):
+        if not stream:
+            # Network and decode time are post()'s to measure.
+            response = self.post(path, payload)
+
+            with timed("get_data.merge"):
+                if columnar:
+                    records, sources_count = parse_observation_columns(response)
+                else:
+                    records, sources_count = parse_observation_data(response)
+        else:
+            with self._post_response(path, payload, stream=True) as response:
+                # The raw stream is read below urllib3's decoding unless told
+                # otherwise, which would hand a gzipped body to the parser.
+                response.raw.decode_content = True
+                body = _CountingReader(response.raw)
+
+                # Reading, decoding and merging are interleaved, so timed as
+                # one.
+                with timed("get_data.stream"):
+                    records, sources_count = parse_observation_stream(body, columnar=columnar)
+
+                self._record_transfer(path, response, body.count)
+
+        emit("get_data.items", sources_count)
+        emit("get_data.rows", len(records))
+
+        return records, sources_count
 
     def get_logs(self, start_date, end_date):
         path = "get_logs"
@@ -0,0 +1,74 @@
+import numpy as np
+
+
+class ObservationColumns:
+    """
+    A station's get_data records held column by column: one datetime64 array
+    of timestamps, and per observation code one float64 array of values and
+    one boolean array saying where the source sent an item at all.
+
+    A value the source sent as null is NaN with its mask set; a timestamp the
+    series has no item for is NaN with its mask clear. to_records() keeps the
+    difference, exactly as the dict rows always have.
+    """
+
+    def __init__(self, observation_time, values, present):
+        self.observation_time = observation_time
+        self.values = values
+        self.present = present
+
+    def __len__(self):
+        return len(self.observation_time)
+
+    @classmethod
+    def from_series(cls, series):
+        """
+        Builds the columns from (obs_code, dates, values) triples, one per
+        observation series, where dates are the source's ISO strings.
+        Timestamps are sorted; an observation repeating a timestamp keeps
+        its last value, as the dict rows do.
+        """
+
+        series = [(code, np.array(dates, dtype="datetime64[s]"), np.array(values, dtype=float))
+                  for code, dates, values in series]
+
+        if series:
+            observation_time = np.unique(np.concatenate([dates for _, dates, _ in series]))
+        else:
+            observation_time = np.array([], dtype="datetime64[s]")
+
+        values = {}
+        present = {}
+
+        for code, dates, series_values in series:
+            index = np.searchsorted(observation_time, dates)
+
+            column = np.full(len(observation_time), np.nan)
+            column[index] = series_values
+
+            mask = np.zeros(len(observation_time), dtype=bool)
+            mask[index] = True
+
+            values[code] = column
+            present[code] = mask
+
+        return cls(observation_time, values, present)
+
+    def to_records(self):
+        """
+        Returns the dict rows get_observation_data() returns by default, one
+        per timestamp, in time order. Values come back as floats, whatever
+        numeric type the source sent.
+        """
+
+        times = self.observation_time.astype(object)
+        records = [{"observation_time": time} for time in times]
+
+        for code, column in self.values.items():
+            mask = self.present[code]
+
+            for i in np.flatnonzero(mask):
+                value = column[i]
+                records[i][code] = None if np.isnan(value) else value.item()
+
+        return records
@@ -1,3 +1,6 @@
+import os
+
+
 def setup(settings):
     """
     This function is called after adl has setup its own Django settings file but
@@ -6,3 +9,57 @@ def setup(settings):
 
     settings.INSTALLED_APPS += ["some_custom_plugin_dep"]
     """
+
+    # Opt-in metrics, e.g. ADL_PULSOWEB_METRICS_SINKS=prometheus,logging. See
+    # adl_pulsoweb_plugin.instrumentation for the sinks and their settings.
+    sinks = os.environ.get("ADL_PULSOWEB_METRICS_SINKS")
+
+    if sinks:
+        settings.ADL_PULSOWEB_METRICS_SINKS = [sink.strip() for sink in sinks.split(",") if sink.strip()]
+
+    # The bearer token a Prometheus server sends to read /pulsoweb/metrics/.
+    # Unset, the endpoint serves signed-in staff users only.
+    if os.environ.get("ADL_PULSOWEB_METRICS_TOKEN"):
+        settings.ADL_PULSOWEB_METRICS_TOKEN = os.environ["ADL_PULSOWEB_METRICS_TOKEN"]
+
+    if os.environ.get("ADL_PULSOWEB_STATSD_HOST"):
+        settings.ADL_PULSOWEB_STATSD_HOST = os.environ["ADL_PULSOWEB_STATSD_HOST"]
+
+    if os.environ.get("ADL_PULSOWEB_STATSD_PORT"):
+        settings.ADL_PULSOWEB_STATSD_PORT = int(os.environ["ADL_PULSOWEB_STATSD_PORT"])
+
+    # The per-host rate limit, for a tenant whose quota is not PulsoWeb's
+    # usual one. See adl_pulsoweb_plugin.ratelimit for the defaults.
+    for name in ("ADL_PULSOWEB_RATE_LIMIT", "ADL_PULSOWEB_RATE_LIMIT_MAX", "ADL_PULSOWEB_MAX_CONCURRENT_PER_HOST",
+                 "ADL_PULSOWEB_RATE_LIMIT_MAX_WAIT"):
+        if os.environ.get(name):
+            setattr(settings, name, int(os.environ[name]))
+
+    if os.environ.get("ADL_PULSOWEB_THROTTLE_STATUSES"):
+        settings.ADL_PULSOWEB_THROTTLE_STATUSES = [
+            int(status) for status in os.environ["ADL_PULSOWEB_THROTTLE_STATUSES"].split(",") if status.strip()
+        ]
+
+    # The context cache's soft and hard TTLs and its refresh lease, in
+    # seconds. See adl_pulsoweb_plugin.context_cache for the defaults.
+    for name in ("ADL_PULSOWEB_CONTEXT_CACHE_TIMEOUT", "ADL_PULSOWEB_CONTEXT_STALE_TIMEOUT",
+                 "ADL_PULSOWEB_CONTEXT_REFRESH_LEASE"):
+        if os.environ.get(name):
+            setattr(settings, name, int(os.environ[name]))
+
+    # How far before the latest saved observation each fetch starts, in
+    # seconds, so data the source received late is still picked up.
+    if os.environ.get("ADL_PULSOWEB_INCREMENTAL_OVERLAP"):
+        settings.ADL_PULSOWEB_INCREMENTAL_OVERLAP = int(os.environ["ADL_PULSOWEB_INCREMENTAL_OVERLAP"])
+
+    # The admin metadata pages read a snapshot of each connection's context,
+    # refreshed on this schedule, in seconds, as well as whenever a refresh
+    # of the cached context changes it.
+    interval = int(os.environ.get("ADL_PULSOWEB_SNAPSHOT_REFRESH_INTERVAL", 3600))
+
+    beat_schedule = dict(getattr(settings, "CELERY_BEAT_SCHEDULE", None) or {})
+    beat_schedule["adl_pulsoweb_plugin.refresh_context_snapshots"] = {
+        "task": "adl_pulsoweb_plugin.refresh_context_snapshots",
+        "schedule": interval,
+    }
+    settings.CELERY_BEAT_SCHEDULE = beat_schedule
@@ -0,0 +1,223 @@
+import hashlib
+import json
+from typing import NamedTuple
+
+# The sections of a context, each fingerprinted on its own.
+SECTIONS = ("stations", "observations", "granularities")
+
+
+def fingerprint_section(section):
+    """
+    A canonical hash of one context section. Key order and list order are
+    normalised away, so a source that reorders an unchanged catalogue is not
+    read as having changed it.
+    """
+
+    items = sorted(json.dumps(item, sort_keys=True, separators=(",", ":"), default=str)
+                   for item in section or [])
+
+    return hashlib.sha256("\n".join(items).encode()).hexdigest()
+
+
+def fingerprint_context(context):
+    """Returns the fingerprint of every section of a raw context, by name."""
+
+    body = context if isinstance(context, dict) else {}
+
+    return {name: fingerprint_section(body.get(name)) for name in SECTIONS}
+
+
+class ContextDelta(NamedTuple):
+    """
+    What a refresh changed in a connection's context. Station codes are
+    strings, as the index keys them.
+    """
+
+    changed_sections: frozenset
+    stations_added: list
+    stations_removed: list
+    # station code -> observation codes the station newly lists, and no
+    # longer lists. Stations added or removed outright are not repeated here.
+    observations_added: dict
+    observations_removed: dict
+
+
+class PulsoWebContext:
+    """
+    A fetched PulsoWeb context, indexed once so the metadata helpers look up
+    rather than scan.
+
+    Station and granularity codes are keyed as strings: the source sends them
+    as integers in some responses and strings in others, and the helpers
+    have always compared them that way. Observation codes are keyed as sent.
+
+    Indexing reads only the keys it needs, and tolerates their absence: it
+    runs on every fetched context, including a source check's, which must
+    judge a partial body rather than fail on one. `has_station_list` says
+    whether the body actually carried a station list, so a check never reads
+    a missing list as an empty one.
+    """
+
+    def __init__(self, context, previous=None, unchanged=()):
+        """
+        `previous` is an earlier index of the same connection's context, and
+        `unchanged` names the sections whose fingerprints it shares with this
+        one. Those sections' indexes are taken from it rather than rebuilt.
+        """
+
+        self.raw = context
+
+        # A body that is not an object at all is indexed as an empty one.
+        body = context if isinstance(context, dict) else {}
+
+        self.has_station_list = isinstance(body.get("stations"), list)
+
+        self.stations = body.get("stations") or []
+        self.observations = body.get("observations") or []
+        self.granularities = body.get("granularities") or []
+
+        if previous is not None and "stations" in unchanged:
+            self.stations_by_code = previous.stations_by_code
+            self.stations_by_observation = previous.stations_by_observation
+            self.observations_by_station = previous.observations_by_station
+        else:
+            self._index_stations()
+
+        if previous is not None and "observations" in unchanged:
+            self.observations_by_code = previous.observations_by_code
+            self.observations_by_granularity = previous.observations_by_granularity
+        else:
+            self._index_observations()
+
+        if previous is not None and "granularities" in unchanged:
+            self.granularities_by_code = previous.granularities_by_code
+        else:
+            self._index_granularities()
+
+    # setdefault throughout the indexing: where the source repeats a code,
+    # the first entry wins, as it did for the linear scans these replace.
+
+    def _index_stations(self):
+        self.stations_by_code = {}
+        for station in self.stations:
+            self.stations_by_code.setdefault(str(station.get("code")), station)
+
+        # The inverted observation -> stations map, in station list order.
+        self.stations_by_observation = {}
+        for station in self.stations:
+            station_info = {
+                "code": station.get("code"),
+                "name": station.get("name"),
+            }
+            # A station listing an observation twice is still one station.
+            for obs_code in dict.fromkeys(station.get("observations") or []):
+                self.stations_by_observation.setdefault(obs_code, []).append(station_info)
+
+        # station code -> the observations it lists. A station sent without
+        # the key is left out: that says nothing about what it reports,
+        # where an empty list says it reports nothing.
+        self.observations_by_station = {}
+        for station in self.stations:
+            if "observations" in station:
+                self.observations_by_station.setdefault(str(station.get("code")),
+                                                        frozenset(station.get("observations") or []))
+
+    def _index_observations(self):
+        self.observations_by_code = {}
+        self.observations_by_granularity = {}
+        for obs in self.observations:
+            self.observations_by_code.setdefault(obs.get("code"), obs)
+            self.observations_by_granularity.setdefault(str(obs.get("granularity")), []).append(obs)
+
+    def _index_granularities(self):
+        self.granularities_by_code = {}
+        for gran in self.granularities:
+            self.granularities_by_code.setdefault(str(gran.get("code")), gran)
+
+    def get_station_by_code(self, station_code):
+        return self.stations_by_code.get(str(station_code))
+
+    def get_observation_by_code(self, obs_code):
+        return self.observations_by_code.get(obs_code)
+
+    def get_granularity_by_code(self, gran_code):
+        return self.granularities_by_code.get(str(gran_code))
+
+    def get_station_observations(self, station_code):
+        """
+        The set of observation codes a station lists, or None where the
+        context does not say.
+        """
+
+        return self.observations_by_station.get(str(station_code))
+
+    def get_stations_with_obs(self, obs_code):
+        # Copies, so a caller editing its result cannot edit the index.
+        return [dict(station) for station in self.stations_by_observation.get(obs_code, [])]
+
+    def get_observations_for_granular(self, gran_code, include_stations_count=True):
+        gran_obs_list = []
+
+        for obs in self.observations_by_granularity.get(str(gran_code), []):
+            gran_obs = {
+                "code": obs["code"],
+                "label": obs["label"],
+                "unit": obs["unit"],
+                "description": obs["description"],
+            }
+            if include_stations_count:
+                gran_obs["stations_count"] = len(self.stations_by_observation.get(obs["code"], []))
+            gran_obs_list.append(gran_obs)
+
+        if include_stations_count:
+            # sort by stations count
+            gran_obs_list = sorted(gran_obs_list, key=lambda x: x["stations_count"], reverse=True)
+
+        return gran_obs_list
+
+    def get_stations_for_granularity(self, gran_code):
+        stations = []
+
+        for obs in self.get_observations_for_granular(gran_code):
+            stations.extend(self.get_stations_with_obs(obs["code"]))
+
+        return stations
+
+    def get_structured_data(self):
+        data = []
+
+        for gran in self.granularities:
+            data.append({
+                "granularity": gran,
+                "stations": self.get_stations_for_granularity(gran["code"]),
+            })
+
+        return data
+
+
+def diff_contexts(old, new, changed_sections):
+    """Returns the ContextDelta between two indexed contexts."""
+
+    old_codes = old.stations_by_code.keys()
+    new_codes = new.stations_by_code.keys()
+
+    observations_added = {}
+    observations_removed = {}
+
+    if "stations" in changed_sections:
+        for code in old_codes & new_codes:
+            old_obs = set(old.stations_by_code[code].get("observations") or [])
+            new_obs = set(new.stations_by_code[code].get("observations") or [])
+
+            if new_obs - old_obs:
+                observations_added[code] = sorted(new_obs - old_obs, key=str)
+            if old_obs - new_obs:
+                observations_removed[code] = sorted(old_obs - new_obs, key=str)
+
+    return ContextDelta(
+        changed_sections=frozenset(changed_sections),
+        stations_added=[code for code in new_codes if code not in old_codes],
+        stations_removed=[code for code in old_codes if code not in new_codes],
+        observations_added=observations_added,
+        observations_removed=observations_removed,
+    )
@@ -0,0 +1,525 @@
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .context import SECTIONS, PulsoWebContext, diff_contexts, fingerprint_context
+from .instrumentation import timed
+from .signals import context_changed
+
+logger = logging.getLogger(__name__)
+
+# The soft TTL, in seconds: a context older than this is stale. A stale
+# context is still served, while one worker refreshes it in the background.
+# These three are defaults; a Django setting of the same name with an
+# ADL_PULSOWEB_ prefix says otherwise.
+CONTEXT_CACHE_TIMEOUT = 3600
+
+# The hard TTL: how long the shared cache keeps a context at all. Only past
+# this, or on a cold cache, does a read block on a download.
+CONTEXT_STALE_TIMEOUT = 24 * 3600
+
+# How long one worker holds the right to refresh a connection's context. A
+# refresher that dies frees it when the lease runs out; one whose download
+# failed keeps it, so a source that is down is retried once per lease rather
+# than by every caller.
+CONTEXT_REFRESH_LEASE = 120
+
+
+# How long a caller finding a cold cache waits for another worker's download
+# before downloading itself, and how often it looks.
+CONTEXT_COLD_WAIT = 15
+CONTEXT_COLD_POLL = 0.25
+
+# The process-local layer in front of the shared cache. Entries are indexed
+# contexts, so a worker unpickles and indexes a context once per refresh
+# rather than once per call. The TTL bounds how long a worker can serve an
+# entry whose version key was evicted from under it; the size bounds memory
+# on a deployment with many connections.
+L1_TIMEOUT = 300
+L1_MAXSIZE = 32
+
+_l1 = OrderedDict()
+_l1_lock = threading.Lock()
+
+# Connections this process is refreshing in the background, so a burst of
+# reads of a stale context starts one refresh rather than one per read.
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+# Strong references to running asyncio refreshes; the loop keeps only weak
+# ones.
+_background_tasks = set()
+
+
+def context_cache_key(connection_id):
+    """The shared-cache key a connection's context is stored under."""
+
+    return f"pulsoweb_context_{connection_id}"
+
+
+def context_version_cache_key(connection_id):
+    """
+    The shared-cache key of the stamp naming the context currently stored
+    and when it was fetched. Reading it is one small value, where the context
+    is a large blob.
+    """
+
+    return f"{context_cache_key(connection_id)}_version"
+
+
+def context_refresh_lock_key(connection_id):
+    return f"{context_cache_key(connection_id)}_refresh_lock"
+
+
+def _l1_get(key):
+    with _l1_lock:
+        entry = _l1.get(key)
+
+        if entry is None:
+            return None
+
+        if entry[1] <= time.monotonic():
+            del _l1[key]
+            return None
+
+        _l1.move_to_end(key)
+
+        return entry
+
+
+def _l1_set(key, stamp, context):
+    with _l1_lock:
+        _l1[key] = (stamp, time.monotonic() + L1_TIMEOUT, context)
+        _l1.move_to_end(key)
+
+        while len(_l1) > L1_MAXSIZE:
+            _l1.popitem(last=False)
+
+
+def clear_l1(connection_id=None):
+    """
+    Drops this process's entry for one connection, or every entry when none
+    is given.
+    """
+
+    with _l1_lock:
+        if connection_id is None:
+            _l1.clear()
+        else:
+            _l1.pop(context_cache_key(connection_id), None)
+
+
+def invalidate_context(connection_id):
+    """
+    Drops a connection's cached context everywhere: the shared blob and
+    stamp, and this process's entry. Other processes find the stamp gone on
+    their next read and drop theirs. The next read downloads it again.
+    """
+
+    clear_l1(connection_id)
+    cache.delete_many([context_cache_key(connection_id), context_version_cache_key(connection_id)])
+
+
+def _setting(name, default):
+    value = getattr(settings, name, None)
+
+    return default if value is None else value
+
+
+def _soft_ttl():
+    return _setting("ADL_PULSOWEB_CONTEXT_CACHE_TIMEOUT", CONTEXT_CACHE_TIMEOUT)
+
+
+def _hard_ttl():
+    return _setting("ADL_PULSOWEB_CONTEXT_STALE_TIMEOUT", CONTEXT_STALE_TIMEOUT)
+
+
+def _refresh_lease():
+    return _setting("ADL_PULSOWEB_CONTEXT_REFRESH_LEASE", CONTEXT_REFRESH_LEASE)
+
+
+def _is_stale(stamp):
+    # A context stored without a usable stamp has an unknown age, and is
+    # refreshed.
+    if not isinstance(stamp, dict):
+        return True
+
+    return time.time() - stamp["fetched_at"] >= _soft_ttl()
+
+
+def _version(stamp):
+    return stamp.get("version") if isinstance(stamp, dict) else None
+
+
+def _fingerprints(stamp):
+    return stamp.get("fingerprints") if isinstance(stamp, dict) else None
+
+
+def _unchanged_sections(old_fingerprints, new_fingerprints):
+    if not old_fingerprints or not new_fingerprints:
+        return set()
+
+    return {name for name in SECTIONS if old_fingerprints.get(name) == new_fingerprints.get(name)}
+
+
+def _keep(key, stamp, raw, entry=None):
+    if not raw or not raw.get("stations"):
+        return None
+
+    # Sections the stamp says are unchanged since this process's entry keep
+    # that entry's indexes.
+    if entry is not None:
+        unchanged = _unchanged_sections(_fingerprints(entry[0]), _fingerprints(stamp))
+        context = PulsoWebContext(raw, previous=entry[2], unchanged=unchanged)
+    else:
+        context = PulsoWebContext(raw)
+
+    # A context with no stamp (evicted apart from it, or written by an older
+    # release) is still served, but never kept: nothing could tell this
+    # process when it goes stale.
+    if _version(stamp) is not None:
+        _l1_set(key, stamp, context)
+
+    return context
+
+
+def _read(connection_id):
+    """
+    Returns the cached context and its stamp.
+
+    A warm entry costs one read of the stamp; a cold one reads the stamp and
+    the context together, in one round trip.
+    """
+
+    key = context_cache_key(connection_id)
+    version_key = context_version_cache_key(connection_id)
+
+    entry = _l1_get(key)
+
+    if entry is None:
+        values = cache.get_many([key, version_key])
+        stamp = values.get(version_key)
+        return _keep(key, stamp, values.get(key)), stamp
+
+    stamp = cache.get(version_key)
+
+    # Compared on the version alone: a refresh that changed nothing keeps it,
+    # and only moves fetched_at.
+    if _version(stamp) is not None and _version(stamp) == _version(entry[0]):
+        return entry[2], stamp
+
+    return _keep(key, stamp, cache.get(key), entry), stamp
+
+
+async def _aread(connection_id):
+    """The asyncio form of _read()."""
+
+    key = context_cache_key(connection_id)
+    version_key = context_version_cache_key(connection_id)
+
+    entry = _l1_get(key)
+
+    if entry is None:
+        values = await cache.aget_many([key, version_key])
+        stamp = values.get(version_key)
+        return _keep(key, stamp, values.get(key)), stamp
+
+    stamp = await cache.aget(version_key)
+
+    if _version(stamp) is not None and _version(stamp) == _version(entry[0]):
+        return entry[2], stamp
+
+    return _keep(key, stamp, await cache.aget(key), entry), stamp
+
+
+def get_cached_context(connection_id):
+    """
+    Returns the connection's cached context as a PulsoWebContext, stale or
+    not, or None when no usable context is cached.
+    """
+
+    return _read(connection_id)[0]
+
+
+def _prepare(previous, previous_stamp, raw):
+    """
+    Plans the store of a freshly fetched context over the one cached before.
+    Returns the context to serve, its stamp, and the delta to announce, if
+    any; a stamp keeping the previous version means nothing changed.
+    """
+
+    fingerprints = fingerprint_context(raw)
+    now = time.time()
+
+    if previous is not None and _fingerprints(previous_stamp) == fingerprints:
+        return previous, {**previous_stamp, "fetched_at": now}, None
+
+    unchanged = _unchanged_sections(_fingerprints(previous_stamp), fingerprints)
+    stamp = {"version": uuid.uuid4().hex, "fetched_at": now, "fingerprints": fingerprints}
+
+    if previous is None:
+        return PulsoWebContext(raw), stamp, None
+
+    context = PulsoWebContext(raw, previous=previous, unchanged=unchanged)
+    delta = diff_contexts(previous, context, set(SECTIONS) - unchanged)
+
+    return context, stamp, delta
+
+
+def set_cached_context(connection_id, raw):
+    """
+    Stores a freshly fetched context in the shared cache and returns it as a
+    PulsoWebContext.
+
+    A context that changed gets a new version, so every other worker drops
+    its copy on its next read, and its delta is sent as context_changed. One
+    that did not keeps its version and only has its age reset, so no worker
+    re-reads or re-indexes anything.
+    """
+
+    key = context_cache_key(connection_id)
+    version_key = context_version_cache_key(connection_id)
+
+    previous, previous_stamp = _read(connection_id)
+    context, stamp, delta = _prepare(previous, previous_stamp, raw)
+
+    if context is previous:
+        # The blob is rewritten only if it was evicted from under the stamp.
+        if not cache.touch(key, _hard_ttl()):
+            cache.set(key, raw, _hard_ttl())
+        cache.set(version_key, stamp, _hard_ttl())
+    else:
+        cache.set_many({key: raw, version_key: stamp}, _hard_ttl())
+
+    _l1_set(key, stamp, context)
+
+    if delta is not None:
+        context_changed.send(sender=PulsoWebContext, connection_id=connection_id, delta=delta)
+
+    return context
+
+
+async def aset_cached_context(connection_id, raw):
+    """The asyncio form of set_cached_context()."""
+
+    key = context_cache_key(connection_id)
+    version_key = context_version_cache_key(connection_id)
+
+    previous, previous_stamp = await _aread(connection_id)
+    context, stamp, delta = _prepare(previous, previous_stamp, raw)
+
+    if context is previous:
+        if not await cache.atouch(key, _hard_ttl()):
+            await cache.aset(key, raw, _hard_ttl())
+        await cache.aset(version_key, stamp, _hard_ttl())
+    else:
+        await cache.aset_many({key: raw, version_key: stamp}, _hard_ttl())
+
+    _l1_set(key, stamp, context)
+
+    if delta is not None:
+        await context_changed.asend(sender=PulsoWebContext, connection_id=connection_id, delta=delta)
+
+    return context
+
+
+def _acquire(connection_id):
+    """
+    Takes the connection's refresh lease. Returns the owner token, or None
+    when another worker holds it. cache.add() is atomic on every shared
+    backend, so exactly one caller wins.
+    """
+
+    owner = uuid.uuid4().hex
+
+    if cache.add(context_refresh_lock_key(connection_id), owner, _refresh_lease()):
+        return owner
+
+    return None
+
+
+def _release(connection_id, owner):
+    lock_key = context_refresh_lock_key(connection_id)
+
+    # Never another worker's lease, taken after ours ran out.
+    if cache.get(lock_key) == owner:
+        cache.delete(lock_key)
+
+
+async def _aacquire(connection_id):
+    """The asyncio form of _acquire()."""
+
+    owner = uuid.uuid4().hex
+
+    if await cache.aadd(context_refresh_lock_key(connection_id), owner, _refresh_lease()):
+        return owner
+
+    return None
+
+
+async def _arelease(connection_id, owner):
+    lock_key = context_refresh_lock_key(connection_id)
+
+    if await cache.aget(lock_key) == owner:
+        await cache.adelete(lock_key)
+
+
+def _start_background(target):
+    thread = threading.Thread(target=target, name="adl-pulsoweb-context-refresh", daemon=True)
+    thread.start()
+
+
+def _claim_refresh(connection_id):
+    with _refreshing_lock:
+        if connection_id in _refreshing:
+            return False
+
+        _refreshing.add(connection_id)
+
+        return True
+
+
+def _end_refresh(connection_id):
+    with _refreshing_lock:
+        _refreshing.discard(connection_id)
+
+
+def refresh_context(connection_id, fetch):
+    """
+    Downloads and stores the connection's context, unless another worker
+    already is. Returns the new context, or None when the lease was taken.
+
+    A failed download keeps the lease until it runs out, then raises.
+    """
+
+    owner = _acquire(connection_id)
+
+    if owner is None:
+        return None
+
+    context = set_cached_context(connection_id, fetch())
+    _release(connection_id, owner)
+
+    return context
+
+
+def _refresh_quietly(connection_id, fetch):
+    try:
+        with timed("context", connection=connection_id, result="refresh"):
+            refresh_context(connection_id, fetch)
+    except Exception:
+        logger.exception(f"[ADL_PULSOWEB_PLUGIN] Background context refresh failed for "
+                         f"connection {connection_id}; serving the stale context.")
+    finally:
+        _end_refresh(connection_id)
+
+
+def _fetch_cold(connection_id, fetch):
+    owner = _acquire(connection_id)
+
+    if owner is not None:
+        try:
+            return set_cached_context(connection_id, fetch())
+        finally:
+            # Released on failure too: the callers waiting below then stop
+            # waiting and each meet the failure themselves.
+            _release(connection_id, owner)
+
+    deadline = time.monotonic() + CONTEXT_COLD_WAIT
+
+    while time.monotonic() < deadline:
+        time.sleep(CONTEXT_COLD_POLL)
+
+        context = get_cached_context(connection_id)
+
+        if context is not None:
+            return context
+
+        if cache.get(context_refresh_lock_key(connection_id)) is None:
+            break
+
+    return set_cached_context(connection_id, fetch())
+
+
+def get_or_refresh_context(connection_id, fetch):
+    """
+    Returns the connection's context as a PulsoWebContext, calling fetch()
+    for the raw context only where it must.
+
+    A fresh context is served as is. A stale one is served too, while exactly
+    one worker refreshes it in the background. Only a cold cache blocks, and
+    even then only one worker downloads while the others wait for its result.
+    """
+
+    context, stamp = _read(connection_id)
+
+    if context is None:
+        return _fetch_cold(connection_id, fetch)
+
+    if _is_stale(stamp) and _claim_refresh(connection_id):
+        _start_background(lambda: _refresh_quietly(connection_id, fetch))
+
+    return context
+
+
+async def _arefresh_quietly(connection_id, fetch):
+    owner = await _aacquire(connection_id)
+
+    try:
+        if owner is not None:
+            with timed("context", connection=connection_id, result="refresh"):
+                await aset_cached_context(connection_id, await fetch())
+
+            await _arelease(connection_id, owner)
+    except Exception:
+        logger.exception(f"[ADL_PULSOWEB_PLUGIN] Background context refresh failed for "
+                         f"connection {connection_id}; serving the stale context.")
+    finally:
+        _end_refresh(connection_id)
+
+
+async def _afetch_cold(connection_id, fetch):
+    owner = await _aacquire(connection_id)
+
+    if owner is not None:
+        try:
+            return await aset_cached_context(connection_id, await fetch())
+        finally:
+            await _arelease(connection_id, owner)
+
+    deadline = time.monotonic() + CONTEXT_COLD_WAIT
+
+    while time.monotonic() < deadline:
+        await asyncio.sleep(CONTEXT_COLD_POLL)
+
+        context, _ = await _aread(connection_id)
+
+        if context is not None:
+            return context
+
+        if await cache.aget(context_refresh_lock_key(connection_id)) is None:
+            break
+
+    return await aset_cached_context(connection_id, await fetch())
+
+
+async def aget_or_refresh_context(connection_id, fetch):
+    """The asyncio form of get_or_refresh_context(); fetch is a coroutine function."""
+
+    context, stamp = await _aread(connection_id)
+
+    if context is None:
+        return await _afetch_cold(connection_id, fetch)
+
+    if _is_stale(stamp) and _claim_refresh(connection_id):
+        task = asyncio.create_task(_arefresh_quietly(connection_id, fetch))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+    return context
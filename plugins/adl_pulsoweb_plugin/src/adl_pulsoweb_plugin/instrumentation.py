@@ -0,0 +1,246 @@
+import hashlib
+import logging
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# The Django setting naming the sinks metrics go to: "logging", "statsd",
+# "prometheus", or the dotted path of a sink class. Unset, nothing is timed
+# and every hook costs one list check.
+METRICS_SINKS_SETTING = "ADL_PULSOWEB_METRICS_SINKS"
+
+# Where StatsdSink sends, and the prefix of every name it sends, unless the
+# Django settings of the same names say otherwise.
+STATSD_HOST = "localhost"
+STATSD_PORT = 8125
+STATSD_PREFIX = "adl.pulsoweb"
+
+# The prefix of every name PrometheusSink exposes.
+PROMETHEUS_PREFIX = "pulsoweb"
+
+# Tags PrometheusSink drops, summing their series into one: each of their
+# values would be a series held in the cache for ever, one per station.
+PROMETHEUS_DROPPED_TAGS = ("station",)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class LoggingSink:
+    """Logs each measurement, at info level."""
+
+    def emit(self, name, value, unit, tags):
+        labels = " ".join(f"{key}={value}" for key, value in sorted(tags.items()))
+
+        logger.info(f"[ADL_PULSOWEB_PLUGIN] {name} {value:g} {unit} {labels}".rstrip())
+
+
+class StatsdSink:
+    """
+    Sends each measurement to a statsd daemon over UDP, with DogStatsD-style
+    tags: seconds as a timing in milliseconds, counts and bytes as counters.
+    A daemon that is not there loses the measurement, never the call.
+    """
+
+    def __init__(self):
+        self.address = (getattr(settings, "ADL_PULSOWEB_STATSD_HOST", STATSD_HOST),
+                        getattr(settings, "ADL_PULSOWEB_STATSD_PORT", STATSD_PORT))
+        self.prefix = getattr(settings, "ADL_PULSOWEB_STATSD_PREFIX", STATSD_PREFIX)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def format(self, name, value, unit, tags):
+        if unit == "seconds":
+            line = f"{self.prefix}.{name}:{value * 1000:g}|ms"
+        else:
+            line = f"{self.prefix}.{name}:{value:g}|c"
+
+        if tags:
+            line += "|#" + ",".join(f"{key}:{value}" for key, value in sorted(tags.items()))
+
+        return line
+
+    def emit(self, name, value, unit, tags):
+        try:
+            self.socket.sendto(self.format(name, value, unit, tags).encode(), self.address)
+        except OSError:
+            pass
+
+
+class PrometheusSink:
+    """
+    Aggregates measurements in the Django cache, for the metrics view to
+    render in Prometheus' text format: seconds as a summary's sum and count,
+    counts and bytes as counters.
+
+    In the shared cache rather than in memory, because the process serving
+    the view is not the one fetching data: every worker's measurements add
+    up in one place. The cache only increments integers, so sums of seconds
+    are kept in microseconds. Per-station tags are dropped, so the series
+    stay as few as the connections and paths.
+    """
+
+    key = "pulsoweb_metrics"
+
+    def __init__(self):
+        self._registered = set()
+        self._lock = threading.Lock()
+
+    def _series_key(self, series):
+        return f"{self.key}_{hashlib.sha1(repr(series).encode()).hexdigest()}"
+
+    def _incr(self, key, delta):
+        cache.add(key, 0, None)
+
+        try:
+            return cache.incr(key, delta)
+        except ValueError:
+            # Evicted between add() and incr().
+            cache.set(key, delta, None)
+            return delta
+
+    def _register(self, series):
+        with self._lock:
+            if series in self._registered:
+                return
+
+            self._registered.add(series)
+
+        key = self._series_key(series)
+
+        # Once across every worker: add() decides which one lists it.
+        if cache.add(f"{key}_registered", True, None):
+            index = self._incr(f"{self.key}_count", 1)
+            cache.set(f"{self.key}_series_{index}", series, None)
+
+    def emit(self, name, value, unit, tags):
+        series = (name, unit, tuple(sorted((key, str(value)) for key, value in tags.items()
+                                           if key not in PROMETHEUS_DROPPED_TAGS)))
+        self._register(series)
+
+        key = self._series_key(series)
+
+        if unit == "seconds":
+            self._incr(f"{key}_sum", int(value * 1_000_000))
+            self._incr(f"{key}_count", 1)
+        else:
+            self._incr(f"{key}_sum", int(value))
+
+    def render(self):
+        count = cache.get(f"{self.key}_count") or 0
+        listed = cache.get_many([f"{self.key}_series_{index}" for index in range(1, count + 1)])
+        series_list = sorted(set(listed.values()))
+
+        totals = cache.get_many([f"{self._series_key(series)}_{part}"
+                                 for series in series_list for part in ("sum", "count")])
+
+        lines = []
+        typed = set()
+
+        for series in series_list:
+            name, unit, tags = series
+            key = self._series_key(series)
+            suffix = "" if unit == "count" else f"_{unit}"
+            metric = f"{PROMETHEUS_PREFIX}_{name.replace('.', '_')}{suffix}"
+            labels = ",".join(f'{label}="{_escape(value)}"' for label, value in tags)
+            labels = f"{{{labels}}}" if labels else ""
+
+            if unit == "seconds":
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} summary")
+                    typed.add(metric)
+
+                lines.append(f"{metric}_sum{labels} {totals.get(f'{key}_sum', 0) / 1_000_000}")
+                lines.append(f"{metric}_count{labels} {totals.get(f'{key}_count', 0)}")
+            else:
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric}_total counter")
+                    typed.add(metric)
+
+                lines.append(f"{metric}_total{labels} {totals.get(f'{key}_sum', 0)}")
+
+        return "\n".join(lines) + "\n"
+
+
+SINKS = {
+    "logging": LoggingSink,
+    "statsd": StatsdSink,
+    "prometheus": PrometheusSink,
+}
+
+_sinks = None
+_sinks_lock = threading.Lock()
+
+
+def get_sinks():
+    """Returns the configured sinks, built on first use."""
+
+    global _sinks
+
+    if _sinks is None:
+        with _sinks_lock:
+            if _sinks is None:
+                names = getattr(settings, METRICS_SINKS_SETTING, None) or []
+                _sinks = [(SINKS.get(name) or import_string(name))() for name in names]
+
+    return _sinks
+
+
+def set_sinks(sinks):
+    """
+    Replaces the configured sinks with instances given; None reads the
+    setting again on next use.
+    """
+
+    global _sinks
+
+    with _sinks_lock:
+        _sinks = sinks
+
+
+def get_sink(sink_class):
+    """Returns the configured sink of a class, or None."""
+
+    return next((sink for sink in get_sinks() if isinstance(sink, sink_class)), None)
+
+
+def emit(name, value, unit="count", **tags):
+    """Sends one measurement to every sink. A failing sink is logged, never raised."""
+
+    for sink in get_sinks():
+        try:
+            sink.emit(name, value, unit, tags)
+        except Exception:
+            logger.exception(f"[ADL_PULSOWEB_PLUGIN] Metrics sink {type(sink).__name__} failed.")
+
+
+@contextmanager
+def timed(name, **tags):
+    """
+    Times the block and emits it in seconds. Yields the tags, for the block
+    to add what it learns; "outcome" is set to "ok" or "error" unless the
+    block set it.
+    """
+
+    if not get_sinks():
+        yield tags
+        return
+
+    start = time.perf_counter()
+
+    try:
+        yield tags
+    except BaseException:
+        tags.setdefault("outcome", "error")
+        raise
+    else:
+        tags.setdefault("outcome", "ok")
+    finally:
+        emit(name, time.perf_counter() - start, "seconds", **tags)
@@ -0,0 +1,182 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import NamedTuple
+
+from adl.core.models import DataParameter, Unit
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import PulsoWebConnection, PulsoWebVariableMapping
+
+# How long the shared cache keeps a compiled mapping. Every edit invalidates
+# it at once; the timeout only bounds an edit made where no signal fires, such
+# as a queryset update() in a shell.
+MAPPINGS_CACHE_TIMEOUT = 3600
+
+# The process-local layer, as the context cache has one. Each read still
+# checks the shared version, so an edit in any process is seen by every
+# other on its next read.
+MAPPINGS_L1_TIMEOUT = 300
+MAPPINGS_L1_MAXSIZE = 64
+
+_l1 = OrderedDict()
+_l1_lock = threading.Lock()
+
+
+class CompiledMappings(NamedTuple):
+    """
+    A connection's variable mappings, in their configured order, with their
+    ADL parameter, its unit and the PulsoWeb unit loaded, and the codes they
+    map. `version` names the edit it was compiled after.
+    """
+
+    version: str
+    mappings: list
+    codes: list
+
+
+def mappings_cache_key(connection_id):
+    return f"pulsoweb_mappings_{connection_id}"
+
+
+def mappings_version_cache_key(connection_id):
+    return f"{mappings_cache_key(connection_id)}_version"
+
+
+def _l1_get(key, version):
+    with _l1_lock:
+        entry = _l1.get(key)
+
+        if entry is None:
+            return None
+
+        compiled, expires = entry
+
+        if compiled.version != version or expires <= time.monotonic():
+            del _l1[key]
+            return None
+
+        _l1.move_to_end(key)
+
+        return compiled
+
+
+def _l1_set(key, compiled):
+    with _l1_lock:
+        _l1[key] = (compiled, time.monotonic() + MAPPINGS_L1_TIMEOUT)
+        _l1.move_to_end(key)
+
+        while len(_l1) > MAPPINGS_L1_MAXSIZE:
+            _l1.popitem(last=False)
+
+
+def clear_l1(connection_id=None):
+    """
+    Drops this process's entry for one connection, or every entry when none
+    is given.
+    """
+
+    with _l1_lock:
+        if connection_id is None:
+            _l1.clear()
+        else:
+            _l1.pop(mappings_cache_key(connection_id), None)
+
+
+def _current_version(connection_id):
+    version_key = mappings_version_cache_key(connection_id)
+    version = cache.get(version_key)
+
+    if version is None:
+        # add() so that racing readers settle on one version.
+        cache.add(version_key, uuid.uuid4().hex, MAPPINGS_CACHE_TIMEOUT)
+        version = cache.get(version_key)
+
+    return version
+
+
+def compile_mappings(connection_id, version=None):
+    """Loads a connection's mappings in one query."""
+
+    mappings = list(
+        PulsoWebVariableMapping.objects
+        .filter(network_pulsoweb_id=connection_id)
+        .select_related("adl_parameter", "adl_parameter__unit", "pulsoweb_parameter_unit")
+        .order_by("sort_order", "pk")
+    )
+
+    return CompiledMappings(version, mappings, [mapping.pulsoweb_parameter_code for mapping in mappings])
+
+
+def get_compiled_mappings(connection_id):
+    """
+    Returns a saved connection's CompiledMappings, from this process, the
+    shared cache or, after an edit, the database.
+
+    The version is read before the query: an edit landing while the query
+    runs moves the version on, so what the query returned is compiled under
+    the old one and read again by the next caller.
+    """
+
+    key = mappings_cache_key(connection_id)
+    version = _current_version(connection_id)
+
+    compiled = _l1_get(key, version)
+
+    if compiled is not None:
+        return compiled
+
+    compiled = cache.get(key)
+
+    if not isinstance(compiled, CompiledMappings) or compiled.version != version:
+        compiled = compile_mappings(connection_id, version)
+        cache.set(key, compiled, MAPPINGS_CACHE_TIMEOUT)
+
+    _l1_set(key, compiled)
+
+    return compiled
+
+
+def invalidate_mappings(connection_id):
+    """Makes every process compile a connection's mappings again."""
+
+    clear_l1(connection_id)
+    cache.set(mappings_version_cache_key(connection_id), uuid.uuid4().hex, MAPPINGS_CACHE_TIMEOUT)
+
+
+def _invalidate_now_and_on_commit(connection_id):
+    if connection_id is None:
+        return
+
+    # Now, for this process's reads inside the transaction; on commit, so a
+    # reader that compiled from the database before the commit is not
+    # believed after it.
+    invalidate_mappings(connection_id)
+    transaction.on_commit(lambda: invalidate_mappings(connection_id))
+
+
+@receiver(post_save, sender=PulsoWebVariableMapping)
+@receiver(post_delete, sender=PulsoWebVariableMapping)
+def invalidate_on_mapping_change(sender, instance, **kwargs):
+    _invalidate_now_and_on_commit(instance.network_pulsoweb_id)
+
+
+@receiver(post_save, sender=PulsoWebConnection)
+@receiver(post_delete, sender=PulsoWebConnection)
+def invalidate_on_connection_change(sender, instance, **kwargs):
+    _invalidate_now_and_on_commit(instance.pk)
+
+
+@receiver(post_save, sender=DataParameter)
+@receiver(post_delete, sender=DataParameter)
+@receiver(post_save, sender=Unit)
+@receiver(post_delete, sender=Unit)
+def invalidate_on_parameter_change(sender, instance, **kwargs):
+    # The compiled mappings carry the parameters and units they name. Edits
+    # to those are rare, so every connection is compiled again.
+    for connection_id in PulsoWebConnection.objects.values_list("pk", flat=True):
+        _invalidate_now_and_on_commit(connection_id)
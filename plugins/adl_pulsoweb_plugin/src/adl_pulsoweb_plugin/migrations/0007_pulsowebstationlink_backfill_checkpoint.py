@@ -0,0 +1,28 @@
+# Generated by Django 6.0.7 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adl_pulsoweb_plugin', '0006_alter_pulsowebstationlink_start_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pulsowebstationlink',
+            name='backfill_cursor',
+            field=models.DateTimeField(blank=True, help_text='Data up to this date was fetched before the last backfill stopped. The next run resumes from here rather than from the backfill start.', null=True, verbose_name='Backfilled Until'),
+        ),
+        migrations.AddField(
+            model_name='pulsowebstationlink',
+            name='backfill_end',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Backfill End'),
+        ),
+        migrations.AddField(
+            model_name='pulsowebstationlink',
+            name='backfill_start',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Backfill Start'),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 6.0.7 on 2026-10-17 17:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adl_pulsoweb_plugin', '0007_pulsowebstationlink_backfill_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PulsoWebContextSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('refreshed_at', models.DateTimeField(verbose_name='Refreshed At')),
+                ('stations_count', models.PositiveIntegerField(default=0)),
+                ('connection', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='context_snapshot', to='adl_pulsoweb_plugin.pulsowebconnection')),
+            ],
+            options={
+                'verbose_name': 'PulsoWeb Context Snapshot',
+                'verbose_name_plural': 'PulsoWeb Context Snapshots',
+            },
+        ),
+        migrations.CreateModel(
+            name='PulsoWebSnapshotGranularity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=255)),
+                ('label', models.CharField(blank=True, default='', max_length=255)),
+                ('description', models.TextField(blank=True, default='')),
+                ('position', models.PositiveIntegerField()),
+                ('snapshot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='granularities', to='adl_pulsoweb_plugin.pulsowebcontextsnapshot')),
+            ],
+            options={
+                'ordering': ['position'],
+                'indexes': [models.Index(fields=['snapshot', 'code'], name='pulsoweb_snap_gran_code_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PulsoWebSnapshotObservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=255)),
+                ('label', models.CharField(blank=True, default='', max_length=255)),
+                ('unit', models.CharField(blank=True, default='', max_length=255)),
+                ('description', models.TextField(blank=True, default='')),
+                ('granularity_code', models.CharField(blank=True, default='', max_length=255)),
+                ('stations_count', models.PositiveIntegerField(default=0)),
+                ('position', models.PositiveIntegerField()),
+                ('snapshot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='observations', to='adl_pulsoweb_plugin.pulsowebcontextsnapshot')),
+            ],
+            options={
+                'ordering': ['position'],
+                'indexes': [models.Index(fields=['snapshot', 'code'], name='pulsoweb_snap_obs_code_idx'), models.Index(fields=['snapshot', 'granularity_code'], name='pulsoweb_snap_obs_gran_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PulsoWebSnapshotStation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('observation_code', models.CharField(max_length=255)),
+                ('code', models.CharField(max_length=255)),
+                ('name', models.CharField(blank=True, default='', max_length=255)),
+                ('position', models.PositiveIntegerField()),
+                ('snapshot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='observation_stations', to='adl_pulsoweb_plugin.pulsowebcontextsnapshot')),
+            ],
+            options={
+                'ordering': ['position'],
+                'indexes': [models.Index(fields=['snapshot', 'observation_code'], name='pulsoweb_snap_station_obs_idx')],
+            },
+        ),
+    ]
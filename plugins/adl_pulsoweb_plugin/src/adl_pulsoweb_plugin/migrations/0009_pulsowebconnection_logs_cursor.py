@@ -0,0 +1,18 @@
+# Generated by Django 6.0.7 on 2026-10-17 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adl_pulsoweb_plugin', '0008_pulsowebcontextsnapshot_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pulsowebconnection',
+            name='logs_cursor',
+            field=models.DateTimeField(blank=True, help_text='Uploads logged up to this date have been acted on. The next run reads the logs from here to tell which stations have new data.', null=True, verbose_name='Logs Read Until'),
+        ),
+    ]
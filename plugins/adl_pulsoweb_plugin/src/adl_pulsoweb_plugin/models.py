@@ -1,9 +1,13 @@
+import logging
+from datetime import timezone as dt_timezone
 from urllib.parse import urlparse
 
 import requests
 from adl.core.models import DataParameter, Unit
 from adl.core.models import NetworkConnection, StationLink
+from django.core.exceptions import FieldError
 from django.db import models
+from django.db.models import Max
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 from modelcluster.fields import ParentalKey
@@ -11,8 +15,31 @@ from wagtail.admin.panels import MultiFieldPanel, FieldPanel, InlinePanel
 from wagtail.models import Orderable
 
 from .client import CONTEXT_PATH, PulsoWebClient, category_for_status
+from .units import convert_units_enabled, get_mapping_conversion
 from .validators import validate_start_date
 
+logger = logging.getLogger(__name__)
+
+
+def _in_window_zone(value, window_date):
+    """
+    A saved time in the form of a fetch window's dates: in the window's
+    timezone where it is aware, and naive UTC where it is not. The window's
+    dates are written out as wall-clock strings, so a time handed back to it
+    must read on the same clock.
+    """
+
+    if window_date.tzinfo is None:
+        if value.tzinfo is None:
+            return value
+
+        return value.astimezone(dt_timezone.utc).replace(tzinfo=None)
+
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=dt_timezone.utc)
+
+    return value.astimezone(window_date.tzinfo)
+
 
 class PulsoWebConnection(NetworkConnection):
     station_link_model_string_label = "adl_pulsoweb_plugin.PulsoWebStationLink"
@@ -20,11 +47,24 @@ class PulsoWebConnection(NetworkConnection):
                                     verbose_name=_("API Base URL"))
     api_token = models.CharField(max_length=255, verbose_name=_("API Token"))
 
+    # Where the next read of the source's upload logs starts, when runs are
+    # driven by them. Written by get_connection_data() only.
+    logs_cursor = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name=_("Logs Read Until"),
+        help_text=_(
+            "Uploads logged up to this date have been acted on. The next run "
+            "reads the logs from here to tell which stations have new data."
+        ),
+    )
+
     panels = NetworkConnection.panels + [
         MultiFieldPanel([
             FieldPanel("api_base_url"),
             FieldPanel("api_token"),
         ], heading=_("PulsoWeb API Credentials")),
+        FieldPanel("logs_cursor", read_only=True),
         InlinePanel("variable_mappings", label=_("Variable Mapping"), heading=_("Variable Mappings")),
     ]
 
@@ -32,7 +72,7 @@ class PulsoWebConnection(NetworkConnection):
         verbose_name = _("PulsoWeb Connection")
         verbose_name_plural = _("PulsoWeb Connections")
 
-    def get_api_client(self, use_cache=True, timeout=None, retries=None):
+    def get_api_client(self, use_cache=True, timeout=None, retries=None, pool_maxsize=None):
         """
         Returns a client for this connection's PulsoWeb API.
 
@@ -41,6 +81,10 @@ class PulsoWebConnection(NetworkConnection):
         use_cache=False, timeout=5, retries=0 to stay inside the diagnostic
         probe's budget and to avoid reading a cached context as evidence that
         the source is up.
+
+        Every client for this connection in a process posts through one
+        pooled session; pool_maxsize sizes it for the number of threads that
+        will share it.
         """
 
         return PulsoWebClient(
@@ -50,6 +94,66 @@ class PulsoWebConnection(NetworkConnection):
             use_cache=use_cache,
             timeout=timeout,
             retries=retries,
+            pool_maxsize=pool_maxsize,
+        )
+
+    def save_logs_cursor(self, cursor):
+        """
+        Persists the logs cursor. Written with an update rather than save(),
+        so a run never overwrites the connection's configuration with what it
+        loaded at start.
+        """
+
+        self.logs_cursor = cursor
+
+        PulsoWebConnection.objects.filter(pk=self.pk).update(logs_cursor=cursor)
+
+    def get_latest_observation_times(self, station_links):
+        """
+        Returns station id -> the time of the latest observation core has
+        saved for it from this connection, for the given links, in one
+        query. A station with nothing saved is left out, as is every station
+        where it cannot be told.
+        """
+
+        station_ids = [station_link.station_id for station_link in station_links]
+
+        if not station_ids:
+            return {}
+
+        # Lazy, and guarded, as in get_latest_observation_time(): a core
+        # whose records cannot be read this way only has every link fetched.
+        try:
+            from adl.core.models import ObservationRecord
+
+            rows = ObservationRecord.objects.filter(
+                station_id__in=station_ids,
+                connection_id=self.pk,
+            ).values("station_id").annotate(latest=Max("time"))
+
+            return {row["station_id"]: row["latest"] for row in rows}
+        except (ImportError, FieldError):
+            logger.warning("[ADL_PULSOWEB_PLUGIN] Could not read the latest saved observations; "
+                           "fetching every station.", exc_info=True)
+            return {}
+
+    def get_async_api_client(self, use_cache=True, timeout=None, retries=None, max_connections=None):
+        """
+        Returns the asyncio counterpart of get_api_client(), for fanning many
+        calls out from one event loop. The caller closes it.
+        """
+
+        # Lazy: only an asyncio caller needs httpx loaded.
+        from .async_client import AsyncPulsoWebClient
+
+        return AsyncPulsoWebClient(
+            self.api_base_url,
+            self.api_token,
+            self.id,
+            use_cache=use_cache,
+            timeout=timeout,
+            retries=retries,
+            max_connections=max_connections,
         )
 
     @property
@@ -155,6 +259,62 @@ class PulsoWebConnection(NetworkConnection):
             },
         )
 
+    def check_station_sources(self, station_links=None):
+        """
+        check_station_source() for many station links of this connection at
+        once, from one download of the station list rather than one each.
+
+        Returns one SourceCheckResult per link, in the order given; every link
+        of the connection when none are given. The cache is bypassed, as it
+        is for a single link.
+        """
+
+        if station_links is None:
+            station_links = list(PulsoWebStationLink.objects.filter(network_connection=self))
+        else:
+            station_links = list(station_links)
+
+        if not station_links:
+            return []
+
+        try:
+            client = self.get_api_client(use_cache=False, timeout=5, retries=0)
+            context = client.get_indexed_context()
+        except requests.RequestException as e:
+            # One unreadable list fails every link alike, and proves nothing
+            # about any of them.
+            failure = self.station_list_failure(e)
+            return [failure for _ in station_links]
+
+        # Nor does a body without a station list, which would otherwise read
+        # as an empty one and mark every link PATH_NOT_FOUND in one pass.
+        if not context.has_station_list:
+            failure = self.station_list_failure(_("the response was not a PulsoWeb context"))
+            return [failure for _ in station_links]
+
+        # The index keys codes as strings, so a configured integer finds an
+        # upstream string and the reverse, as the single check's scan does.
+        return [station_link.station_source_result(context.get_station_by_code(station_link.pulsoweb_station_code))
+                for station_link in station_links]
+
+    def station_list_failure(self, error):
+        """The result of a station-scoped check that could not read the list."""
+
+        # Lazy, per the same rule as check_source().
+        from adl.core.source_checks import SourceCheckResult, SourceCheckStatus
+
+        # No category: a failure to read the list proves nothing about any
+        # station, and PATH_NOT_FOUND is claimed on positive proof only.
+        # Never swallowed into OK.
+        return SourceCheckResult(
+            status=SourceCheckStatus.FAILED,
+            message=_("Could not read the station list from "
+                      "%(host)s: %(error)s") % {
+                "host": self.source_host,
+                "error": error,
+            },
+        )
+
     def get_extra_model_admin_links(self):
         columns = [
             {
@@ -169,7 +329,15 @@ class PulsoWebConnection(NetworkConnection):
 
     @property
     def observation_codes(self):
-        return [mapping.pulsoweb_parameter_code for mapping in self.variable_mappings.all()]
+        # An unsaved connection's mappings may be in memory only, as in a
+        # form preview; a saved one's are compiled once and cached.
+        if self.pk is None:
+            return [mapping.pulsoweb_parameter_code for mapping in self.variable_mappings.all()]
+
+        # Lazy: the mappings module imports these models.
+        from .mappings import get_compiled_mappings
+
+        return get_compiled_mappings(self.pk).codes
 
 
 class PulsoWebVariableMapping(Orderable):
@@ -195,8 +363,13 @@ class PulsoWebVariableMapping(Orderable):
     @property
     def source_parameter_unit(self):
         """
-        Returns the unit of the PulsoWeb variable.
+        Returns the unit of the PulsoWeb variable, as the values handed to
+        core are in it: the ADL parameter's own unit where the plugin
+        converted them already.
         """
+        if convert_units_enabled() and get_mapping_conversion(self) is not None:
+            return self.adl_parameter.unit
+
         return self.pulsoweb_parameter_unit
 
 
@@ -215,9 +388,29 @@ class PulsoWebStationLink(StationLink):
         ),
     )
 
+    # The checkpoint of a backfill that stopped partway: the window it was
+    # fetching, and how far into it chunks were fetched and handed to core.
+    # Written by get_station_data() only, and empty once a window completes.
+    backfill_start = models.DateTimeField(blank=True, null=True, verbose_name=_("Backfill Start"))
+    backfill_end = models.DateTimeField(blank=True, null=True, verbose_name=_("Backfill End"))
+    backfill_cursor = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name=_("Backfilled Until"),
+        help_text=_(
+            "Data up to this date was fetched before the last backfill stopped. "
+            "The next run resumes from here rather than from the backfill start."
+        ),
+    )
+
     panels = StationLink.panels + [
         FieldPanel("pulsoweb_station_code"),
         FieldPanel("start_date"),
+        MultiFieldPanel([
+            FieldPanel("backfill_start", read_only=True),
+            FieldPanel("backfill_end", read_only=True),
+            FieldPanel("backfill_cursor", read_only=True),
+        ], heading=_("Backfill Progress")),
     ]
 
     class Meta:
@@ -233,9 +426,6 @@ class PulsoWebStationLink(StationLink):
         (layer 5, station-scoped).
         """
 
-        # Lazy, per the same rule as check_source().
-        from adl.core.source_checks import SourceCheckResult, SourceCheckStatus
-
         connection = self.network_connection
 
         try:
@@ -244,22 +434,31 @@ class PulsoWebStationLink(StationLink):
             # as absent, which is a confident false PATH_NOT_FOUND, and one
             # deleted upstream as present.
             client = connection.get_api_client(use_cache=False, timeout=5, retries=0)
-            stations = client.get_stations_metadata()
+            context = client.get_indexed_context()
         except requests.RequestException as e:
-            # No category: a failure to read the list proves nothing about
-            # this station, and PATH_NOT_FOUND is claimed on positive proof
-            # only. Never swallowed into OK.
-            return SourceCheckResult(
-                status=SourceCheckStatus.FAILED,
-                message=_("Could not read the station list from "
-                          "%(host)s: %(error)s") % {
-                    "host": connection.source_host,
-                    "error": e,
-                },
-            )
+            return connection.station_list_failure(e)
+
+        # A body without a station list was not a list that lacks this
+        # station: it proves nothing about it, as check_source() says of the
+        # same body.
+        if not context.has_station_list:
+            return connection.station_list_failure(_("the response was not a PulsoWeb context"))
+
+        station_code = str(self.pulsoweb_station_code)
+        match = next((s for s in context.stations if str(s.get("code")) == station_code), None)
+
+        return self.station_source_result(match)
+
+    def station_source_result(self, match):
+        """
+        The check's result, given this station's entry in a station list that
+        was received and parsed, or None where it is not in it.
+        """
+
+        # Lazy, per the same rule as check_source().
+        from adl.core.source_checks import SourceCheckResult, SourceCheckStatus
 
         station_code = str(self.pulsoweb_station_code)
-        match = next((s for s in stations if str(s.get("code")) == station_code), None)
 
         if match is None:
             # Positive proof: the list was received and parsed, and this
@@ -284,13 +483,87 @@ class PulsoWebStationLink(StationLink):
 
         return SourceCheckResult(status=SourceCheckStatus.OK, message=message)
 
+    def get_backfill_resume_date(self, start_date, end_date):
+        """
+        Returns where a fetch of start_date..end_date resumes from: the
+        checkpoint's cursor when an earlier backfill covering start_date
+        stopped inside this window, otherwise start_date.
+
+        A checkpoint whose backfill began after start_date is not resumed
+        from, since the stretch before it was never fetched: moving the
+        collection start date back fetches that stretch again.
+        """
+
+        cursor = self.backfill_cursor
+
+        if cursor is None or self.backfill_start is None or start_date is None or end_date is None:
+            return start_date
+
+        # The checkpoint is read back aware, in UTC.
+        cursor = _in_window_zone(cursor, start_date)
+        backfill_start = _in_window_zone(self.backfill_start, start_date)
+
+        if backfill_start <= start_date < cursor < end_date:
+            return cursor
+
+        return start_date
+
+    def save_backfill_checkpoint(self, start_date=None, end_date=None, cursor=None):
+        """
+        Persists the backfill checkpoint; called with no arguments, clears
+        it. Written with an update rather than save(), so a run never
+        overwrites the link's configuration with what it loaded at start.
+        """
+
+        self.backfill_start = start_date
+        self.backfill_end = end_date
+        self.backfill_cursor = cursor
+
+        PulsoWebStationLink.objects.filter(pk=self.pk).update(
+            backfill_start=start_date,
+            backfill_end=end_date,
+            backfill_cursor=cursor,
+        )
+
+    def get_latest_observation_time(self):
+        """
+        Returns the time of the latest observation core has saved for this
+        link's station from this connection, or None where there is none or
+        it cannot be told.
+        """
+
+        # Lazy, and guarded: the record model is core's, and a core whose
+        # records cannot be read this way only loses the trimmed window.
+        try:
+            from adl.core.models import ObservationRecord
+
+            latest = ObservationRecord.objects.filter(
+                station_id=self.station_id,
+                connection_id=self.network_connection_id,
+            ).aggregate(latest=Max("time"))["latest"]
+        except (ImportError, FieldError):
+            logger.warning("[ADL_PULSOWEB_PLUGIN] Could not read the latest saved observation; "
+                           "fetching the whole window.", exc_info=True)
+            return None
+
+        return latest
+
     def get_variable_mappings(self):
         """
         Returns the variable mappings for this station link.
         """
 
         connection = self.network_connection
-        return connection.variable_mappings.all()
+
+        if connection.pk is None:
+            return connection.variable_mappings.all()
+
+        # Lazy, as in observation_codes.
+        from .mappings import get_compiled_mappings
+
+        # Shared by every link of the connection, so a list copy: a caller
+        # editing it cannot edit the others'.
+        return list(get_compiled_mappings(connection.pk).mappings)
 
     def get_first_collection_date(self):
         """
@@ -298,3 +571,72 @@ class PulsoWebStationLink(StationLink):
         Returns None if no start date is set.
         """
         return self.start_date
+
+
+class PulsoWebContextSnapshot(models.Model):
+    """
+    A connection's context as last fetched, materialised for the admin
+    metadata pages, which read it from the database instead of calling the
+    API. Written only by snapshots.refresh_context_snapshot().
+    """
+
+    connection = models.OneToOneField(PulsoWebConnection, on_delete=models.CASCADE,
+                                      related_name="context_snapshot")
+    # The fingerprint of the context the rows were built from: a refresh
+    # finding the same one rewrites nothing.
+    fingerprint = models.CharField(max_length=64)
+    refreshed_at = models.DateTimeField(verbose_name=_("Refreshed At"))
+    stations_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = _("PulsoWeb Context Snapshot")
+        verbose_name_plural = _("PulsoWeb Context Snapshots")
+
+    def __str__(self):
+        return f"{self.connection} - {self.refreshed_at}"
+
+
+class PulsoWebSnapshotGranularity(models.Model):
+    snapshot = models.ForeignKey(PulsoWebContextSnapshot, on_delete=models.CASCADE, related_name="granularities")
+    code = models.CharField(max_length=255)
+    label = models.CharField(max_length=255, blank=True, default="")
+    description = models.TextField(blank=True, default="")
+    # The source's order, which the pages list in.
+    position = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ["position"]
+        indexes = [models.Index(fields=["snapshot", "code"], name="pulsoweb_snap_gran_code_idx")]
+
+
+class PulsoWebSnapshotObservation(models.Model):
+    snapshot = models.ForeignKey(PulsoWebContextSnapshot, on_delete=models.CASCADE, related_name="observations")
+    code = models.CharField(max_length=255)
+    label = models.CharField(max_length=255, blank=True, default="")
+    unit = models.CharField(max_length=255, blank=True, default="")
+    description = models.TextField(blank=True, default="")
+    granularity_code = models.CharField(max_length=255, blank=True, default="")
+    stations_count = models.PositiveIntegerField(default=0)
+    position = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ["position"]
+        indexes = [
+            models.Index(fields=["snapshot", "code"], name="pulsoweb_snap_obs_code_idx"),
+            models.Index(fields=["snapshot", "granularity_code"], name="pulsoweb_snap_obs_gran_idx"),
+        ]
+
+
+class PulsoWebSnapshotStation(models.Model):
+    """One station reporting one observation: the observation -> stations map."""
+
+    snapshot = models.ForeignKey(PulsoWebContextSnapshot, on_delete=models.CASCADE,
+                                 related_name="observation_stations")
+    observation_code = models.CharField(max_length=255)
+    code = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, blank=True, default="")
+    position = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ["position"]
+        indexes = [models.Index(fields=["snapshot", "observation_code"], name="pulsoweb_snap_station_obs_idx")]
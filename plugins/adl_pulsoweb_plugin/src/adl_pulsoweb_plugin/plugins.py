@@ -1,18 +1,65 @@
+import inspect
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
+from datetime import timezone as dt_timezone
+from typing import NamedTuple
 
 from adl.core.registries import Plugin
+from django.conf import settings
+from django.db import connections
+from django.urls import path
 from django.utils import timezone as dj_timezone
 
+from .backfill import BackfillPlanner, merge_records
+from .changes import detect_station_changes, log_driven_enabled
+from .client import POOL_MAXSIZE
+from .instrumentation import emit, timed
+from .models import PulsoWebStationLink
+from .units import convert_columns, convert_units_enabled, get_conversions
+from .views import pulsoweb_metrics
+
 logger = logging.getLogger(__name__)
 
+# Threads a connection-level run fetches its station links on. Kept within
+# the client's POOL_MAXSIZE, so every thread gets a pooled socket.
+MAX_WORKERS = min(8, POOL_MAXSIZE)
+
+# How far before the latest saved observation a window still starts, so data
+# the source received late is picked up on the next run. A Django setting of
+# the same name, in seconds, says otherwise.
+INCREMENTAL_OVERLAP = timedelta(minutes=10)
+
+# Windows longer than this are parsed as the body streams in, rather than
+# decoded whole first. An hourly run stays on the plain path.
+STREAM_WINDOW = timedelta(days=1)
+
+
+class StationDataResult(NamedTuple):
+    """
+    The outcome of one station link in a connection-level run: what
+    get_station_data(), or process_station(), returned, or the exception it
+    raised.
+    `skipped` is set, with no records, where the source's logs showed no
+    upload from the station and it was not fetched.
+    """
+
+    station_link: object
+    records: list = None
+    error: Exception = None
+    skipped: bool = False
+
 
 class PulsoWebPlugin(Plugin):
     type = "adl_pulsoweb_plugin"
     label = "ADL Pulsoweb Plugin"
 
     def get_urls(self):
-        return []
+        # Outside the admin, so a Prometheus server can scrape it with its
+        # bearer token.
+        return [
+            path("pulsoweb/metrics/", pulsoweb_metrics, name="adl_pulsoweb_plugin_metrics"),
+        ]
 
     def get_default_end_date(self, station_link):
         timezone = station_link.timezone
@@ -32,25 +79,348 @@ class PulsoWebPlugin(Plugin):
 
         logger.info(f"[ADL_PULSOWEB_PLUGIN] Starting data processing for {network_conn_name}.")
 
-        pulsoweb_client = network_connection.get_api_client()
+        try:
+            with timed("station_data", station=station_link.pulsoweb_station_code):
+                records = self._get_station_data(station_link, start_date, end_date)
+        except Exception as e:
+            # Core's process_station() handles a failed fetch itself, so the
+            # failure is left on the link for a connection-level run to see.
+            station_link.fetch_error = e
+            raise
+
+        emit("station_data.rows", len(records), station=station_link.pulsoweb_station_code)
+
+        return records
 
-        observation_codes = network_connection.observation_codes
+    def _get_station_data(self, station_link, start_date, end_date):
+        network_connection = station_link.network_connection
 
-        # PulsoWeb API expects dates as UTC string format
-        start_date_str = start_date.strftime("%Y-%m-%dT%H:%M:%S")
-        end_date_str = end_date.strftime("%Y-%m-%dT%H:%M:%S")
+        pulsoweb_client = network_connection.get_api_client()
 
         station_code = station_link.pulsoweb_station_code
 
-        records, sources_count = pulsoweb_client.get_observation_data(station_code, observation_codes,
-                                                                      start_date_str, end_date_str)
+        incremental_start = self._get_incremental_start_date(station_link, start_date, end_date)
 
-        # Committed only once a response is in hand and parsed: a call that
-        # raised leaves this None, and core abstains rather than reading a 0
-        # as "the source offered nothing".
-        if station_link.adl_sources_count is None:
-            station_link.adl_sources_count = 0
+        if incremental_start is not None and incremental_start >= end_date:
+            # Core already holds everything up to the end of the window. The
+            # source was not asked, so the count stays None and core
+            # abstains.
+            logger.info(f"[ADL_PULSOWEB_PLUGIN] Station {station_code} has data saved up to {end_date}; "
+                        f"nothing new to fetch.")
+            emit("station_data.up_to_date", 1, station=station_code)
+            return []
 
-        station_link.adl_sources_count += sources_count
+        if incremental_start is not None and incremental_start > start_date:
+            logger.info(f"[ADL_PULSOWEB_PLUGIN] Station {station_code} has data saved; fetching from "
+                        f"{incremental_start} rather than {start_date}.")
+            start_date = incremental_start
 
-        return records
+        observation_codes = self._get_station_observation_codes(pulsoweb_client, station_code,
+                                                                network_connection.observation_codes)
+
+        if not observation_codes:
+            # The context says this station reports none of the mapped
+            # observations. The context may be stale, and the source was not
+            # asked, so adl_sources_count stays None and core abstains rather
+            # than reading a 0 as "the source offered nothing".
+            logger.info(f"[ADL_PULSOWEB_PLUGIN] Station {station_code} reports none of the mapped "
+                        f"observations; skipping it.")
+            emit("station_data.skipped", 1, station=station_code)
+            return []
+
+        # A backfill that stopped partway resumes from its checkpoint, rather
+        # than fetching again what an earlier run already handed to core.
+        resume_date = station_link.get_backfill_resume_date(start_date, end_date)
+
+        if resume_date != start_date:
+            logger.info(f"[ADL_PULSOWEB_PLUGIN] Resuming the backfill of station {station_code} "
+                        f"from {resume_date}.")
+            backfill_start = station_link.backfill_start
+        else:
+            backfill_start = start_date
+
+        # With conversion on, values are fetched as columns and converted to
+        # each ADL parameter's unit a column at a time; the mappings then tell
+        # core they are already in it.
+        conversions = get_conversions(station_link.get_variable_mappings()) if convert_units_enabled() else {}
+
+        # A long window is fetched as consecutive chunks, so no single call
+        # outgrows the read timeout or the worker's memory.
+        planner = BackfillPlanner(resume_date, end_date, len(observation_codes))
+        chunks = []
+        completed = None
+
+        for chunk_start, chunk_end in planner:
+            # PulsoWeb API expects dates as UTC string format
+            start_date_str = chunk_start.strftime("%Y-%m-%dT%H:%M:%S")
+            end_date_str = chunk_end.strftime("%Y-%m-%dT%H:%M:%S")
+
+            stream = chunk_end - chunk_start > STREAM_WINDOW
+
+            try:
+                records, sources_count = pulsoweb_client.get_observation_data(station_code, observation_codes,
+                                                                              start_date_str, end_date_str,
+                                                                              stream=stream,
+                                                                              columnar=bool(conversions))
+            except Exception:
+                # With nothing fetched the run fails, as it always has. With
+                # chunks in hand, they are handed to core and the checkpoint
+                # marks where the next run picks up.
+                if completed is None:
+                    raise
+
+                logger.exception(f"[ADL_PULSOWEB_PLUGIN] Backfill of station {station_code} stopped at "
+                                 f"{completed}; the next run resumes from there.")
+                break
+
+            # Committed only once a response is in hand and parsed: a call that
+            # raised leaves this None, and core abstains rather than reading a 0
+            # as "the source offered nothing". Per chunk, so a chunk failing
+            # keeps the count of those before it.
+            if station_link.adl_sources_count is None:
+                station_link.adl_sources_count = 0
+
+            station_link.adl_sources_count += sources_count
+
+            if conversions:
+                with timed("station_data.convert", station=station_code):
+                    records = convert_columns(records, conversions).to_records()
+
+            planner.record(sources_count)
+            chunks.append(records)
+            completed = chunk_end
+
+        if completed != end_date:
+            station_link.save_backfill_checkpoint(backfill_start, end_date, completed)
+        elif station_link.backfill_cursor is not None:
+            # Done: an hourly run after this writes nothing.
+            station_link.save_backfill_checkpoint()
+
+        emit("station_data.chunks", len(chunks), station=station_code)
+
+        if len(chunks) == 1:
+            return chunks[0]
+
+        merged = {}
+
+        for records in chunks:
+            merge_records(merged, records)
+
+        return list(merged.values())
+
+    def _get_incremental_start_date(self, station_link, start_date, end_date):
+        """
+        Where the window can start given what core has saved: the latest
+        saved observation, less INCREMENTAL_OVERLAP, or the end of the window
+        itself when core already holds it all. None where nothing is saved
+        or there is no window to trim.
+        """
+
+        if start_date is None or end_date is None:
+            return None
+
+        latest = station_link.get_latest_observation_time()
+
+        if latest is None:
+            return None
+
+        # Saved times are aware; the window may not be, and is then UTC, as
+        # the API reads it. An aware window is written out in its own wall
+        # clock, so the start taken from a saved time must be in it too.
+        if start_date.tzinfo is None and latest.tzinfo is not None:
+            latest = latest.astimezone(dt_timezone.utc).replace(tzinfo=None)
+        elif start_date.tzinfo is not None and latest.tzinfo is None:
+            latest = latest.replace(tzinfo=dt_timezone.utc).astimezone(start_date.tzinfo)
+        elif start_date.tzinfo is not None:
+            latest = latest.astimezone(start_date.tzinfo)
+
+        if latest >= end_date:
+            return end_date
+
+        overlap = getattr(settings, "ADL_PULSOWEB_INCREMENTAL_OVERLAP", None)
+        overlap = INCREMENTAL_OVERLAP if overlap is None else timedelta(seconds=overlap)
+
+        return latest - overlap
+
+    def _get_station_observation_codes(self, pulsoweb_client, station_code, observation_codes):
+        """
+        The mapped observation codes the station lists in the connection's
+        context, in mapping order. All of them where the context cannot be
+        read or does not say, so a pruned request is only ever sent on the
+        source's own word.
+        """
+
+        try:
+            station_observations = pulsoweb_client.get_indexed_context().get_station_observations(station_code)
+        except Exception:
+            logger.warning(f"[ADL_PULSOWEB_PLUGIN] Could not read the context to prune station "
+                           f"{station_code}'s observations; requesting all of them.", exc_info=True)
+            return observation_codes
+
+        if station_observations is None:
+            return observation_codes
+
+        pruned = [code for code in observation_codes if code in station_observations]
+
+        if len(pruned) < len(observation_codes):
+            emit("station_data.pruned", len(observation_codes) - len(pruned), station=station_code)
+
+        return pruned
+
+    def run_process(self, network_connection, initial_start_date=None):
+        """
+        Core's run of a connection, with its station links processed
+        concurrently rather than one after another.
+
+        Each link is still processed by core's own
+        process_station(station_link, initial_start_date), which works out
+        the link's window, calls get_station_data(), saves what it returns,
+        and handles and logs a failure itself. A link it raises for does not
+        stop the others.
+
+        Returns what process_station() returned for each enabled link, in
+        order, leaving out the links it raised for and those the source's
+        logs showed idle. A core whose Plugin has no process_station() taking
+        those arguments runs the connection its own way, through
+        super().run_process().
+        """
+
+        if not self._has_process_station():
+            return super().run_process(network_connection, initial_start_date)
+
+        station_links = [station_link for station_link in self._get_station_links(network_connection)
+                         if getattr(station_link, "enabled", True)]
+
+        # Core works out each link's window itself, ending it at the current
+        # hour, in the station's timezone.
+        end_date = min((self.get_default_end_date(station_link) for station_link in station_links), default=None)
+
+        # Wrapped, so a link process_station() returned None for is still
+        # told apart from one it raised for.
+        results = self._run_station_links(network_connection, station_links,
+                                          lambda station_link: (self.process_station(station_link,
+                                                                                     initial_start_date),),
+                                          end_date)
+
+        return [result.records[0] for result in results if result.records is not None and not result.skipped]
+
+    def _has_process_station(self):
+        process_station = getattr(self, "process_station", None)
+
+        if not callable(process_station):
+            return False
+
+        try:
+            inspect.signature(process_station).bind(None, None)
+        except (TypeError, ValueError):
+            return False
+
+        return True
+
+    def get_connection_data(self, network_connection, start_date, end_date, station_links=None,
+                            max_workers=None):
+        """
+        Fetches the station links of a connection concurrently, each exactly
+        as get_station_data() fetches it alone, and returns what was fetched
+        without saving it: run_process() is the run that saves.
+
+        Returns one StationDataResult per link, in the order given. One link
+        failing never stops the others: its exception is returned in its
+        result, and its adl_sources_count is left as get_station_data() left
+        it, so a failed link still reads None.
+        """
+
+        if station_links is None:
+            station_links = self._get_station_links(network_connection)
+        else:
+            station_links = list(station_links)
+
+        return self._run_station_links(network_connection, station_links,
+                                       lambda station_link: self.get_station_data(station_link, start_date,
+                                                                                  end_date),
+                                       end_date, max_workers)
+
+    def _get_station_links(self, network_connection):
+        station_links = list(PulsoWebStationLink.objects.filter(network_connection=network_connection))
+
+        # Every thread then reads the one connection already in hand, rather
+        # than each loading it again.
+        for station_link in station_links:
+            station_link.network_connection = network_connection
+
+        return station_links
+
+    def _run_station_links(self, network_connection, station_links, work, end_date, max_workers=None):
+        """
+        Runs work(station_link) for each link on a thread pool, and returns
+        one StationDataResult per link, in order, carrying what work
+        returned. `end_date` is where the run's windows end.
+
+        Calls to the source are capped per host by the client's rate limiter,
+        across every worker, so the pool only bounds this run's threads.
+
+        With ADL_PULSOWEB_LOG_DRIVEN on, the connection's upload logs are read
+        first, and a link whose station logged no upload since the last run
+        is skipped: its adl_sources_count stays None, as the source was not
+        asked. The logs cursor moves on, to end_date at most, only once every
+        link has succeeded, so a failed link is fetched again on the next run.
+        A fetch counts as failed where work raised, or where get_station_data()
+        raised inside it, as when process_station() handles the failure
+        itself.
+        """
+
+        if not station_links:
+            return []
+
+        changes = None
+
+        if log_driven_enabled():
+            with timed("connection_data.logs"):
+                changes = detect_station_changes(network_connection, network_connection.get_api_client(),
+                                                 end_date=end_date)
+
+        results = {}
+        to_run = []
+
+        fetches = changes.select(network_connection, station_links) if changes is not None else None
+
+        for index, station_link in enumerate(station_links):
+            if fetches is None or fetches[index]:
+                to_run.append((index, station_link))
+            else:
+                results[index] = StationDataResult(station_link, records=[], skipped=True)
+
+        if changes is not None:
+            emit("connection_data.idle", len(results))
+
+        if to_run:
+            max_workers = min(max_workers or MAX_WORKERS, len(to_run))
+
+            def run(station_link):
+                station_link.fetch_error = None
+
+                try:
+                    records = work(station_link)
+                except Exception as e:
+                    logger.exception(f"[ADL_PULSOWEB_PLUGIN] Failed to fetch data for station "
+                                     f"{station_link.pulsoweb_station_code}.")
+                    return StationDataResult(station_link, error=e)
+                finally:
+                    # A worker thread's database connection is its own, and
+                    # outlives the thread unless closed here.
+                    connections.close_all()
+
+                return StationDataResult(station_link, records=records, error=station_link.fetch_error)
+
+            with ThreadPoolExecutor(max_workers=max_workers,
+                                    thread_name_prefix="adl-pulsoweb") as executor:
+                ran = executor.map(run, [station_link for _, station_link in to_run])
+
+                results.update((index, result) for (index, _), result in zip(to_run, ran))
+
+        results = [results[index] for index in range(len(station_links))]
+
+        if changes is not None and not any(result.error is not None for result in results):
+            network_connection.save_logs_cursor(changes.cursor)
+
+        return results
@@ -0,0 +1,257 @@
+import asyncio
+import logging
+import time
+import uuid
+from urllib.parse import urlparse
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# These are defaults, for a tenant on PulsoWeb's usual quota. The
+# ADL_PULSOWEB_* settings read below them configure a tenant with another,
+# without a code change.
+
+# The request rate a host starts at, and the bounds it adapts between, in
+# calls per second across every worker. A call the host throttles halves the
+# rate; every RATE_LIMIT_INCREASE_INTERVAL seconds of calls it accepts adds
+# one back. The rate so settles just under the highest the tenant accepts,
+# rather than bursting into 429s and backing off in turns.
+RATE_LIMIT_PER_SECOND = 10
+RATE_LIMIT_MIN = 1
+RATE_LIMIT_MAX = 50
+RATE_LIMIT_INCREASE_INTERVAL = 10
+
+# Calls in flight to one host at once, across every worker. Each is a lease
+# in the cache, so a worker that dies mid-call frees its slot when the lease
+# runs out.
+MAX_CONCURRENT_PER_HOST = 8
+RATE_LIMIT_LEASE = 300
+
+# How long a call waits for a token and a slot before going ahead anyway,
+# logged: a limiter that can stall ingestion outright is worse than a burst.
+RATE_LIMIT_MAX_WAIT = 120
+
+# How often a call waiting on a busy host looks for a free slot.
+RATE_LIMIT_POLL = 0.05
+
+# The statuses a host throttles with. 503 is included: a tenant shedding load
+# answers with it as often as with 429.
+THROTTLE_STATUSES = (429, 503)
+
+# How long a throttled host is left alone when it sends no Retry-After.
+DEFAULT_RETRY_AFTER = 1
+
+
+def _setting(name, default):
+    value = getattr(settings, name, None)
+
+    return default if value is None else value
+
+
+def rate_limit():
+    return _setting("ADL_PULSOWEB_RATE_LIMIT", RATE_LIMIT_PER_SECOND)
+
+
+def rate_limit_max():
+    return _setting("ADL_PULSOWEB_RATE_LIMIT_MAX", RATE_LIMIT_MAX)
+
+
+def max_concurrent_per_host():
+    return _setting("ADL_PULSOWEB_MAX_CONCURRENT_PER_HOST", MAX_CONCURRENT_PER_HOST)
+
+
+def max_wait():
+    return _setting("ADL_PULSOWEB_RATE_LIMIT_MAX_WAIT", RATE_LIMIT_MAX_WAIT)
+
+
+def throttle_statuses():
+    return tuple(_setting("ADL_PULSOWEB_THROTTLE_STATUSES", THROTTLE_STATUSES))
+
+
+def _retry_after(response):
+    value = response.headers.get("Retry-After")
+
+    try:
+        return max(float(value), 0)
+    except (TypeError, ValueError):
+        # Absent, or an HTTP date, which no PulsoWeb tenant has been seen to
+        # send.
+        return DEFAULT_RETRY_AFTER
+
+
+class HostRateLimiter:
+    """
+    A token bucket and a concurrency cap for one host, shared by every
+    worker through the Django cache.
+
+    The cache offers no atomic read-modify-write but add() and incr(), so the
+    bucket is refilled whole once a second: each second's calls are counted
+    under their own key, and a call beyond the rate waits for the next
+    second.
+
+    Use acquire() and release() around a call, or the instance as a (sync or
+    async) context manager, then report the response to record().
+    """
+
+    def __init__(self, host):
+        self.host = host
+        self.key = f"pulsoweb_rate_{host}"
+        self._slot = None
+
+    def rate(self):
+        return cache.get(f"{self.key}_rate") or rate_limit()
+
+    def _take_slot(self):
+        owner = uuid.uuid4().hex
+
+        for index in range(max_concurrent_per_host()):
+            slot_key = f"{self.key}_slot_{index}"
+
+            if cache.add(slot_key, owner, RATE_LIMIT_LEASE):
+                return slot_key, owner
+
+        return None
+
+    def _take_token(self):
+        """
+        Takes a token from this second's bucket. Returns 0 when one was
+        taken, otherwise how long to wait before trying again.
+        """
+
+        now = time.time()
+        backoff_until = cache.get(f"{self.key}_backoff")
+
+        if backoff_until is not None and backoff_until > now:
+            return backoff_until - now
+
+        second = int(now)
+        window_key = f"{self.key}_window_{second}"
+
+        cache.add(window_key, 0, 2)
+
+        try:
+            taken = cache.incr(window_key)
+        except ValueError:
+            # Expired between add() and incr(): the second is over.
+            return 0.001
+
+        if taken <= self.rate():
+            return 0
+
+        return second + 1 - now
+
+    def _try_acquire(self):
+        """
+        Takes a slot, then a token. Returns 0 once both are held, otherwise
+        how long to wait before trying again.
+        """
+
+        if self._slot is None:
+            self._slot = self._take_slot()
+
+            if self._slot is None:
+                return RATE_LIMIT_POLL
+
+        return self._take_token()
+
+    def acquire(self):
+        deadline = time.monotonic() + max_wait()
+
+        while time.monotonic() < deadline:
+            wait = self._try_acquire()
+
+            if not wait:
+                return
+
+            time.sleep(min(wait, max(deadline - time.monotonic(), 0)))
+
+        logger.warning(f"[ADL_PULSOWEB_PLUGIN] Waited {max_wait()}s for a request slot on "
+                       f"{self.host}; sending anyway.")
+
+    async def aacquire(self):
+        # The cache calls run off the event loop, as Django's own async cache
+        # methods run them: a DatabaseCache refuses to query on the loop, and
+        # any backend would block every other call while it answered.
+        try_acquire = sync_to_async(self._try_acquire)
+        deadline = time.monotonic() + max_wait()
+
+        while time.monotonic() < deadline:
+            wait = await try_acquire()
+
+            if not wait:
+                return
+
+            await asyncio.sleep(min(wait, max(deadline - time.monotonic(), 0)))
+
+        logger.warning(f"[ADL_PULSOWEB_PLUGIN] Waited {max_wait()}s for a request slot on "
+                       f"{self.host}; sending anyway.")
+
+    def release(self):
+        if self._slot is None:
+            return
+
+        slot_key, owner = self._slot
+        self._slot = None
+
+        # Never another worker's slot, taken after our lease ran out.
+        if cache.get(slot_key) == owner:
+            cache.delete(slot_key)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    async def __aenter__(self):
+        await self.aacquire()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.arelease()
+
+    async def arelease(self):
+        await sync_to_async(self.release)()
+
+    def record(self, response):
+        """
+        Adapts the rate to a response: halved on a throttle, and the host
+        left alone for its Retry-After; one step up, at most once per
+        RATE_LIMIT_INCREASE_INTERVAL, on anything the host accepted.
+        """
+
+        rate_key = f"{self.key}_rate"
+
+        if response.status_code in throttle_statuses():
+            rate = max(self.rate() // 2, RATE_LIMIT_MIN)
+            retry_after = _retry_after(response)
+
+            cache.set(rate_key, rate, None)
+            cache.set(f"{self.key}_backoff", time.time() + retry_after, int(retry_after) + 1)
+
+            logger.warning(f"[ADL_PULSOWEB_PLUGIN] {self.host} throttled a call with HTTP "
+                           f"{response.status_code}; slowing to {rate} call(s) per second.")
+            return
+
+        if response.status_code >= 400:
+            return
+
+        rate = self.rate()
+
+        if rate < rate_limit_max() and cache.add(f"{self.key}_increase", 1, RATE_LIMIT_INCREASE_INTERVAL):
+            cache.set(rate_key, rate + 1, None)
+
+    async def arecord(self, response):
+        """The asyncio form of record()."""
+
+        await sync_to_async(self.record)(response)
+
+
+def get_rate_limiter(baseurl):
+    """Returns a limiter for one call to the host of a connection's base URL."""
+
+    return HostRateLimiter(urlparse(baseurl).hostname)
@@ -0,0 +1,8 @@
+from django.dispatch import Signal
+
+# Sent by the worker that refreshed a connection's context, once, when the
+# refresh changed it. Receivers get `connection_id` and `delta`, a
+# context.ContextDelta. A refresh returning the same catalogue sends nothing,
+# and neither does the first download into a cold cache: with nothing to
+# compare against, any delta would be invented.
+context_changed = Signal()
@@ -0,0 +1,181 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# How long a worker holds the right to make a call on behalf of every other
+# worker asking for the same one. Long enough for a streamed backfill chunk;
+# a leader that dies frees it when it runs out.
+SINGLE_FLIGHT_LEASE = 300
+
+# How long a finished call's result stays in the shared cache for the workers
+# that were waiting on it. Only those workers read it: this is not a data
+# cache, and a window asked for again once the call is over is fetched again.
+# A result is stored only when some worker registered as waiting.
+SINGLE_FLIGHT_RESULT_TIMEOUT = 30
+
+# How often a worker waiting on another worker's call looks for its result.
+SINGLE_FLIGHT_POLL = 0.5
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# Calls in flight in this process, by key.
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def flight_key(connection_id, path, payload):
+    """
+    The key identical calls share: the connection, the path and the payload,
+    with the observation codes in a canonical order. Never the token, which
+    the client adds to the payload after this.
+    """
+
+    payload = {**payload}
+
+    if "observations" in payload:
+        payload["observations"] = sorted(payload["observations"])
+
+    digest = hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    return f"pulsoweb_flight_{connection_id}_{path}_{digest}"
+
+
+def single_flight(key, call, shared=True):
+    """
+    Returns call()'s result, making the call once however many callers ask
+    for `key` at the same time.
+
+    Threads of this process asking while a call is in flight wait for it and
+    receive its result, or its exception. With shared=True, workers in other
+    processes do too, through the Django cache: one takes a lease and makes
+    the call, the rest register as waiting and receive the result it then
+    stores for them. A worker whose leader failed, or outlived its lease,
+    makes the call itself rather than wait on nothing.
+
+    Concurrent callers receive the same result object, and must not mutate
+    it.
+    """
+
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        flight.done.wait()
+
+        if flight.error is not None:
+            raise flight.error
+
+        return flight.result
+
+    try:
+        flight.result = _shared_flight(key, call) if shared else call()
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+
+        flight.done.set()
+
+    return flight.result
+
+
+def _result_key(key):
+    return f"{key}_result"
+
+
+def _lock_key(key):
+    return f"{key}_lock"
+
+
+def _waiters_key(key, owner):
+    return f"{key}_waiters_{owner}"
+
+
+def _shared_flight(key, call):
+    owner = uuid.uuid4().hex
+
+    if not cache.add(_lock_key(key), owner, SINGLE_FLIGHT_LEASE):
+        return _wait_for_flight(key, call)
+
+    try:
+        result = call()
+
+        # Pickled and stored only for workers that asked: a call nobody else
+        # is waiting on, the common case, costs no more than its lease.
+        if cache.get(_waiters_key(key, owner)):
+            try:
+                cache.set(_result_key(key), (owner, result), SINGLE_FLIGHT_RESULT_TIMEOUT)
+            except Exception:
+                # A result over the backend's item size (memcached's 1 MB) is
+                # simply not shared; the waiters then make the call
+                # themselves.
+                logger.warning(f"[ADL_PULSOWEB_PLUGIN] Could not share the result of {key}.", exc_info=True)
+
+        return result
+    finally:
+        # Released on failure too, so the waiters stop waiting. Never another
+        # worker's lease, taken after ours ran out.
+        if cache.get(_lock_key(key)) == owner:
+            cache.delete(_lock_key(key))
+
+
+def _wait_for_flight(key, call):
+    """
+    Waits on the call another worker leads, and returns the result it stores
+    for us. A leader that finished before we registered, failed, or outlived
+    its lease stores nothing, and the call is made here instead.
+    """
+
+    owner = cache.get(_lock_key(key))
+
+    if owner is None:
+        return call()
+
+    waiters_key = _waiters_key(key, owner)
+    cache.add(waiters_key, 0, SINGLE_FLIGHT_LEASE)
+
+    try:
+        cache.incr(waiters_key)
+    except ValueError:
+        # Expired between add() and incr(): the lease is long over.
+        return call()
+
+    deadline = time.monotonic() + SINGLE_FLIGHT_LEASE
+
+    while time.monotonic() < deadline:
+        time.sleep(SINGLE_FLIGHT_POLL)
+
+        # The lease is read first: the leader stores before releasing, so a
+        # released lease means the result, if any, is there to read.
+        released = cache.get(_lock_key(key)) != owner
+
+        # Tagged with the leader's lease, so a result left by an earlier call
+        # on this key is not taken for this one's.
+        stored = cache.get(_result_key(key))
+
+        if stored is not None and stored[0] == owner:
+            return stored[1]
+
+        if released:
+            break
+
+    return call()
@@ -0,0 +1,159 @@
+import hashlib
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .context import SECTIONS, fingerprint_context
+from .context_cache import invalidate_context
+from .models import (
+    PulsoWebConnection,
+    PulsoWebContextSnapshot,
+    PulsoWebSnapshotGranularity,
+    PulsoWebSnapshotObservation,
+    PulsoWebSnapshotStation,
+)
+from .signals import context_changed
+
+logger = logging.getLogger(__name__)
+
+# Rows written per INSERT. A 10k-station tenant maps to some 200k
+# observation -> station rows.
+SNAPSHOT_BATCH_SIZE = 5000
+
+
+def _text(value, limit=255):
+    return "" if value is None else str(value)[:limit]
+
+
+def snapshot_fingerprint(raw):
+    """One fingerprint for a whole raw context, from its sections' own."""
+
+    fingerprints = fingerprint_context(raw)
+
+    return hashlib.sha256("".join(fingerprints[name] for name in SECTIONS).encode()).hexdigest()
+
+
+def build_snapshot_rows(context, snapshot=None):
+    """
+    Returns the unsaved granularity, observation and observation -> station
+    rows of an indexed context, in the order the pages list them. Codes are
+    stored as strings, as the admin URLs carry them.
+    """
+
+    granularities = [PulsoWebSnapshotGranularity(
+        snapshot=snapshot,
+        code=_text(gran.get("code")),
+        label=_text(gran.get("label")),
+        description=_text(gran.get("description"), limit=None),
+        position=position,
+    ) for position, gran in enumerate(context.granularities)]
+
+    observations = [PulsoWebSnapshotObservation(
+        snapshot=snapshot,
+        code=_text(obs.get("code")),
+        label=_text(obs.get("label")),
+        unit=_text(obs.get("unit")),
+        description=_text(obs.get("description"), limit=None),
+        granularity_code=_text(obs.get("granularity")),
+        stations_count=len(context.stations_by_observation.get(obs.get("code"), [])),
+        position=position,
+    ) for position, obs in enumerate(context.observations)]
+
+    stations = []
+
+    for obs_code, obs_stations in context.stations_by_observation.items():
+        for station in obs_stations:
+            stations.append(PulsoWebSnapshotStation(
+                snapshot=snapshot,
+                observation_code=_text(obs_code),
+                code=_text(station.get("code")),
+                name=_text(station.get("name")),
+                position=len(stations),
+            ))
+
+    return granularities, observations, stations
+
+
+def refresh_context_snapshot(connection):
+    """
+    Rebuilds a connection's snapshot from its context, read through the
+    client's cache like any other read, and returns it. A context with the
+    snapshot's fingerprint only moves refreshed_at.
+    """
+
+    context = connection.get_api_client().get_indexed_context()
+    fingerprint = snapshot_fingerprint(context.raw)
+    now = timezone.now()
+
+    with transaction.atomic():
+        # Locked, so two workers refreshing at once write one set of rows.
+        snapshot, _ = PulsoWebContextSnapshot.objects.select_for_update().get_or_create(
+            connection=connection, defaults={"fingerprint": "", "refreshed_at": now})
+
+        snapshot.refreshed_at = now
+
+        if snapshot.fingerprint == fingerprint:
+            snapshot.save(update_fields=["refreshed_at"])
+            return snapshot
+
+        snapshot.fingerprint = fingerprint
+        snapshot.stations_count = len(context.stations)
+        snapshot.save()
+
+        snapshot.granularities.all().delete()
+        snapshot.observations.all().delete()
+        snapshot.observation_stations.all().delete()
+
+        granularities, observations, stations = build_snapshot_rows(context, snapshot)
+
+        PulsoWebSnapshotGranularity.objects.bulk_create(granularities, batch_size=SNAPSHOT_BATCH_SIZE)
+        PulsoWebSnapshotObservation.objects.bulk_create(observations, batch_size=SNAPSHOT_BATCH_SIZE)
+        PulsoWebSnapshotStation.objects.bulk_create(stations, batch_size=SNAPSHOT_BATCH_SIZE)
+
+    logger.info(f"[ADL_PULSOWEB_PLUGIN] Refreshed the context snapshot of {connection.name}: "
+                f"{len(granularities)} granularities, {len(observations)} observations, "
+                f"{len(stations)} observation stations.")
+
+    return snapshot
+
+
+def schedule_snapshot_refresh(connection_id):
+    """
+    Queues a refresh of one connection's snapshot. A broker that cannot be
+    reached is logged, never raised: the periodic refresh catches up.
+    """
+
+    # Lazy: only queuing needs Celery loaded.
+    from .tasks import refresh_context_snapshot_task
+
+    try:
+        refresh_context_snapshot_task.delay(connection_id)
+    except Exception:
+        logger.exception(f"[ADL_PULSOWEB_PLUGIN] Could not queue a snapshot refresh for connection "
+                         f"{connection_id}.")
+
+
+@receiver(context_changed)
+def refresh_snapshot_on_context_change(sender, connection_id=None, **kwargs):
+    # Only a saved connection has a snapshot; a load harness's or a test's
+    # stand-in id names no row.
+    if isinstance(connection_id, int):
+        schedule_snapshot_refresh(connection_id)
+
+
+def _refresh_after_save(connection_id):
+    # The cached context was downloaded with what the connection said before
+    # the edit, so it is dropped first: the refresh then reads the source
+    # with the new URL and token, not the cache.
+    invalidate_context(connection_id)
+    schedule_snapshot_refresh(connection_id)
+
+
+@receiver(post_save, sender=PulsoWebConnection)
+def refresh_snapshot_on_connection_save(sender, instance, **kwargs):
+    # A new connection's pages fill without waiting for the periodic
+    # refresh, and an edited URL or token is read again.
+    transaction.on_commit(lambda: _refresh_after_save(instance.pk))
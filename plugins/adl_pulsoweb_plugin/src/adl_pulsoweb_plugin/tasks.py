@@ -0,0 +1,37 @@
+import logging
+
+from celery import shared_task
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(name="adl_pulsoweb_plugin.refresh_context_snapshot")
+def refresh_context_snapshot_task(connection_id):
+    from .models import PulsoWebConnection
+    from .snapshots import refresh_context_snapshot
+
+    connection = PulsoWebConnection.objects.filter(pk=connection_id).first()
+
+    # Deleted since the refresh was queued.
+    if connection is None:
+        return
+
+    refresh_context_snapshot(connection)
+
+
+@shared_task(name="adl_pulsoweb_plugin.refresh_context_snapshots")
+def refresh_context_snapshots():
+    """
+    Refreshes every connection's snapshot. Scheduled by the plugin's settings
+    hook; one connection failing never stops the others.
+    """
+
+    from .models import PulsoWebConnection
+    from .snapshots import refresh_context_snapshot
+
+    for connection in PulsoWebConnection.objects.all():
+        try:
+            refresh_context_snapshot(connection)
+        except Exception:
+            logger.exception(f"[ADL_PULSOWEB_PLUGIN] Could not refresh the context snapshot of "
+                             f"{connection.name}.")
@@ -0,0 +1,149 @@
+"""
+Tests for ``AsyncPulsoWebClient``: it must fail, stamp and cache exactly as
+the blocking client does. The transport is httpx's own mock; nothing leaves
+the process and nothing touches the database.
+"""
+
+from unittest import mock
+
+import httpx
+import requests
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from django.utils.asyncio import async_unsafe
+
+from adl_pulsoweb_plugin import breaker, context_cache, ratelimit
+from adl_pulsoweb_plugin.async_client import AsyncPulsoWebClient
+
+from .test_source_checks import CONTEXT
+
+
+def make_client(handler, connection_id=1, **kwargs):
+    client = AsyncPulsoWebClient("https://app.pulsonic.com/rest", "a-token", connection_id, **kwargs)
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    return client
+
+
+class LoopUnsafeCache:
+    """The shared cache, refusing to be called on a running event loop as a
+    DatabaseCache does."""
+
+    def __getattr__(self, name):
+        method = getattr(cache, name)
+
+        if name.startswith("a") and hasattr(cache, name[1:]):
+            # Django's own async methods, which leave the loop themselves.
+            return method
+
+        return async_unsafe(f"cache.{name}()")(method)
+
+
+class AsyncClientTests(SimpleTestCase):
+
+    async def test_classified_statuses_are_stamped_at_layer_5(self):
+        for status_code, category in [(401, "AUTH_FAILED"), (404, "PATH_NOT_FOUND"),
+                                      (503, "PROTOCOL_ERROR")]:
+            with self.subTest(status_code=status_code):
+                async with make_client(lambda request: httpx.Response(status_code)) as client:
+                    with self.assertRaises(requests.HTTPError) as caught:
+                        await client.post("get_context")
+
+                self.assertEqual(caught.exception.response.status_code, status_code)
+                self.assertEqual(caught.exception.adl_category, category)
+                self.assertEqual(caught.exception.adl_layer, 5)
+
+    async def test_declined_statuses_are_left_unstamped(self):
+        async with make_client(lambda request: httpx.Response(429)) as client:
+            with self.assertRaises(requests.HTTPError) as caught:
+                await client.post("get_context")
+
+        self.assertFalse(hasattr(caught.exception, "adl_category"))
+
+    async def test_transport_failures_raise_the_blocking_clients_types(self):
+        # Core resolves these from the type alone.
+        for error, expected in [(httpx.ConnectError("refused"), requests.ConnectionError),
+                                (httpx.ReadTimeout("timed out"), requests.ReadTimeout)]:
+            with self.subTest(error=type(error).__name__):
+                def handler(request):
+                    raise error
+
+                async with make_client(handler) as client:
+                    with self.assertRaises(expected):
+                        await client.post("get_context")
+
+    async def test_shares_the_blocking_clients_context_cache(self):
+        await cache.adelete("pulsoweb_context_3")
+        self.addCleanup(cache.delete, "pulsoweb_context_3")
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(200, json=CONTEXT)
+
+        async with make_client(handler, connection_id=3) as client:
+            await client.get_context()
+            await client.get_context()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.get("pulsoweb_context_3"), CONTEXT)
+
+    async def test_observation_data_parses_as_the_blocking_client_does(self):
+        body = {"TEMP": [{"date": "2026-08-19T10:00:00", "value": 21.0}],
+                "RH": [{"date": "2026-08-19T10:00:00", "value": 60.0}]}
+
+        async with make_client(lambda request: httpx.Response(200, json=body)) as client:
+            records, sources_count = await client.get_observation_data(5, ["TEMP", "RH"], "from", "to")
+
+        self.assertEqual(sources_count, 2)
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]["TEMP"], 21.0)
+
+    async def test_a_call_records_its_sizes(self):
+        async with make_client(lambda request: httpx.Response(200, json=CONTEXT), use_cache=False) as client:
+            await client.post("get_context")
+
+        transfer = client.last_transfer
+
+        self.assertEqual(transfer.path, "get_context")
+        self.assertEqual(transfer.request_bytes, len(b'{"key": "a-token"}'))
+        self.assertEqual(transfer.response_bytes, len(httpx.Response(200, json=CONTEXT).content))
+
+
+class OffTheLoopTests(SimpleTestCase):
+    """The shared-cache calls around each async call are made off the event
+    loop, where a DatabaseCache can make them and no call blocks another."""
+
+    def setUp(self):
+        for module in (breaker, context_cache, ratelimit):
+            patcher = mock.patch.object(module, "cache", LoopUnsafeCache())
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_the_rate_limiter_runs_off_the_loop(self):
+        limiter = ratelimit.HostRateLimiter("off-the-loop.pulsoweb.test")
+
+        async with limiter:
+            self.assertIsNotNone(limiter._slot)
+
+        self.assertIsNone(limiter._slot)
+        await limiter.arecord(httpx.Response(200))
+
+    async def test_a_call_through_the_breaker_runs_off_the_loop(self):
+        self.addCleanup(cache.delete_many, ["pulsoweb_breaker_9_failures", "pulsoweb_rate_app.pulsonic.com_rate",
+                                            "pulsoweb_rate_app.pulsonic.com_increase"])
+
+        async with make_client(lambda request: httpx.Response(200, json=CONTEXT), connection_id=9) as client:
+            self.assertEqual(await client.post("get_context"), CONTEXT)
+
+        async with make_client(lambda request: httpx.Response(500), connection_id=9) as client:
+            with self.assertRaises(requests.HTTPError):
+                await client.post("get_context")
+
+    async def test_a_cold_context_read_runs_off_the_loop(self):
+        self.addCleanup(cache.delete_many, [context_cache.context_cache_key(10),
+                                            context_cache.context_version_cache_key(10)])
+        context_cache.clear_l1(10)
+
+        async with make_client(lambda request: httpx.Response(200, json=CONTEXT), connection_id=10) as client:
+            self.assertEqual(await client.get_context(), CONTEXT)
@@ -0,0 +1,203 @@
+"""
+Tests for chunked backfills: the planner that splits a long window, and
+``get_station_data()`` fetching and merging the chunks. No database; the
+client is a mock.
+"""
+
+import datetime
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase
+
+from adl_pulsoweb_plugin import backfill
+from adl_pulsoweb_plugin.backfill import BackfillPlanner
+from adl_pulsoweb_plugin.client import PulsoWebClient
+from adl_pulsoweb_plugin.plugins import PulsoWebPlugin
+
+from .test_source_checks import ConnectionStub, StationLinkStub
+
+START = datetime.datetime(2026, 1, 1)
+
+
+class BackfillPlannerTests(SimpleTestCase):
+
+    def test_chunks_tile_the_window_end_to_end(self):
+        end = START + datetime.timedelta(days=90)
+
+        chunks = list(BackfillPlanner(START, end, observation_count=20))
+
+        self.assertEqual(chunks[0][0], START)
+        self.assertEqual(chunks[-1][1], end)
+        for (_, previous_end), (next_start, _) in zip(chunks, chunks[1:]):
+            self.assertEqual(previous_end, next_start)
+
+    def test_more_observations_make_shorter_chunks(self):
+        self.assertLess(BackfillPlanner(START, START, 20).chunk_span,
+                        BackfillPlanner(START, START, 2).chunk_span)
+
+    def test_a_short_window_is_one_chunk(self):
+        end = START + datetime.timedelta(hours=1)
+
+        self.assertEqual(list(BackfillPlanner(START, end, 20)), [(START, end)])
+
+    def test_chunks_are_resized_from_the_density_returned(self):
+        planner = BackfillPlanner(START, START + datetime.timedelta(days=365), observation_count=20)
+        chunks = iter(planner)
+
+        first_start, first_end = next(chunks)
+        # An hourly station: a sixth of the assumed density.
+        planner.record(20 * int((first_end - first_start) / datetime.timedelta(hours=1)))
+        second_start, second_end = next(chunks)
+
+        self.assertGreater(second_end - second_start, first_end - first_start)
+
+    def test_an_empty_chunk_leaves_the_size_alone(self):
+        planner = BackfillPlanner(START, START + datetime.timedelta(days=365), observation_count=1)
+        span = planner.chunk_span
+
+        next(iter(planner))
+        planner.record(0)
+
+        self.assertEqual(planner.chunk_span, span)
+
+
+class ChunkedStationDataTests(SimpleTestCase):
+
+    def fetch(self, station_link, end, get_observation_data):
+        client = mock.Mock(spec=PulsoWebClient)
+        client.get_observation_data.side_effect = get_observation_data
+
+        station_link.network_connection = ConnectionStub(client)
+
+        with mock.patch.object(backfill, "MAX_ITEMS_PER_CALL", 12 * 24):
+            # Two observations at ten minutes: one day per chunk.
+            records = PulsoWebPlugin().get_station_data(station_link, START, end)
+
+        return client, records
+
+    def test_a_long_window_is_fetched_in_chunks_and_merged(self):
+        def get_observation_data(station_code, codes, start, end, stream=False, columnar=False):
+            # Every chunk returns a row on each of its two boundaries, and
+            # reports the density the chunk was sized for.
+            return [{"observation_time": start, "TEMP": 1},
+                    {"observation_time": end, "RH": 2}], 12 * 24
+
+        station_link = StationLinkStub()
+        client, records = self.fetch(station_link, START + datetime.timedelta(days=3),
+                                     get_observation_data)
+
+        self.assertEqual(client.get_observation_data.call_count, 3)
+        # Four distinct instants; the shared boundaries merge into one row.
+        self.assertEqual(len(records), 4)
+        self.assertEqual(records[1], {"observation_time": "2026-01-02T00:00:00", "RH": 2, "TEMP": 1})
+        self.assertEqual(station_link.adl_sources_count, 3 * 12 * 24)
+
+    def test_a_failing_chunk_keeps_the_count_of_those_before_it(self):
+        calls = []
+
+        def get_observation_data(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 2:
+                raise requests.ReadTimeout("timed out")
+            return [], 12 * 24
+
+        station_link = StationLinkStub()
+        self.fetch(station_link, START + datetime.timedelta(days=3), get_observation_data)
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(station_link.adl_sources_count, 12 * 24)
+
+    def test_a_failing_first_chunk_raises(self):
+        def get_observation_data(*args, **kwargs):
+            raise requests.ReadTimeout("timed out")
+
+        station_link = StationLinkStub()
+
+        with self.assertRaises(requests.ReadTimeout):
+            self.fetch(station_link, START + datetime.timedelta(days=3), get_observation_data)
+
+        self.assertIsNone(station_link.adl_sources_count)
+        self.assertEqual(station_link.checkpoints_saved, [])
+
+
+class BackfillCheckpointTests(SimpleTestCase):
+    """A backfill that stops partway hands core what it fetched, and the next
+    run resumes where it stopped."""
+
+    END = START + datetime.timedelta(days=3)
+
+    def fetch(self, station_link, start, get_observation_data):
+        client = mock.Mock(spec=PulsoWebClient)
+        client.get_observation_data.side_effect = get_observation_data
+
+        station_link.network_connection = ConnectionStub(client)
+
+        with mock.patch.object(backfill, "MAX_ITEMS_PER_CALL", 12 * 24):
+            records = PulsoWebPlugin().get_station_data(station_link, start, self.END)
+
+        return client, records
+
+    def test_a_stopped_backfill_returns_what_it_fetched_and_saves_a_checkpoint(self):
+        def get_observation_data(station_code, codes, start, end, stream=False, columnar=False):
+            if start == "2026-01-02T00:00:00":
+                raise requests.HTTPError("502 Bad Gateway")
+            return [{"observation_time": start, "TEMP": 1}], 12 * 24
+
+        station_link = StationLinkStub()
+        _, records = self.fetch(station_link, START, get_observation_data)
+
+        self.assertEqual(records, [{"observation_time": "2026-01-01T00:00:00", "TEMP": 1}])
+        self.assertEqual(station_link.checkpoints_saved,
+                         [(START, self.END, START + datetime.timedelta(days=1))])
+
+    def test_the_next_run_resumes_from_the_checkpoint_and_clears_it(self):
+        station_link = StationLinkStub()
+        station_link.save_backfill_checkpoint(START, self.END, START + datetime.timedelta(days=1))
+
+        client, _ = self.fetch(station_link, START, lambda *args, **kwargs: ([], 12 * 24))
+
+        self.assertEqual(client.get_observation_data.call_count, 2)
+        self.assertEqual(client.get_observation_data.call_args_list[0].args[2], "2026-01-02T00:00:00")
+        self.assertIsNone(station_link.backfill_cursor)
+        self.assertEqual(station_link.checkpoints_saved[-1], (None, None, None))
+
+    def test_an_aware_window_resumes_on_its_own_wall_clock(self):
+        # The checkpoint comes back from the database in UTC; the window is
+        # written out in the station's zone.
+        utc_minus_3 = datetime.timezone(datetime.timedelta(hours=-3))
+        start = START.replace(tzinfo=utc_minus_3)
+        end = self.END.replace(tzinfo=utc_minus_3)
+
+        station_link = StationLinkStub()
+        station_link.save_backfill_checkpoint(start.astimezone(datetime.timezone.utc),
+                                              end.astimezone(datetime.timezone.utc),
+                                              (start + datetime.timedelta(days=1)).astimezone(datetime.timezone.utc))
+
+        client = mock.Mock(spec=PulsoWebClient)
+        client.get_observation_data.return_value = ([], 12 * 24)
+        station_link.network_connection = ConnectionStub(client)
+
+        with mock.patch.object(backfill, "MAX_ITEMS_PER_CALL", 12 * 24):
+            PulsoWebPlugin().get_station_data(station_link, start, end)
+
+        self.assertEqual([call.args[2:4] for call in client.get_observation_data.call_args_list],
+                         [("2026-01-02T00:00:00", "2026-01-03T00:00:00"),
+                          ("2026-01-03T00:00:00", "2026-01-04T00:00:00")])
+
+    def test_a_checkpoint_after_the_requested_start_is_not_resumed(self):
+        # The collection start date was moved back past where the checkpointed
+        # backfill began: that earlier stretch was never fetched.
+        station_link = StationLinkStub()
+        station_link.save_backfill_checkpoint(START + datetime.timedelta(hours=12), self.END,
+                                              START + datetime.timedelta(days=1))
+
+        client, _ = self.fetch(station_link, START, lambda *args, **kwargs: ([], 12 * 24))
+
+        self.assertEqual(client.get_observation_data.call_args_list[0].args[2], "2026-01-01T00:00:00")
+
+    def test_a_run_with_no_checkpoint_writes_none(self):
+        station_link = StationLinkStub()
+        self.fetch(station_link, START, lambda *args, **kwargs: ([], 12 * 24))
+
+        self.assertEqual(station_link.checkpoints_saved, [])
@@ -0,0 +1,70 @@
+"""
+Tests for the offline benchmark suite. The smoke test runs every benchmark at
+a toy size, so the suite cannot rot unnoticed. The scaling tests time real
+sizes and are opt-in: set ADL_PULSOWEB_BENCHMARKS=1 to run them. No database
+and no network; the transport is stubbed.
+"""
+
+import os
+import unittest
+
+from django.test import SimpleTestCase
+
+from adl_pulsoweb_plugin.benchmarks import synthetic
+from adl_pulsoweb_plugin.benchmarks.suite import context_benchmarks, observation_data_benchmarks, run_all
+from adl_pulsoweb_plugin.context import PulsoWebContext
+
+
+class SyntheticPayloadTests(SimpleTestCase):
+
+    def test_a_context_has_the_shape_asked_for(self):
+        raw = synthetic.make_context(stations=50, observations=30, granularities=3, observations_per_station=5)
+        context = PulsoWebContext(raw)
+
+        self.assertEqual(len(context.stations), 50)
+        self.assertEqual(len(context.get_structured_data()), 3)
+        self.assertEqual(sum(len(obs) for obs in context.observations_by_granularity.values()), 30)
+
+    def test_a_body_has_one_item_per_step(self):
+        body = synthetic.make_data(["TEMP", "RH"], hours=2, step_minutes=10)
+
+        self.assertEqual({code: len(items) for code, items in body.items()}, {"TEMP": 12, "RH": 12})
+
+
+class BenchmarkSmokeTests(SimpleTestCase):
+
+    def test_every_benchmark_runs(self):
+        results = run_all(stations=20, observations=10, granularities=2, data_observations=2, hours=2, repeat=1)
+
+        self.assertEqual(len(results), 7)
+        for result in results:
+            self.assertGreater(result.work, 0, result.name)
+            self.assertGreaterEqual(result.seconds, 0, result.name)
+
+
+@unittest.skipUnless(os.environ.get("ADL_PULSOWEB_BENCHMARKS"), "set ADL_PULSOWEB_BENCHMARKS=1 to run")
+class ScalingTests(SimpleTestCase):
+    """
+    Four times the input must cost well under sixteen times the time: a path
+    gone quadratic fails here long before it is noticed in production.
+    """
+
+    FACTOR = 4
+
+    # Linear work is ~4x; quadratic is ~16x. The gap leaves room for noise,
+    # and for a larger working set falling out of the CPU caches, which
+    # alone can cost twice the linear ratio.
+    LIMIT = 10
+
+    def assertScalesLinearly(self, small, large):
+        for before, after in zip(small, large):
+            with self.subTest(benchmark=before.name):
+                self.assertLess(after.seconds / before.seconds, self.LIMIT)
+
+    def test_context_paths(self):
+        self.assertScalesLinearly(context_benchmarks(stations=5_000, observations=250),
+                                  context_benchmarks(stations=5_000 * self.FACTOR, observations=250 * self.FACTOR))
+
+    def test_observation_data_parsing(self):
+        self.assertScalesLinearly(observation_data_benchmarks(hours=24 * 7),
+                                  observation_data_benchmarks(hours=24 * 7 * self.FACTOR))
@@ -0,0 +1,138 @@
+"""
+Tests for the per-connection circuit breaker. No database and no network:
+failures are built in memory, and the client's transport is a mock.
+"""
+
+from unittest import mock
+
+import requests
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from adl_pulsoweb_plugin import breaker
+from adl_pulsoweb_plugin.breaker import BREAKER_THRESHOLD, CircuitBreaker, CircuitOpenError
+from adl_pulsoweb_plugin.client import PulsoWebClient
+
+CONNECTION_ID = 43
+
+
+def http_error(status_code, category=None):
+    response = requests.Response()
+    response.status_code = status_code
+    error = requests.HTTPError(f"{status_code} Error", response=response)
+
+    if category:
+        error.adl_category = category
+        error.adl_layer = 5
+
+    return error
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.breaker = CircuitBreaker(CONNECTION_ID)
+        self.addCleanup(cache.delete_many, [self.breaker._open_key(), self.breaker._failures_key(),
+                                            self.breaker._probe_key()])
+
+    def fail(self, error, times=BREAKER_THRESHOLD):
+        for _ in range(times):
+            self.breaker.check()
+            self.breaker.record_failure(error)
+
+    def test_the_circuit_opens_after_consecutive_failures(self):
+        self.fail(requests.ConnectionError("refused"), BREAKER_THRESHOLD - 1)
+        self.breaker.check()
+
+        self.fail(requests.ConnectionError("refused"), 1)
+
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.check()
+
+    def test_each_failure_extends_the_count(self):
+        self.fail(requests.ConnectionError("refused"), 1)
+
+        with mock.patch.object(breaker.cache, "touch", wraps=breaker.cache.touch) as touch:
+            self.fail(requests.ConnectionError("refused"), 1)
+
+        touch.assert_called_once_with(self.breaker._failures_key(), breaker.BREAKER_FAILURE_TTL)
+
+    def test_an_answer_in_between_resets_the_count(self):
+        self.fail(requests.ReadTimeout("timed out"), BREAKER_THRESHOLD - 1)
+        self.breaker.record_success()
+        self.fail(requests.ReadTimeout("timed out"), BREAKER_THRESHOLD - 1)
+
+        self.breaker.check()
+
+    def test_errors_that_prove_the_source_up_do_not_count(self):
+        self.fail(http_error(401, "AUTH_FAILED"))
+        self.fail(http_error(429))
+
+        self.breaker.check()
+
+    def test_an_open_circuit_is_stamped_as_the_failure_that_opened_it(self):
+        self.fail(http_error(502, "PROTOCOL_ERROR"))
+
+        with self.assertRaises(CircuitOpenError) as raised:
+            self.breaker.check()
+
+        self.assertIsInstance(raised.exception, requests.ConnectionError)
+        self.assertEqual(raised.exception.adl_category, "PROTOCOL_ERROR")
+        self.assertEqual(raised.exception.adl_layer, 5)
+
+    def test_one_probe_at_a_time_once_the_period_is_over(self):
+        self.fail(requests.ConnectionError("refused"))
+
+        with mock.patch.object(breaker.time, "time",
+                               return_value=breaker.time.time() + breaker.BREAKER_OPEN_SECONDS + 1):
+            self.breaker.check()
+
+            with self.assertRaises(CircuitOpenError):
+                CircuitBreaker(CONNECTION_ID).check()
+
+    def test_a_successful_probe_closes_the_circuit(self):
+        self.fail(requests.ConnectionError("refused"))
+
+        with mock.patch.object(breaker.time, "time",
+                               return_value=breaker.time.time() + breaker.BREAKER_OPEN_SECONDS + 1):
+            self.breaker.check()
+            self.breaker.record_success()
+
+        CircuitBreaker(CONNECTION_ID).check()
+
+    def test_a_failed_probe_opens_it_again(self):
+        self.fail(requests.ConnectionError("refused"))
+        later = breaker.time.time() + breaker.BREAKER_OPEN_SECONDS + 1
+
+        with mock.patch.object(breaker.time, "time", return_value=later):
+            self.fail(requests.ConnectionError("refused"), 1)
+
+            with self.assertRaises(CircuitOpenError):
+                CircuitBreaker(CONNECTION_ID).check()
+
+
+class ClientCircuitTests(SimpleTestCase):
+
+    def setUp(self):
+        b = CircuitBreaker(CONNECTION_ID)
+        self.addCleanup(cache.delete_many, [b._open_key(), b._failures_key(), b._probe_key()])
+
+    def test_an_open_circuit_sends_nothing(self):
+        client = PulsoWebClient("https://pulsoweb.test/rest", "token", CONNECTION_ID)
+
+        with mock.patch.object(client, "_send_post", side_effect=requests.ConnectionError("refused")) as send:
+            for _ in range(BREAKER_THRESHOLD + 3):
+                with self.assertRaises(requests.ConnectionError):
+                    client.post("get_data", {})
+
+        self.assertEqual(send.call_count, BREAKER_THRESHOLD)
+
+    def test_a_source_check_ignores_the_circuit(self):
+        self.test_an_open_circuit_sends_nothing()
+        client = PulsoWebClient("https://pulsoweb.test/rest", "token", CONNECTION_ID, use_cache=False)
+
+        with mock.patch.object(client, "_send_post", side_effect=requests.ConnectionError("refused")) as send:
+            with self.assertRaises(requests.ConnectionError):
+                client.get_context()
+
+        send.assert_called_once()
@@ -0,0 +1,214 @@
+"""
+Tests for driving a connection-level run from the source's upload logs. No
+database: the connection and station links are stubs, and the client is a
+mock.
+"""
+
+import datetime
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase, override_settings
+
+from adl_pulsoweb_plugin.changes import StationChanges, detect_station_changes, parse_log_stations
+from adl_pulsoweb_plugin.client import PulsoWebClient
+from adl_pulsoweb_plugin.plugins import PulsoWebPlugin
+
+from .test_connection_data import patch_process_station
+from .test_source_checks import ConnectionStub, StationLinkStub
+
+START = datetime.datetime(2026, 8, 19, 10, 0)
+END = datetime.datetime(2026, 8, 19, 11, 0)
+
+NOW = datetime.datetime(2026, 8, 19, 11, 5, tzinfo=datetime.timezone.utc)
+
+# Where core's run ends each link's window: the current hour.
+CORE_END = datetime.datetime(2026, 8, 19, 11, 0, tzinfo=datetime.timezone.utc)
+CURSOR = datetime.datetime(2026, 8, 19, 10, 5, tzinfo=datetime.timezone.utc)
+
+LOGS = [{"date": "2026-08-19T10:20:00", "station": 1, "message": "Data uploaded"},
+        {"date": "2026-08-19T10:40:00", "station": "3", "message": "Data uploaded"},
+        {"date": "2026-08-19T10:50:00", "message": "Maintenance"}]
+
+
+def saved_link(connection, code):
+    # A link core has saved data for, with no backfill in progress.
+    station_link = StationLinkStub(connection, code=code)
+    station_link.latest_observation_time = START
+
+    return station_link
+
+
+class DetectStationChangesTests(SimpleTestCase):
+
+    def detect(self, cursor=CURSOR, logs=LOGS):
+        client = mock.Mock(spec=PulsoWebClient)
+
+        if isinstance(logs, Exception):
+            client.get_logs.side_effect = logs
+        else:
+            client.get_logs.return_value = logs
+
+        connection = ConnectionStub(client)
+        connection.logs_cursor = cursor
+
+        return client, detect_station_changes(connection, client, now=NOW)
+
+    def test_logs_are_read_from_the_cursor_less_the_overlap(self):
+        client, changes = self.detect()
+
+        client.get_logs.assert_called_once_with("2026-08-19T09:55:00", "2026-08-19T11:05:00")
+        self.assertEqual(changes, StationChanges(frozenset({"1", "3"}), NOW))
+
+    def test_no_cursor_fetches_every_station_without_reading_the_logs(self):
+        client, changes = self.detect(cursor=None)
+
+        client.get_logs.assert_not_called()
+        self.assertEqual(changes, StationChanges(None, NOW))
+
+    def test_unreadable_logs_fetch_every_station(self):
+        for logs in (requests.ConnectionError("refused"), {"error": "unexpected"}):
+            with self.subTest(logs=logs):
+                _, changes = self.detect(logs=logs)
+
+                self.assertIsNone(changes.stations)
+
+    def test_the_cursor_stops_at_the_end_of_the_run_s_window(self):
+        # An upload logged after the window closed, of data inside it, is
+        # read again by the next run. A naive end is UTC.
+        client = mock.Mock(spec=PulsoWebClient)
+        client.get_logs.return_value = LOGS
+
+        connection = ConnectionStub(client)
+        connection.logs_cursor = CURSOR
+
+        changes = detect_station_changes(connection, client, now=NOW, end_date=END)
+
+        self.assertEqual(changes.cursor, END.replace(tzinfo=datetime.timezone.utc))
+        client.get_logs.assert_called_once_with("2026-08-19T09:55:00", "2026-08-19T11:05:00")
+
+    def test_entries_naming_no_station_are_ignored(self):
+        self.assertEqual(parse_log_stations([{"message": "x"}, "noise", {"station": 7}]), frozenset({"7"}))
+
+    def test_links_with_history_to_collect_are_fetched_regardless(self):
+        changes = StationChanges(frozenset(), NOW)
+        connection = ConnectionStub(mock.Mock(spec=PulsoWebClient))
+
+        backfilling = saved_link(connection, 3)
+        backfilling.backfill_cursor = START
+
+        # Saved, never fetched, still backfilling.
+        station_links = [saved_link(connection, 1), StationLinkStub(connection, code=2), backfilling]
+
+        self.assertEqual(changes.select(connection, station_links), [False, True, True])
+
+    def test_the_idle_links_latest_times_are_one_query(self):
+        connection = ConnectionStub(mock.Mock(spec=PulsoWebClient))
+        station_links = [saved_link(connection, code) for code in (1, 2, 3, 4)]
+
+        StationChanges(frozenset({"1"}), NOW).select(connection, station_links)
+
+        self.assertEqual(connection.latest_times_queries, 1)
+
+    def test_logs_that_cannot_tell_query_nothing(self):
+        connection = ConnectionStub(mock.Mock(spec=PulsoWebClient))
+
+        fetches = StationChanges(None, NOW).select(connection, [saved_link(connection, 1)])
+
+        self.assertEqual(fetches, [True])
+        self.assertFalse(hasattr(connection, "latest_times_queries"))
+
+
+@override_settings(ADL_PULSOWEB_LOG_DRIVEN=True)
+class LogDrivenConnectionDataTests(SimpleTestCase):
+
+    def run_links(self, get_observation_data=None):
+        client = mock.Mock(spec=PulsoWebClient)
+        client.get_logs.return_value = LOGS
+        client.get_observation_data.side_effect = get_observation_data or (lambda *args, **kwargs: ([], 1))
+
+        connection = ConnectionStub(client)
+        connection.logs_cursor = CURSOR
+
+        station_links = [saved_link(connection, code) for code in (1, 2, 3)]
+
+        with mock.patch("adl_pulsoweb_plugin.changes.dj_timezone.now", return_value=NOW):
+            results = PulsoWebPlugin().get_connection_data(connection, START, END, station_links=station_links)
+
+        return client, connection, station_links, results
+
+    def test_only_stations_that_uploaded_are_fetched(self):
+        client, connection, station_links, results = self.run_links()
+
+        self.assertEqual(sorted(call.args[0] for call in client.get_observation_data.call_args_list), [1, 3])
+        self.assertEqual([r.station_link for r in results], station_links)
+        self.assertEqual([r.skipped for r in results], [False, True, False])
+        self.assertEqual(results[1].records, [])
+        # The idle station's source was not asked, so core abstains.
+        self.assertEqual([link.adl_sources_count for link in station_links], [1, None, 1])
+        self.assertEqual(connection.logs_cursor, END.replace(tzinfo=datetime.timezone.utc))
+        self.assertEqual(connection.latest_times_queries, 1)
+
+    def test_a_failed_fetch_keeps_the_cursor(self):
+        def get_observation_data(station_code, *args, **kwargs):
+            if station_code == 3:
+                raise requests.ConnectionError("refused")
+            return [], 1
+
+        _, connection, _, results = self.run_links(get_observation_data)
+
+        self.assertIsInstance(results[2].error, requests.ConnectionError)
+        self.assertEqual(connection.logs_cursor, CURSOR)
+
+    def run_core(self, process_station):
+        client = mock.Mock(spec=PulsoWebClient)
+        client.get_logs.return_value = LOGS
+        client.get_observation_data.return_value = ([], 1)
+
+        connection = ConnectionStub(client)
+        connection.logs_cursor = CURSOR
+
+        station_links = [saved_link(connection, code) for code in (1, 2, 3)]
+
+        with patch_process_station(process_station), \
+                mock.patch.object(PulsoWebPlugin, "_get_station_links", return_value=station_links), \
+                mock.patch.object(PulsoWebPlugin, "get_default_end_date", return_value=CORE_END), \
+                mock.patch("adl_pulsoweb_plugin.changes.dj_timezone.now", return_value=NOW):
+            PulsoWebPlugin().run_process(connection, initial_start_date=START)
+
+        return client, connection
+
+    def test_core_s_run_skips_idle_stations_too(self):
+        processed = []
+
+        def process_station(station_link, initial_start_date):
+            processed.append(station_link.pulsoweb_station_code)
+
+        _, connection = self.run_core(process_station)
+
+        self.assertEqual(sorted(processed), [1, 3])
+        self.assertEqual(connection.logs_cursor, CORE_END)
+
+    def test_a_fetch_core_s_run_handles_itself_keeps_the_cursor(self):
+        # Core's process_station() logs a failed fetch rather than raise it.
+        def process_station(station_link, initial_start_date):
+            if station_link.pulsoweb_station_code == 3:
+                station_link.network_connection.client.get_observation_data.side_effect = \
+                    requests.ConnectionError("refused")
+
+            try:
+                PulsoWebPlugin().get_station_data(station_link, START, END)
+            except requests.ConnectionError:
+                pass
+
+        _, connection = self.run_core(process_station)
+
+        self.assertEqual(connection.logs_cursor, CURSOR)
+
+    @override_settings(ADL_PULSOWEB_LOG_DRIVEN=False)
+    def test_off_by_default_every_station_is_fetched(self):
+        client, connection, _, results = self.run_links()
+
+        client.get_logs.assert_not_called()
+        self.assertEqual(client.get_observation_data.call_count, 3)
+        self.assertEqual(connection.logs_cursor, CURSOR)
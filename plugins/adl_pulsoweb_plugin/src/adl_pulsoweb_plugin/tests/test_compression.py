@@ -0,0 +1,86 @@
+"""
+Tests for compressed transfers and the byte counts kept for each call. No
+network: responses are built from in-memory bodies, encoded as a source
+would send them.
+"""
+
+import gzip
+import io
+import json
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase
+from urllib3 import HTTPResponse
+
+from adl_pulsoweb_plugin import client as client_module
+from adl_pulsoweb_plugin.client import PulsoWebClient, encode_payload
+
+BODY = {"TEMP": [{"date": f"2026-01-01T{hour:02}:00:00", "value": 21.5} for hour in range(24)]}
+
+
+def gzipped_response(body):
+    """A response as requests builds it from a gzip-encoded body."""
+
+    raw = HTTPResponse(body=io.BytesIO(gzip.compress(json.dumps(body).encode())),
+                       headers={"Content-Encoding": "gzip"}, status=200, preload_content=False)
+
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = raw
+    response.headers.update(raw.headers)
+
+    return response
+
+
+class EncodePayloadTests(SimpleTestCase):
+
+    def test_a_small_payload_is_sent_as_is(self):
+        body, headers, size = encode_payload({"station": 5}, compress=True)
+
+        self.assertEqual(json.loads(body), {"station": 5})
+        self.assertNotIn("Content-Encoding", headers)
+        self.assertEqual(size, len(body))
+
+    def test_a_large_payload_is_gzipped_when_asked(self):
+        payload = {"observations": ["TEMP"] * client_module.REQUEST_COMPRESSION_MIN_BYTES}
+
+        body, headers, size = encode_payload(payload, compress=True)
+
+        self.assertEqual(headers["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(body)), payload)
+        self.assertLess(len(body), size)
+
+    def test_nothing_is_gzipped_unless_asked(self):
+        payload = {"observations": ["TEMP"] * client_module.REQUEST_COMPRESSION_MIN_BYTES}
+
+        _, headers, _ = encode_payload(payload)
+
+        self.assertNotIn("Content-Encoding", headers)
+
+
+class TransferSizeTests(SimpleTestCase):
+
+    def test_a_call_records_its_wire_and_decoded_sizes(self):
+        client = PulsoWebClient("https://app.pulsonic.com/rest", "a-token", 1, use_cache=False)
+
+        with mock.patch.object(requests.Session, "post", return_value=gzipped_response(BODY)):
+            self.assertEqual(client.post("get_data", {"station": 5}), BODY)
+
+        transfer = client.last_transfer
+
+        self.assertEqual(transfer.path, "get_data")
+        self.assertEqual(transfer.request_bytes, transfer.request_wire_bytes)
+        self.assertEqual(transfer.response_bytes, len(json.dumps(BODY)))
+        self.assertEqual(transfer.response_wire_bytes, len(gzip.compress(json.dumps(BODY).encode())))
+        self.assertLess(transfer.response_wire_bytes, transfer.response_bytes)
+
+    def test_a_streamed_call_records_its_decoded_size(self):
+        client = PulsoWebClient("https://app.pulsonic.com/rest", "a-token", 1, use_cache=False)
+
+        with mock.patch.object(requests.Session, "post", return_value=gzipped_response(BODY)):
+            records, _ = client.get_observation_data(5, ["TEMP"], "from", "to", stream=True)
+
+        self.assertEqual(len(records), 24)
+        self.assertEqual(client.last_transfer.response_bytes, len(json.dumps(BODY)))
+        self.assertLess(client.last_transfer.response_wire_bytes, client.last_transfer.response_bytes)
@@ -0,0 +1,174 @@
+"""
+Tests for the connection-level fetch, ``PulsoWebPlugin.get_connection_data()``.
+
+The same rule as the source-check tests applies: **no database**. Station
+links are stubs handed in explicitly, and the client is a mock.
+"""
+
+import datetime
+import inspect
+import threading
+import time
+from unittest import mock
+
+import requests
+from adl.core.registries import Plugin
+from django.test import SimpleTestCase
+
+from adl_pulsoweb_plugin.client import PulsoWebClient
+from adl_pulsoweb_plugin.plugins import PulsoWebPlugin
+
+from .test_source_checks import ConnectionStub, StationLinkStub
+
+START = datetime.datetime(2026, 8, 19, 10, 0)
+END = datetime.datetime(2026, 8, 19, 11, 0)
+
+
+def patch_process_station(process_station):
+    """
+    Stands process_station(station_link, initial_start_date) in for core's,
+    autospecced from it: a core without the method, or with another
+    signature, fails the test rather than pass it.
+    """
+
+    return mock.patch.object(PulsoWebPlugin, "process_station", autospec=True,
+                             side_effect=lambda plugin, station_link, initial_start_date: process_station(
+                                 station_link, initial_start_date))
+
+
+class ConnectionDataTests(SimpleTestCase):
+
+    def make_connection(self, get_observation_data):
+        client = mock.Mock(spec=PulsoWebClient)
+        client.get_observation_data.side_effect = get_observation_data
+
+        return ConnectionStub(client)
+
+    def run_links(self, connection, codes, **kwargs):
+        station_links = [StationLinkStub(connection, code=code) for code in codes]
+
+        results = PulsoWebPlugin().get_connection_data(connection, START, END,
+                                                       station_links=station_links, **kwargs)
+
+        return station_links, results
+
+    def test_results_and_counts_are_reported_per_link_in_order(self):
+        def get_observation_data(station_code, *args, **kwargs):
+            return [{"station": station_code}], station_code
+
+        connection = self.make_connection(get_observation_data)
+
+        station_links, results = self.run_links(connection, [1, 2, 3])
+
+        self.assertEqual([r.station_link for r in results], station_links)
+        self.assertEqual([r.records for r in results], [[{"station": c}] for c in (1, 2, 3)])
+        self.assertEqual([link.adl_sources_count for link in station_links], [1, 2, 3])
+
+    def test_a_failing_link_does_not_stop_the_others(self):
+        def get_observation_data(station_code, *args, **kwargs):
+            if station_code == 2:
+                raise requests.ConnectionError("refused")
+            return [], 4
+
+        connection = self.make_connection(get_observation_data)
+
+        station_links, results = self.run_links(connection, [1, 2, 3])
+
+        self.assertIsInstance(results[1].error, requests.ConnectionError)
+        self.assertIsNone(results[1].records)
+        # The failed link never got an answer, so core must still abstain.
+        self.assertEqual([link.adl_sources_count for link in station_links], [4, None, 4])
+
+    def test_concurrency_is_bounded(self):
+        lock = threading.Lock()
+        in_flight = []
+        peak = []
+
+        def get_observation_data(*args, **kwargs):
+            with lock:
+                in_flight.append(1)
+                peak.append(len(in_flight))
+            time.sleep(0.02)
+            with lock:
+                in_flight.pop()
+            return [], 0
+
+        connection = self.make_connection(get_observation_data)
+
+        self.run_links(connection, range(10), max_workers=3)
+
+        self.assertLessEqual(max(peak), 3)
+        self.assertGreater(max(peak), 1)
+
+    def test_no_links_is_no_work(self):
+        connection = self.make_connection(lambda *args, **kwargs: ([], 0))
+
+        _, results = self.run_links(connection, [])
+
+        self.assertEqual(results, [])
+        connection.client.get_observation_data.assert_not_called()
+
+
+class RunProcessTests(SimpleTestCase):
+    """Core's run of a connection goes through the same pool, each link
+    processed by core's own process_station()."""
+
+    def run_process(self, process_station, codes):
+        connection = ConnectionStub(mock.Mock(spec=PulsoWebClient))
+        station_links = [StationLinkStub(connection, code=code) for code in codes]
+        station_links[-1].enabled = False
+
+        plugin = PulsoWebPlugin()
+
+        with patch_process_station(process_station), \
+                mock.patch.object(PulsoWebPlugin, "_get_station_links", return_value=station_links):
+            return plugin.run_process(connection, initial_start_date=START)
+
+    def test_core_s_process_station_takes_a_link_and_a_start_date(self):
+        # The contract run_process() relies on, read from core itself.
+        parameters = list(inspect.signature(Plugin.process_station).parameters)
+
+        self.assertEqual(parameters[:3], ["self", "station_link", "initial_start_date"])
+
+    def test_enabled_links_are_processed_concurrently(self):
+        lock = threading.Lock()
+        in_flight = []
+        peak = []
+        processed = []
+
+        def process_station(station_link, initial_start_date):
+            with lock:
+                in_flight.append(1)
+                peak.append(len(in_flight))
+                processed.append((station_link.pulsoweb_station_code, initial_start_date))
+            time.sleep(0.02)
+            with lock:
+                in_flight.pop()
+            return station_link.pulsoweb_station_code
+
+        results = self.run_process(process_station, [1, 2, 3, 4, 5])
+
+        self.assertEqual(results, [1, 2, 3, 4])
+        self.assertEqual(sorted(processed), [(code, START) for code in (1, 2, 3, 4)])
+        self.assertGreater(max(peak), 1)
+
+    def test_a_failing_link_does_not_stop_the_others(self):
+        def process_station(station_link, initial_start_date):
+            if station_link.pulsoweb_station_code == 2:
+                raise requests.ConnectionError("refused")
+            return station_link.pulsoweb_station_code
+
+        self.assertEqual(self.run_process(process_station, [1, 2, 3, 4]), [1, 3])
+
+    def test_what_process_station_returns_is_returned_as_is(self):
+        self.assertEqual(self.run_process(lambda station_link, initial_start_date: None, [1, 2, 3]),
+                         [None, None])
+
+    def test_a_core_without_a_matching_process_station_runs_its_own_way(self):
+        connection = ConnectionStub(mock.Mock(spec=PulsoWebClient))
+
+        with mock.patch.object(PulsoWebPlugin, "process_station", new=lambda plugin, station_link: None), \
+                mock.patch.object(Plugin, "run_process", return_value="core's") as core_run_process:
+            self.assertEqual(PulsoWebPlugin().run_process(connection, initial_start_date=START), "core's")
+
+        core_run_process.assert_called_once_with(connection, START)
@@ -0,0 +1,110 @@
+"""
+Tests for ``PulsoWebContext``, the index the client's metadata helpers read.
+Pure data in, pure data out: no client, no cache, no database.
+"""
+
+from django.test import SimpleTestCase
+
+from adl_pulsoweb_plugin.context import PulsoWebContext, diff_contexts, fingerprint_context
+
+RAW_CONTEXT = {
+    "stations": [
+        {"code": 5, "name": "Nairobi", "observations": ["TEMP", "RH", "TEMP"]},
+        {"code": "6", "name": "Mombasa", "observations": ["TEMP"]},
+        {"code": 7, "name": "Kisumu", "observations": []},
+    ],
+    "observations": [
+        {"code": "TEMP", "granularity": 1, "label": "Temperature", "unit": "C", "description": ""},
+        {"code": "RH", "granularity": "1", "label": "Humidity", "unit": "%", "description": ""},
+        {"code": "PR", "granularity": 2, "label": "Rain", "unit": "mm", "description": ""},
+    ],
+    "granularities": [{"code": 1, "label": "10 minutes"}, {"code": 2, "label": "Hourly"}],
+}
+
+
+class PulsoWebContextTests(SimpleTestCase):
+
+    def setUp(self):
+        self.context = PulsoWebContext(RAW_CONTEXT)
+
+    def test_codes_match_across_types(self):
+        self.assertEqual(self.context.get_station_by_code("5")["name"], "Nairobi")
+        self.assertEqual(self.context.get_station_by_code(6)["name"], "Mombasa")
+        self.assertEqual(self.context.get_granularity_by_code("2")["label"], "Hourly")
+
+    def test_observations_are_grouped_by_granularity_and_counted(self):
+        observations = self.context.get_observations_for_granular(1)
+
+        self.assertEqual([(o["code"], o["stations_count"]) for o in observations],
+                         [("TEMP", 2), ("RH", 1)])
+
+    def test_a_station_listing_an_observation_twice_counts_once(self):
+        self.assertEqual([s["code"] for s in self.context.get_stations_with_obs("TEMP")], [5, "6"])
+
+    def test_unknown_codes_find_nothing(self):
+        self.assertIsNone(self.context.get_observation_by_code("WIND"))
+        self.assertEqual(self.context.get_stations_with_obs("WIND"), [])
+        self.assertEqual(self.context.get_observations_for_granular(9), [])
+
+    def test_results_cannot_edit_the_index(self):
+        self.context.get_stations_with_obs("TEMP")[0]["name"] = "edited"
+
+        self.assertEqual(self.context.get_stations_with_obs("TEMP")[0]["name"], "Nairobi")
+
+    def test_each_station_maps_to_the_observations_it_lists(self):
+        self.assertEqual(self.context.get_station_observations(5), {"TEMP", "RH"})
+        self.assertEqual(self.context.get_station_observations("7"), frozenset())
+        # Unknown, which is not the same as listing nothing.
+        self.assertIsNone(self.context.get_station_observations(99))
+        self.assertIsNone(PulsoWebContext({"stations": [{"code": 8}]}).get_station_observations(8))
+
+    def test_structured_data_lists_stations_per_granularity(self):
+        data = self.context.get_structured_data()
+
+        self.assertEqual([len(gran["stations"]) for gran in data], [3, 0])
+
+
+class FingerprintTests(SimpleTestCase):
+
+    def test_reordering_an_unchanged_catalogue_is_not_a_change(self):
+        reordered = {
+            "stations": list(reversed(RAW_CONTEXT["stations"])),
+            "observations": [{**obs} for obs in reversed(RAW_CONTEXT["observations"])],
+            "granularities": RAW_CONTEXT["granularities"],
+        }
+
+        self.assertEqual(fingerprint_context(reordered), fingerprint_context(RAW_CONTEXT))
+
+    def test_only_the_edited_section_changes(self):
+        edited = {**RAW_CONTEXT, "granularities": [{"code": 1, "label": "10 min"}]}
+
+        old, new = fingerprint_context(RAW_CONTEXT), fingerprint_context(edited)
+
+        self.assertEqual([name for name in old if old[name] != new[name]], ["granularities"])
+
+    def test_unchanged_sections_keep_the_previous_indexes(self):
+        previous = PulsoWebContext(RAW_CONTEXT)
+        edited = {**RAW_CONTEXT, "granularities": [{"code": 3, "label": "Daily"}]}
+
+        context = PulsoWebContext(edited, previous=previous, unchanged={"stations", "observations"})
+
+        self.assertIs(context.stations_by_observation, previous.stations_by_observation)
+        self.assertIsNot(context.granularities_by_code, previous.granularities_by_code)
+        self.assertEqual(context.get_granularity_by_code(3)["label"], "Daily")
+
+
+class DiffTests(SimpleTestCase):
+
+    def test_stations_and_their_observations_are_diffed(self):
+        edited = {**RAW_CONTEXT, "stations": [
+            {"code": 5, "name": "Nairobi", "observations": ["TEMP", "PR"]},
+            {"code": "6", "name": "Mombasa", "observations": []},
+            {"code": 8, "name": "Eldoret", "observations": ["TEMP"]},
+        ]}
+
+        delta = diff_contexts(PulsoWebContext(RAW_CONTEXT), PulsoWebContext(edited), {"stations"})
+
+        self.assertEqual(delta.stations_added, ["8"])
+        self.assertEqual(delta.stations_removed, ["7"])
+        self.assertEqual(delta.observations_added, {"5": ["PR"]})
+        self.assertEqual(delta.observations_removed, {"5": ["RH"], "6": ["TEMP"]})
@@ -0,0 +1,239 @@
+"""
+Tests for the two-tier context cache: the process-local layer in front of
+the shared Django cache, and the stale-while-revalidate refresh behind it.
+No database, and no client: contexts are written and read directly, and
+fetches are mocks.
+"""
+
+from unittest import mock
+
+import requests
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from adl_pulsoweb_plugin import context_cache
+from adl_pulsoweb_plugin.signals import context_changed
+from adl_pulsoweb_plugin.context_cache import (
+    clear_l1,
+    context_cache_key,
+    context_refresh_lock_key,
+    context_version_cache_key,
+    get_cached_context,
+    get_or_refresh_context,
+    invalidate_context,
+    refresh_context,
+    set_cached_context,
+)
+
+RAW_CONTEXT = {"stations": [{"code": 5, "name": "Nairobi", "observations": ["TEMP"]}],
+               "observations": [], "granularities": []}
+
+CONNECTION_ID = 41
+
+
+class ContextCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        clear_l1()
+        self.addCleanup(clear_l1)
+        self.addCleanup(cache.delete_many, [context_cache_key(CONNECTION_ID),
+                                            context_version_cache_key(CONNECTION_ID),
+                                            context_refresh_lock_key(CONNECTION_ID)])
+
+    def shared_cache_reads(self):
+        return mock.patch.object(context_cache, "cache", wraps=cache)
+
+    def test_a_warm_read_fetches_only_the_version_key(self):
+        set_cached_context(CONNECTION_ID, RAW_CONTEXT)
+
+        with self.shared_cache_reads() as shared:
+            first = get_cached_context(CONNECTION_ID)
+            second = get_cached_context(CONNECTION_ID)
+
+        self.assertIs(first, second)
+        self.assertEqual(shared.get.call_args_list,
+                         [mock.call(context_version_cache_key(CONNECTION_ID))] * 2)
+        shared.get_many.assert_not_called()
+
+    def test_a_cold_read_is_one_round_trip(self):
+        set_cached_context(CONNECTION_ID, RAW_CONTEXT)
+        clear_l1()
+
+        with self.shared_cache_reads() as shared:
+            context = get_cached_context(CONNECTION_ID)
+
+        self.assertEqual(context.raw, RAW_CONTEXT)
+        shared.get_many.assert_called_once()
+        shared.get.assert_not_called()
+
+    def test_a_refresh_elsewhere_drops_this_processs_copy(self):
+        set_cached_context(CONNECTION_ID, RAW_CONTEXT)
+        get_cached_context(CONNECTION_ID)
+
+        # Another worker stores a new context under a new version.
+        refreshed = {**RAW_CONTEXT, "stations": RAW_CONTEXT["stations"] + [{"code": 6}]}
+        cache.set_many({context_cache_key(CONNECTION_ID): refreshed,
+                        context_version_cache_key(CONNECTION_ID): "another-version"})
+
+        self.assertEqual(len(get_cached_context(CONNECTION_ID).stations), 2)
+
+    def test_entries_expire(self):
+        set_cached_context(CONNECTION_ID, RAW_CONTEXT)
+
+        with mock.patch.object(context_cache.time, "monotonic",
+                               return_value=context_cache.time.monotonic() + context_cache.L1_TIMEOUT + 1):
+            with self.shared_cache_reads() as shared:
+                get_cached_context(CONNECTION_ID)
+
+        shared.get_many.assert_called_once()
+
+    def test_the_layer_is_size_bounded(self):
+        with mock.patch.object(context_cache, "L1_MAXSIZE", 2):
+            for connection_id in (1, 2, 3):
+                context_cache._l1_set(context_cache_key(connection_id), "v", None)
+
+        self.assertEqual(list(context_cache._l1), [context_cache_key(2), context_cache_key(3)])
+
+    def test_nothing_cached_is_none(self):
+        self.assertIsNone(get_cached_context(CONNECTION_ID))
+
+    def test_an_invalidated_context_is_gone_everywhere(self):
+        set_cached_context(CONNECTION_ID, RAW_CONTEXT)
+        get_cached_context(CONNECTION_ID)
+
+        invalidate_context(CONNECTION_ID)
+
+        self.assertIsNone(cache.get(context_version_cache_key(CONNECTION_ID)))
+        self.assertIsNone(get_cached_context(CONNECTION_ID))
+
+
+class StaleWhileRevalidateTests(SimpleTestCase):
+    """Once a context is cached, a read never blocks on a download, and one
+    worker at a time refreshes it."""
+
+    def setUp(self):
+        clear_l1()
+        self.addCleanup(clear_l1)
+        self.addCleanup(cache.delete_many, [context_cache_key(CONNECTION_ID),
+                                            context_version_cache_key(CONNECTION_ID),
+                                            context_refresh_lock_key(CONNECTION_ID)])
+
+        # Background refreshes are captured rather than started.
+        self.background = []
+        patcher = mock.patch.object(context_cache, "_start_background", side_effect=self.background.append)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def age_the_context(self):
+        return mock.patch.object(context_cache, "CONTEXT_CACHE_TIMEOUT", 0)
+
+    def test_a_cold_cache_fetches_once_and_stores(self):
+        fetch = mock.Mock(return_value=RAW_CONTEXT)
+
+        get_or_refresh_context(CONNECTION_ID, fetch)
+        get_or_refresh_context(CONNECTION_ID, fetch)
+
+        fetch.assert_called_once_with()
+        self.assertEqual(self.background, [])
+
+    def test_a_stale_context_is_served_while_one_refresh_runs(self):
+        set_cached_context(CONNECTION_ID, RAW_CONTEXT)
+        refreshed = {**RAW_CONTEXT, "stations": RAW_CONTEXT["stations"] + [{"code": 6}]}
+        fetch = mock.Mock(return_value=refreshed)
+
+        with self.age_the_context():
+            first = get_or_refresh_context(CONNECTION_ID, fetch)
+            second = get_or_refresh_context(CONNECTION_ID, fetch)
+
+        # Both reads were answered from the stale context, without waiting.
+        self.assertEqual(len(first.stations), 1)
+        self.assertEqual(len(second.stations), 1)
+        fetch.assert_not_called()
+        self.assertEqual(len(self.background), 1)
+
+        self.background[0]()
+
+        fetch.assert_called_once_with()
+        self.assertEqual(len(get_or_refresh_context(CONNECTION_ID, fetch).stations), 2)
+
+    def test_the_ttls_are_settings(self):
+        set_cached_context(CONNECTION_ID, RAW_CONTEXT)
+        fetch = mock.Mock(return_value=RAW_CONTEXT)
+
+        with override_settings(ADL_PULSOWEB_CONTEXT_CACHE_TIMEOUT=0):
+            get_or_refresh_context(CONNECTION_ID, fetch)
+
+        self.assertEqual(len(self.background), 1)
+
+        with override_settings(ADL_PULSOWEB_CONTEXT_STALE_TIMEOUT=1234, ADL_PULSOWEB_CONTEXT_REFRESH_LEASE=5):
+            self.assertEqual(context_cache._hard_ttl(), 1234)
+            self.assertEqual(context_cache._refresh_lease(), 5)
+
+    def test_a_held_lease_refreshes_nothing(self):
+        cache.add(context_refresh_lock_key(CONNECTION_ID), "another-worker", 60)
+        fetch = mock.Mock(return_value=RAW_CONTEXT)
+
+        self.assertIsNone(refresh_context(CONNECTION_ID, fetch))
+        fetch.assert_not_called()
+
+    def test_a_failed_refresh_keeps_the_lease_and_the_stale_context(self):
+        set_cached_context(CONNECTION_ID, RAW_CONTEXT)
+        fetch = mock.Mock(side_effect=requests.ConnectionError("refused"))
+
+        with self.age_the_context():
+            get_or_refresh_context(CONNECTION_ID, fetch)
+            self.background[0]()
+
+        self.assertIsNotNone(cache.get(context_refresh_lock_key(CONNECTION_ID)))
+        self.assertEqual(get_cached_context(CONNECTION_ID).raw, RAW_CONTEXT)
+
+
+class ChangeDetectionTests(SimpleTestCase):
+    """A refresh that changed nothing costs no worker a re-read, and one that
+    changed something is announced once."""
+
+    def setUp(self):
+        clear_l1()
+        self.addCleanup(clear_l1)
+        self.addCleanup(cache.delete_many, [context_cache_key(CONNECTION_ID),
+                                            context_version_cache_key(CONNECTION_ID),
+                                            context_refresh_lock_key(CONNECTION_ID)])
+
+        self.deltas = []
+
+        def receiver(sender, connection_id, delta, **kwargs):
+            self.deltas.append((connection_id, delta))
+
+        context_changed.connect(receiver, weak=False)
+        self.addCleanup(context_changed.disconnect, receiver)
+
+    def version(self):
+        return cache.get(context_version_cache_key(CONNECTION_ID))["version"]
+
+    def test_an_unchanged_refresh_keeps_the_version_and_announces_nothing(self):
+        first = set_cached_context(CONNECTION_ID, RAW_CONTEXT)
+        version = self.version()
+
+        second = set_cached_context(CONNECTION_ID, {**RAW_CONTEXT})
+
+        self.assertIs(first, second)
+        self.assertEqual(self.version(), version)
+        self.assertEqual(self.deltas, [])
+
+    def test_a_change_gets_a_new_version_and_one_delta(self):
+        set_cached_context(CONNECTION_ID, RAW_CONTEXT)
+        version = self.version()
+
+        set_cached_context(CONNECTION_ID, {**RAW_CONTEXT, "stations": RAW_CONTEXT["stations"] + [
+            {"code": 6, "name": "Mombasa", "observations": ["TEMP"]}]})
+
+        self.assertNotEqual(self.version(), version)
+        self.assertEqual(len(self.deltas), 1)
+        self.assertEqual(self.deltas[0][0], CONNECTION_ID)
+        self.assertEqual(self.deltas[0][1].stations_added, ["6"])
+        self.assertEqual(self.deltas[0][1].changed_sections, {"stations"})
+
+    def test_a_cold_store_announces_nothing(self):
+        set_cached_context(CONNECTION_ID, RAW_CONTEXT)
+
+        self.assertEqual(self.deltas, [])
@@ -0,0 +1,87 @@
+"""
+Tests for trimming the window get_station_data() requests to what core has
+not saved yet. No database: the station link stub carries the latest saved
+observation time, and the client is a mock.
+"""
+
+import datetime
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from adl_pulsoweb_plugin.client import PulsoWebClient
+from adl_pulsoweb_plugin.plugins import PulsoWebPlugin
+
+from .test_source_checks import ConnectionStub, StationLinkStub
+
+START = datetime.datetime(2026, 8, 19, 0, 0)
+END = datetime.datetime(2026, 8, 19, 12, 0)
+
+
+class IncrementalWindowTests(SimpleTestCase):
+
+    def fetch(self, latest, start_date=START, end_date=END):
+        client = mock.Mock(spec=PulsoWebClient)
+        client.get_observation_data.return_value = ([], 1)
+
+        station_link = StationLinkStub(ConnectionStub(client))
+        station_link.latest_observation_time = latest
+        records = PulsoWebPlugin().get_station_data(station_link, start_date, end_date)
+
+        return client, station_link, records
+
+    def requested_from(self, client):
+        return client.get_observation_data.call_args.args[2]
+
+    def test_nothing_saved_fetches_the_whole_window(self):
+        client, _, _ = self.fetch(None)
+
+        self.assertEqual(self.requested_from(client), "2026-08-19T00:00:00")
+
+    def test_the_window_starts_at_the_latest_saved_less_the_overlap(self):
+        client, _, _ = self.fetch(datetime.datetime(2026, 8, 19, 9, 0))
+
+        self.assertEqual(self.requested_from(client), "2026-08-19T08:50:00")
+
+    @override_settings(ADL_PULSOWEB_INCREMENTAL_OVERLAP=3600)
+    def test_the_overlap_is_a_setting(self):
+        client, _, _ = self.fetch(datetime.datetime(2026, 8, 19, 9, 0))
+
+        self.assertEqual(self.requested_from(client), "2026-08-19T08:00:00")
+
+    def test_a_window_is_never_widened(self):
+        client, _, _ = self.fetch(datetime.datetime(2026, 8, 18, 0, 0))
+
+        self.assertEqual(self.requested_from(client), "2026-08-19T00:00:00")
+
+    def test_an_aware_saved_time_trims_a_naive_window_in_utc(self):
+        latest = datetime.datetime(2026, 8, 19, 12, 0, tzinfo=datetime.timezone(datetime.timedelta(hours=3)))
+
+        client, _, _ = self.fetch(latest)
+
+        self.assertEqual(self.requested_from(client), "2026-08-19T08:50:00")
+
+    def test_a_window_already_saved_is_not_requested(self):
+        client, station_link, records = self.fetch(END)
+
+        client.get_observation_data.assert_not_called()
+        self.assertEqual(records, [])
+        # The source was not asked, so it said nothing.
+        self.assertIsNone(station_link.adl_sources_count)
+
+    def test_a_widened_single_hour_already_saved_is_not_requested(self):
+        # start_date == end_date is widened to the hour that follows.
+        client, _, _ = self.fetch(END, END.replace(hour=11), END.replace(hour=11))
+
+        client.get_observation_data.assert_not_called()
+
+    def test_an_aware_window_starts_in_its_own_wall_clock(self):
+        # The window is written out as its own wall clock, so a start taken
+        # from a saved UTC time must not keep UTC's.
+        utc_minus_3 = datetime.timezone(datetime.timedelta(hours=-3))
+        latest = datetime.datetime(2026, 8, 19, 9, 0, tzinfo=datetime.timezone.utc)
+
+        client, _, _ = self.fetch(latest, START.replace(tzinfo=utc_minus_3), END.replace(tzinfo=utc_minus_3))
+
+        self.assertEqual(self.requested_from(client), "2026-08-19T05:50:00")
+        self.assertEqual(client.get_observation_data.call_args.args[3], "2026-08-19T12:00:00")
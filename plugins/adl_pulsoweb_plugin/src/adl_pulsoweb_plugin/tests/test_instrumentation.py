@@ -0,0 +1,155 @@
+"""
+Tests for the opt-in timing hooks and their sinks. No database and no
+network: measurements go to an in-memory sink, and the client's transport is
+a mock.
+"""
+
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from adl_pulsoweb_plugin import instrumentation
+from adl_pulsoweb_plugin.client import PulsoWebClient
+from adl_pulsoweb_plugin.instrumentation import (
+    LoggingSink,
+    PrometheusSink,
+    StatsdSink,
+    emit,
+    get_sinks,
+    set_sinks,
+    timed,
+)
+from adl_pulsoweb_plugin.views import pulsoweb_metrics
+
+
+class RecordingSink:
+    def __init__(self):
+        self.measurements = []
+
+    def emit(self, name, value, unit, tags):
+        self.measurements.append((name, unit, dict(tags)))
+
+    def names(self):
+        return [name for name, _, _ in self.measurements]
+
+
+class TimedTests(SimpleTestCase):
+
+    def setUp(self):
+        self.sink = RecordingSink()
+        set_sinks([self.sink])
+        self.addCleanup(set_sinks, None)
+
+    def test_nothing_is_measured_without_sinks(self):
+        set_sinks([])
+
+        with mock.patch.object(instrumentation.time, "perf_counter") as clock:
+            with timed("post", path="get_data"):
+                pass
+
+        clock.assert_not_called()
+
+    def test_a_block_is_timed_with_its_outcome(self):
+        with timed("post", path="get_data") as tags:
+            tags["result"] = "hit"
+
+        with self.assertRaises(ValueError):
+            with timed("post", path="get_data"):
+                raise ValueError
+
+        self.assertEqual(self.sink.measurements, [
+            ("post", "seconds", {"path": "get_data", "result": "hit", "outcome": "ok"}),
+            ("post", "seconds", {"path": "get_data", "outcome": "error"}),
+        ])
+
+    def test_a_failing_sink_never_fails_the_call(self):
+        broken = mock.Mock()
+        broken.emit.side_effect = OSError("sink down")
+        set_sinks([broken, self.sink])
+
+        emit("get_data.rows", 3)
+
+        self.assertEqual(self.sink.names(), ["get_data.rows"])
+
+    @override_settings(ADL_PULSOWEB_METRICS_SINKS=["logging", "adl_pulsoweb_plugin.instrumentation.PrometheusSink"])
+    def test_sinks_are_read_from_the_setting(self):
+        set_sinks(None)
+
+        self.assertEqual([type(sink) for sink in get_sinks()], [LoggingSink, PrometheusSink])
+
+    def test_the_client_times_each_phase_of_a_get_data_call(self):
+        client = PulsoWebClient("https://app.pulsonic.com/rest", "a-token", 1, use_cache=False)
+        response = mock.Mock(content=b"{}")
+        response.json.return_value = {"TEMP": [{"date": "2026-08-19T10:00:00", "value": 21.0}]}
+
+        with mock.patch.object(client, "_post_response", return_value=response):
+            client.get_observation_data(5, ["TEMP"], "from", "to")
+
+        self.assertEqual(self.sink.names(), ["post.network", "post.decode", "post", "bytes_decoded",
+                                             "get_data.merge", "get_data.items", "get_data.rows"])
+
+
+class StatsdSinkTests(SimpleTestCase):
+
+    def test_timings_are_sent_in_milliseconds_and_counts_as_counters(self):
+        sink = StatsdSink()
+        self.addCleanup(sink.socket.close)
+
+        self.assertEqual(sink.format("post", 0.25, "seconds", {"path": "get_data"}),
+                         "adl.pulsoweb.post:250|ms|#path:get_data")
+        self.assertEqual(sink.format("get_data.rows", 3, "count", {}), "adl.pulsoweb.get_data.rows:3|c")
+
+
+class PrometheusSinkTests(SimpleTestCase):
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+
+    def test_every_workers_measurements_add_up(self):
+        # Two workers, each with its own sink, one shared cache.
+        PrometheusSink().emit("post", 0.5, "seconds", {"path": "get_data"})
+        PrometheusSink().emit("post", 0.25, "seconds", {"path": "get_data"})
+        PrometheusSink().emit("get_data.rows", 3, "count", {})
+
+        text = PrometheusSink().render()
+
+        self.assertIn("# TYPE pulsoweb_post_seconds summary", text)
+        self.assertIn('pulsoweb_post_seconds_sum{path="get_data"} 0.75', text)
+        self.assertIn('pulsoweb_post_seconds_count{path="get_data"} 2', text)
+        self.assertIn("pulsoweb_get_data_rows_total 3", text)
+
+    def test_stations_are_summed_into_one_series(self):
+        PrometheusSink().emit("station_data.rows", 3, "count", {"station": "1"})
+        PrometheusSink().emit("station_data.rows", 4, "count", {"station": "2"})
+
+        text = PrometheusSink().render()
+
+        self.assertIn("pulsoweb_station_data_rows_total 7", text)
+        self.assertNotIn("station=", text)
+
+
+class MetricsViewTests(SimpleTestCase):
+
+    def setUp(self):
+        set_sinks([PrometheusSink()])
+        self.addCleanup(set_sinks, None)
+        self.addCleanup(cache.clear)
+
+    def get(self, user=None, **headers):
+        request = RequestFactory().get("/pulsoweb/metrics/", headers=headers)
+        request.user = user or SimpleNamespace(is_authenticated=False, is_staff=False)
+
+        return pulsoweb_metrics(request)
+
+    @override_settings(ADL_PULSOWEB_METRICS_TOKEN="scrape-me")
+    def test_a_scraper_sends_the_bearer_token(self):
+        self.assertEqual(self.get(Authorization="Bearer scrape-me").status_code, 200)
+        self.assertEqual(self.get(Authorization="Bearer wrong").status_code, 401)
+        self.assertEqual(self.get().status_code, 401)
+
+    def test_with_no_token_only_staff_are_served(self):
+        self.assertEqual(self.get().status_code, 401)
+        self.assertEqual(self.get(SimpleNamespace(is_authenticated=True, is_staff=False)).status_code, 401)
+        self.assertEqual(self.get(SimpleNamespace(is_authenticated=True, is_staff=True)).status_code, 200)
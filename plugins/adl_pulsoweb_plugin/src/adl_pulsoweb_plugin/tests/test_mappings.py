@@ -0,0 +1,94 @@
+"""
+Tests for the compiled variable mappings and their invalidation. No
+database: compile_mappings() is mocked, and the receivers are sent unsaved
+instances.
+"""
+
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.test import SimpleTestCase
+
+from adl_pulsoweb_plugin import mappings
+from adl_pulsoweb_plugin.mappings import (
+    CompiledMappings,
+    clear_l1,
+    get_compiled_mappings,
+    invalidate_mappings,
+    mappings_cache_key,
+    mappings_version_cache_key,
+)
+from adl_pulsoweb_plugin.models import PulsoWebVariableMapping
+
+CONNECTION_ID = 43
+
+
+def compiled(connection_id, version=None):
+    mapping = SimpleNamespace(pulsoweb_parameter_code="TEMP")
+
+    return CompiledMappings(version, [mapping], ["TEMP"])
+
+
+class CompiledMappingsTests(SimpleTestCase):
+
+    def setUp(self):
+        clear_l1()
+        self.addCleanup(clear_l1)
+        self.addCleanup(cache.delete_many, [mappings_cache_key(CONNECTION_ID),
+                                            mappings_version_cache_key(CONNECTION_ID)])
+
+        patcher = mock.patch.object(mappings, "compile_mappings", side_effect=compiled)
+        self.compile = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_one_compile_serves_every_read(self):
+        first = get_compiled_mappings(CONNECTION_ID)
+        second = get_compiled_mappings(CONNECTION_ID)
+
+        self.assertIs(first, second)
+        self.assertEqual(first.codes, ["TEMP"])
+        self.assertEqual(self.compile.call_count, 1)
+
+    def test_another_process_reads_the_shared_copy(self):
+        get_compiled_mappings(CONNECTION_ID)
+        clear_l1()
+
+        self.assertEqual(get_compiled_mappings(CONNECTION_ID).codes, ["TEMP"])
+        self.assertEqual(self.compile.call_count, 1)
+
+    def test_an_invalidation_is_seen_by_every_process(self):
+        get_compiled_mappings(CONNECTION_ID)
+
+        # As another process would: the shared version moves, this process's
+        # entry is left in place.
+        cache.set(mappings_version_cache_key(CONNECTION_ID), "edited")
+        get_compiled_mappings(CONNECTION_ID)
+
+        self.assertEqual(self.compile.call_count, 2)
+
+    def test_an_edit_during_a_compile_is_not_lost(self):
+        def compile_while_edited(connection_id, version=None):
+            invalidate_mappings(connection_id)
+            return compiled(connection_id, version)
+
+        self.compile.side_effect = compile_while_edited
+        get_compiled_mappings(CONNECTION_ID)
+
+        self.compile.side_effect = compiled
+        get_compiled_mappings(CONNECTION_ID)
+
+        self.assertEqual(self.compile.call_count, 2)
+
+    def test_saving_or_deleting_a_mapping_invalidates(self):
+        for signal in (post_save, post_delete):
+            with self.subTest(signal=signal):
+                get_compiled_mappings(CONNECTION_ID)
+                calls = self.compile.call_count
+
+                signal.send(sender=PulsoWebVariableMapping,
+                            instance=PulsoWebVariableMapping(network_pulsoweb_id=CONNECTION_ID))
+                get_compiled_mappings(CONNECTION_ID)
+
+                self.assertEqual(self.compile.call_count, calls + 1)
@@ -0,0 +1,109 @@
+"""
+Tests for how ``get_observation_data()`` turns a get_data body into records.
+Bodies are built in memory; no network and no database.
+"""
+
+import io
+import json
+from unittest import mock
+
+import numpy as np
+import requests
+from django.test import SimpleTestCase
+
+from adl_pulsoweb_plugin.client import (
+    PulsoWebClient,
+    parse_observation_columns,
+    parse_observation_data,
+    parse_observation_stream,
+)
+
+RESPONSE = {
+    "TEMP": [{"date": "2026-08-19T10:00:00", "value": 21.5},
+             {"date": "2026-08-19T11:00:00", "value": 22}],
+    "RH": [{"date": "2026-08-19T10:00:00", "value": 60.0},
+           {"date": "2026-08-19T12:00:00", "value": None}],
+    "PR": [],
+}
+
+
+def body(response):
+    return io.BytesIO(json.dumps(response).encode())
+
+
+class StreamingParseTests(SimpleTestCase):
+
+    def test_streaming_and_whole_body_parsing_agree(self):
+        self.assertEqual(parse_observation_stream(body(RESPONSE)), parse_observation_data(RESPONSE))
+
+    def test_an_empty_body_counts_zero(self):
+        self.assertEqual(parse_observation_stream(body({})), ([], 0))
+
+    def test_a_truncated_body_raises_the_whole_body_decode_error(self):
+        truncated = io.BytesIO(json.dumps(RESPONSE).encode()[:-20])
+
+        with self.assertRaises(requests.exceptions.JSONDecodeError):
+            parse_observation_stream(truncated)
+
+    def test_a_body_that_is_not_an_object_is_a_decode_error(self):
+        with self.assertRaises(requests.exceptions.JSONDecodeError):
+            parse_observation_stream(body([1, 2]))
+
+    def test_a_streamed_call_reads_the_decoded_raw_stream_and_closes_it(self):
+        client = PulsoWebClient("https://app.pulsonic.com/rest", "a-token", 1)
+
+        response = mock.MagicMock()
+        response.__enter__.return_value = response
+        response.raw = body(RESPONSE)
+
+        with mock.patch.object(client, "_send_post", return_value=response) as send_post:
+            records, sources_count = client.get_observation_data(5, ["TEMP", "RH"], "from", "to",
+                                                                 stream=True)
+
+        self.assertTrue(send_post.call_args.kwargs["stream"])
+        self.assertTrue(response.raw.decode_content)
+        response.__exit__.assert_called_once()
+        self.assertEqual(sources_count, 4)
+        self.assertEqual(len(records), 3)
+
+
+class ColumnarTests(SimpleTestCase):
+
+    def test_columns_hold_one_array_per_code_over_every_timestamp(self):
+        columns, sources_count = parse_observation_columns(RESPONSE)
+
+        self.assertEqual(sources_count, 4)
+        self.assertEqual(len(columns), 3)
+        self.assertEqual(columns.observation_time.dtype, np.dtype("datetime64[s]"))
+        np.testing.assert_array_equal(columns.values["TEMP"], [21.5, 22.0, np.nan])
+        np.testing.assert_array_equal(columns.present["RH"], [True, False, True])
+        self.assertEqual(len(columns.values["PR"]), 3)
+        self.assertFalse(columns.present["PR"].any())
+
+    def test_to_records_gives_back_the_dict_rows(self):
+        columns, _ = parse_observation_columns(RESPONSE)
+        records, _ = parse_observation_data(RESPONSE)
+
+        # Dict rows keep the source's order; columns are in time order.
+        self.assertEqual(columns.to_records(),
+                         sorted(records, key=lambda record: record["observation_time"]))
+
+    def test_a_null_value_is_kept_apart_from_a_missing_one(self):
+        columns, _ = parse_observation_columns(RESPONSE)
+        last = columns.to_records()[-1]
+
+        self.assertIsNone(last["RH"])
+        self.assertNotIn("TEMP", last)
+
+    def test_streaming_builds_the_same_columns(self):
+        streamed, streamed_count = parse_observation_stream(body(RESPONSE), columnar=True)
+        columns, sources_count = parse_observation_columns(RESPONSE)
+
+        self.assertEqual(streamed_count, sources_count)
+        self.assertEqual(streamed.to_records(), columns.to_records())
+
+    def test_an_empty_response_is_empty_columns(self):
+        columns, sources_count = parse_observation_columns({})
+
+        self.assertEqual((len(columns), sources_count), (0, 0))
+        self.assertEqual(columns.to_records(), [])
@@ -0,0 +1,66 @@
+"""
+Tests for pruning the observations get_station_data() requests to those the
+context says the station lists. No database; the client is a mock.
+"""
+
+import datetime
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from adl_pulsoweb_plugin.client import PulsoWebClient
+from adl_pulsoweb_plugin.context import PulsoWebContext
+from adl_pulsoweb_plugin.plugins import PulsoWebPlugin
+
+from .test_source_checks import ConnectionStub, StationLinkStub
+
+START = datetime.datetime(2026, 8, 19, 10, 0)
+END = datetime.datetime(2026, 8, 19, 11, 0)
+
+
+class ObservationPruningTests(SimpleTestCase):
+
+    def fetch(self, stations=None, context_error=None):
+        client = mock.Mock(spec=PulsoWebClient)
+        client.get_observation_data.return_value = ([], 1)
+
+        connection = ConnectionStub(client)
+
+        if context_error is not None:
+            client.get_indexed_context.side_effect = context_error
+        else:
+            client.get_indexed_context.return_value = PulsoWebContext({"stations": stations or []})
+
+        station_link = StationLinkStub(connection, code=5)
+        records = PulsoWebPlugin().get_station_data(station_link, START, END)
+
+        return client, station_link, records
+
+    def requested_codes(self, client):
+        return client.get_observation_data.call_args.args[1]
+
+    def test_only_the_listed_observations_are_requested(self):
+        client, _, _ = self.fetch([{"code": "5", "observations": ["RH", "WIND"]}])
+
+        self.assertEqual(self.requested_codes(client), ["RH"])
+
+    def test_a_station_listing_none_of_them_is_not_called(self):
+        client, station_link, records = self.fetch([{"code": 5, "observations": ["WIND"]}])
+
+        client.get_observation_data.assert_not_called()
+        self.assertEqual(records, [])
+        # The source was not asked, and the context may be stale, so it said
+        # nothing.
+        self.assertIsNone(station_link.adl_sources_count)
+
+    def test_a_context_that_does_not_say_prunes_nothing(self):
+        for stations in ([], [{"code": 5}]):
+            with self.subTest(stations=stations):
+                client, _, _ = self.fetch(stations)
+
+                self.assertEqual(self.requested_codes(client), ["TEMP", "RH"])
+
+    def test_an_unreadable_context_prunes_nothing(self):
+        client, _, _ = self.fetch(context_error=RuntimeError("cache down"))
+
+        self.assertEqual(self.requested_codes(client), ["TEMP", "RH"])
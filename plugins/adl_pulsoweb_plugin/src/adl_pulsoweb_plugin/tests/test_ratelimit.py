@@ -0,0 +1,118 @@
+"""
+Tests for the per-host rate limiter every worker shares through the cache.
+No database and no network: responses are built in memory, and the clock is
+patched where a test depends on it.
+"""
+
+from unittest import mock
+
+import requests
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from adl_pulsoweb_plugin import ratelimit
+from adl_pulsoweb_plugin.ratelimit import HostRateLimiter, get_rate_limiter
+
+NOW = 1_800_000_000.25
+
+
+def response(status_code, **headers):
+    r = requests.Response()
+    r.status_code = status_code
+    r.headers.update(headers)
+    return r
+
+
+class HostRateLimiterTests(SimpleTestCase):
+
+    def setUp(self):
+        # A host per test, so no test reads another's bucket or rate.
+        self.host = f"{self.id()}.pulsoweb.test"
+
+        keys = [f"pulsoweb_rate_{self.host}_{name}" for name in ("rate", "backoff", "increase")]
+        keys += [f"pulsoweb_rate_{self.host}_slot_{index}" for index in range(ratelimit.MAX_CONCURRENT_PER_HOST)]
+        keys += [f"pulsoweb_rate_{self.host}_window_{int(NOW)}"]
+        self.addCleanup(cache.delete_many, keys)
+
+        patcher = mock.patch.object(ratelimit.time, "time", return_value=NOW)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def limiter(self):
+        return HostRateLimiter(self.host)
+
+    def test_the_limiter_is_keyed_by_host(self):
+        self.assertEqual(get_rate_limiter("https://tenant.pulsonic.com/rest").host, "tenant.pulsonic.com")
+
+    def test_calls_beyond_the_rate_wait_for_the_next_second(self):
+        cache.set(f"pulsoweb_rate_{self.host}_rate", 2)
+
+        waits = [self.limiter()._take_token() for _ in range(3)]
+
+        self.assertEqual(waits[:2], [0, 0])
+        self.assertAlmostEqual(waits[2], 0.75)
+
+    def test_slots_are_capped_and_freed(self):
+        with mock.patch.object(ratelimit, "MAX_CONCURRENT_PER_HOST", 2):
+            first, second, third = self.limiter(), self.limiter(), self.limiter()
+
+            self.assertEqual(first._try_acquire(), 0)
+            self.assertEqual(second._try_acquire(), 0)
+            self.assertEqual(third._try_acquire(), ratelimit.RATE_LIMIT_POLL)
+
+            first.release()
+
+            self.assertEqual(third._try_acquire(), 0)
+
+    def test_a_slot_taken_over_after_its_lease_is_not_released(self):
+        limiter = self.limiter()
+        limiter.acquire()
+        slot_key, _ = limiter._slot
+
+        # Our lease ran out, and another worker took the slot.
+        cache.set(slot_key, "another-worker")
+        limiter.release()
+
+        self.assertEqual(cache.get(slot_key), "another-worker")
+
+    def test_a_throttle_halves_the_rate_and_honours_retry_after(self):
+        limiter = self.limiter()
+        limiter.record(response(429, **{"Retry-After": "5"}))
+
+        self.assertEqual(limiter.rate(), ratelimit.RATE_LIMIT_PER_SECOND // 2)
+        self.assertAlmostEqual(limiter._take_token(), 5)
+
+    def test_the_rate_never_falls_below_the_minimum(self):
+        limiter = self.limiter()
+
+        for _ in range(10):
+            limiter.record(response(503))
+
+        self.assertEqual(limiter.rate(), ratelimit.RATE_LIMIT_MIN)
+
+    def test_accepted_calls_raise_the_rate_one_step_per_interval(self):
+        limiter = self.limiter()
+
+        for _ in range(5):
+            limiter.record(response(200))
+
+        self.assertEqual(limiter.rate(), ratelimit.RATE_LIMIT_PER_SECOND + 1)
+
+    def test_other_errors_leave_the_rate_alone(self):
+        limiter = self.limiter()
+        limiter.record(response(401))
+
+        self.assertEqual(limiter.rate(), ratelimit.RATE_LIMIT_PER_SECOND)
+
+    @override_settings(ADL_PULSOWEB_RATE_LIMIT=3, ADL_PULSOWEB_MAX_CONCURRENT_PER_HOST=1,
+                       ADL_PULSOWEB_THROTTLE_STATUSES=[429])
+    def test_a_tenants_quota_is_set_in_settings(self):
+        first, second = self.limiter(), self.limiter()
+
+        self.assertEqual(first.rate(), 3)
+        self.assertEqual(first._try_acquire(), 0)
+        self.assertEqual(second._try_acquire(), ratelimit.RATE_LIMIT_POLL)
+
+        first.record(response(503))
+
+        self.assertEqual(first.rate(), 3)
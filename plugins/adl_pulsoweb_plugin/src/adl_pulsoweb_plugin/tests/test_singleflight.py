@@ -0,0 +1,181 @@
+"""
+Tests for the single-flight layer around get_data: identical calls in flight
+at once make one call to the source. No database; calls are mocks, and other
+workers are played by writing their lease and result to the cache directly.
+"""
+
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from adl_pulsoweb_plugin import client, singleflight
+from adl_pulsoweb_plugin.singleflight import flight_key, single_flight
+
+PAYLOAD = {"station": 5, "observations": ["TEMP", "RH"], "from": "2026-01-01T00:00:00",
+           "to": "2026-01-02T00:00:00"}
+
+KEY = flight_key(41, "get_data", PAYLOAD)
+
+
+class FlightKeyTests(SimpleTestCase):
+
+    def test_observation_order_does_not_matter(self):
+        self.assertEqual(KEY, flight_key(41, "get_data", {**PAYLOAD, "observations": ["RH", "TEMP"]}))
+
+    def test_the_window_and_the_connection_do(self):
+        self.assertNotEqual(KEY, flight_key(41, "get_data", {**PAYLOAD, "to": "2026-01-03T00:00:00"}))
+        self.assertNotEqual(KEY, flight_key(42, "get_data", PAYLOAD))
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def setUp(self):
+        self.addCleanup(cache.delete_many, [singleflight._lock_key(KEY), singleflight._result_key(KEY),
+                                            singleflight._waiters_key(KEY, "another-worker")])
+
+        patcher = mock.patch.object(singleflight, "SINGLE_FLIGHT_POLL", 0.01)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_concurrently(self, call, callers=4):
+        """Starts `callers` threads on KEY while the first call is held open,
+        and returns what each got back."""
+
+        release = threading.Event()
+        entered = threading.Event()
+
+        def held():
+            entered.set()
+            release.wait(5)
+            return call()
+
+        outcomes = []
+
+        def caller():
+            try:
+                outcomes.append(single_flight(KEY, held))
+            except Exception as e:
+                outcomes.append(e)
+
+        threads = [threading.Thread(target=caller) for _ in range(callers)]
+        threads[0].start()
+        entered.wait(5)
+
+        for thread in threads[1:]:
+            thread.start()
+
+        # Time for every follower to join the flight before the leader
+        # returns.
+        time.sleep(0.1)
+
+        release.set()
+
+        for thread in threads:
+            thread.join(5)
+
+        return outcomes
+
+    def test_concurrent_callers_share_one_call_and_one_result(self):
+        result = ([{"observation_time": "t"}], 1)
+        call = mock.Mock(return_value=result)
+
+        outcomes = self.run_concurrently(call)
+
+        call.assert_called_once_with()
+        self.assertEqual(len(outcomes), 4)
+        for outcome in outcomes:
+            self.assertIs(outcome, result)
+
+    def test_concurrent_callers_share_the_failure(self):
+        call = mock.Mock(side_effect=ValueError("bad body"))
+
+        outcomes = self.run_concurrently(call)
+
+        call.assert_called_once_with()
+        self.assertTrue(all(isinstance(outcome, ValueError) for outcome in outcomes))
+
+    def test_a_call_after_the_flight_is_made_again(self):
+        call = mock.Mock(return_value="result")
+
+        single_flight(KEY, call)
+        single_flight(KEY, call)
+
+        self.assertEqual(call.call_count, 2)
+
+    def test_another_workers_call_is_waited_for(self):
+        cache.add(singleflight._lock_key(KEY), "another-worker", 60)
+        call = mock.Mock(return_value="ours")
+
+        def another_worker_finishes():
+            # It stores the result only because we registered.
+            self.assertEqual(cache.get(singleflight._waiters_key(KEY, "another-worker")), 1)
+            cache.set(singleflight._result_key(KEY), ("another-worker", "theirs"), 30)
+            cache.delete(singleflight._lock_key(KEY))
+
+        timer = threading.Timer(0.05, another_worker_finishes)
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+        self.assertEqual(single_flight(KEY, call), "theirs")
+        call.assert_not_called()
+
+    def test_an_earlier_calls_result_is_not_taken(self):
+        cache.set(singleflight._result_key(KEY), ("an-earlier-worker", "old"), 30)
+        cache.add(singleflight._lock_key(KEY), "another-worker", 60)
+        call = mock.Mock(return_value="ours")
+
+        timer = threading.Timer(0.05, cache.delete, [singleflight._lock_key(KEY)])
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+        self.assertEqual(single_flight(KEY, call), "ours")
+
+    def test_a_result_nobody_waits_for_is_not_stored(self):
+        with mock.patch.object(singleflight, "cache") as shared:
+            shared.add.return_value = True
+            shared.get.return_value = None
+
+            self.assertEqual(single_flight(KEY, lambda: "ours"), "ours")
+
+        shared.set.assert_not_called()
+
+    def test_a_failed_worker_is_not_waited_on(self):
+        cache.add(singleflight._lock_key(KEY), "another-worker", 60)
+        call = mock.Mock(return_value="ours")
+
+        # The other worker's call failed: it released the lease and stored
+        # nothing.
+        timer = threading.Timer(0.05, cache.delete, [singleflight._lock_key(KEY)])
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+        self.assertEqual(single_flight(KEY, call), "ours")
+        call.assert_called_once_with()
+
+    def test_unshared_flights_never_touch_the_cache(self):
+        cache.add(singleflight._lock_key(KEY), "another-worker", 60)
+
+        with mock.patch.object(singleflight, "cache") as shared:
+            self.assertEqual(single_flight(KEY, lambda: "ours", shared=False), "ours")
+
+        self.assertEqual(shared.mock_calls, [])
+
+
+class SharedRowsTests(SimpleTestCase):
+
+    def test_callers_sharing_a_flight_get_rows_of_their_own(self):
+        shared = ([{"observation_time": "2026-01-01T00:00:00", "TEMP": 1.0}], 1)
+        pulsoweb_client = client.PulsoWebClient("https://app.pulsonic.com/rest", "a-token", 41, use_cache=False)
+
+        # Every call joins the one flight, and is handed its result.
+        with mock.patch.object(client, "single_flight", return_value=shared):
+            first, _ = pulsoweb_client.get_observation_data(5, ["TEMP"], "from", "to")
+            second, _ = pulsoweb_client.get_observation_data(5, ["TEMP"], "from", "to")
+
+        first[0]["TEMP"] = 99.0
+
+        self.assertEqual(second[0]["TEMP"], 1.0)
+        self.assertEqual(shared[0][0]["TEMP"], 1.0)
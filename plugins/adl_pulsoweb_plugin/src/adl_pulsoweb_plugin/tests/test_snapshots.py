@@ -0,0 +1,47 @@
+"""
+Tests for the rows a context snapshot is built from. The rows are compared
+with what the context's own helpers return, which the admin pages showed
+before they read the snapshot. Unsaved rows only: no database.
+"""
+
+from django.test import SimpleTestCase
+
+from adl_pulsoweb_plugin.context import PulsoWebContext
+from adl_pulsoweb_plugin.snapshots import build_snapshot_rows, snapshot_fingerprint
+
+from .test_context import RAW_CONTEXT
+
+
+class SnapshotRowsTests(SimpleTestCase):
+
+    def setUp(self):
+        self.context = PulsoWebContext(RAW_CONTEXT)
+        self.granularities, self.observations, self.stations = build_snapshot_rows(self.context)
+
+    def test_granularities_keep_the_source_order(self):
+        self.assertEqual([(g.code, g.label, g.description) for g in self.granularities],
+                         [("1", "10 minutes", ""), ("2", "Hourly", "")])
+
+    def test_observations_carry_their_station_counts(self):
+        for gran_code in ("1", "2"):
+            rows = sorted((obs for obs in self.observations if obs.granularity_code == gran_code),
+                          key=lambda obs: (-obs.stations_count, obs.position))
+
+            self.assertEqual([(obs.code, obs.stations_count) for obs in rows],
+                             [(obs["code"], obs["stations_count"])
+                              for obs in self.context.get_observations_for_granular(gran_code)])
+
+    def test_stations_are_listed_per_observation(self):
+        for obs_code in ("TEMP", "RH", "PR"):
+            rows = [station for station in self.stations if station.observation_code == obs_code]
+
+            self.assertEqual([(station.code, station.name) for station in rows],
+                             [(str(station["code"]), station["name"])
+                              for station in self.context.get_stations_with_obs(obs_code)])
+
+    def test_the_fingerprint_ignores_order(self):
+        reordered = {name: list(reversed(section)) for name, section in RAW_CONTEXT.items()}
+
+        self.assertEqual(snapshot_fingerprint(reordered), snapshot_fingerprint(RAW_CONTEXT))
+        self.assertNotEqual(snapshot_fingerprint({**RAW_CONTEXT, "granularities": []}),
+                            snapshot_fingerprint(RAW_CONTEXT))
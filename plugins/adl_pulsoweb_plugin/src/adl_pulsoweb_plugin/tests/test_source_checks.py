@@ -24,7 +24,8 @@ import requests
 from adl.core.source_checks import SourceCheckStatus
 from django.test import SimpleTestCase
 
-from adl_pulsoweb_plugin.client import PulsoWebClient
+from adl_pulsoweb_plugin.client import PulsoWebClient, close_sessions, get_session
+from adl_pulsoweb_plugin.context import PulsoWebContext
 from adl_pulsoweb_plugin.models import PulsoWebConnection, PulsoWebStationLink
 from adl_pulsoweb_plugin.plugins import PulsoWebPlugin
 
@@ -55,6 +56,12 @@ def stub_client(connection, **behaviour):
     return client, factory
 
 
+def indexed(stations):
+    """A stub get_indexed_context() answering with this station list."""
+
+    return mock.Mock(return_value=PulsoWebContext({"stations": stations}))
+
+
 def http_error(status_code):
     response = requests.Response()
     response.status_code = status_code
@@ -227,7 +234,7 @@ class CheckStationSourceTests(SimpleTestCase):
         # confident false PATH_NOT_FOUND for a station added upstream since.
         connection = make_connection()
         _, factory = stub_client(
-            connection, get_stations_metadata=mock.Mock(return_value=CONTEXT["stations"]))
+            connection, get_indexed_context=indexed(CONTEXT["stations"]))
 
         self.make_station_link(connection).check_station_source()
 
@@ -238,7 +245,7 @@ class CheckStationSourceTests(SimpleTestCase):
         # station ID belonging to a different site.
         connection = make_connection()
         stub_client(connection,
-                    get_stations_metadata=mock.Mock(return_value=CONTEXT["stations"]))
+                    get_indexed_context=indexed(CONTEXT["stations"]))
 
         result = self.make_station_link(connection).check_station_source()
 
@@ -250,7 +257,7 @@ class CheckStationSourceTests(SimpleTestCase):
     def test_present_station_without_a_label_still_reports_ok(self):
         connection = make_connection()
         stub_client(connection,
-                    get_stations_metadata=mock.Mock(return_value=[{"code": 5}]))
+                    get_indexed_context=indexed([{"code": 5}]))
 
         result = self.make_station_link(connection).check_station_source()
 
@@ -262,7 +269,7 @@ class CheckStationSourceTests(SimpleTestCase):
         # integer in others; the configured value is always an integer.
         connection = make_connection()
         stub_client(connection,
-                    get_stations_metadata=mock.Mock(return_value=[{"code": "5", "name": "Nairobi"}]))
+                    get_indexed_context=indexed([{"code": "5", "name": "Nairobi"}]))
 
         result = self.make_station_link(connection).check_station_source()
 
@@ -273,7 +280,7 @@ class CheckStationSourceTests(SimpleTestCase):
         # is not in it.
         connection = make_connection()
         stub_client(connection,
-                    get_stations_metadata=mock.Mock(return_value=CONTEXT["stations"]))
+                    get_indexed_context=indexed(CONTEXT["stations"]))
 
         result = self.make_station_link(connection, code=99).check_station_source()
 
@@ -291,7 +298,20 @@ class CheckStationSourceTests(SimpleTestCase):
             with self.subTest(error=type(error).__name__):
                 connection = make_connection()
                 stub_client(connection,
-                            get_stations_metadata=mock.Mock(side_effect=error))
+                            get_indexed_context=mock.Mock(side_effect=error))
+
+                result = self.make_station_link(connection).check_station_source()
+
+                self.assertEqual(result.status, SourceCheckStatus.FAILED)
+                self.assertIsNone(result.category)
+
+    def test_body_without_a_station_list_fails_without_claiming_absence(self):
+        # As check_source() judges the same body: no list was received, so
+        # none can prove this station absent from it.
+        for body in ({"error": "nope"}, ["not", "a", "context"]):
+            with self.subTest(body=body):
+                connection = make_connection()
+                stub_client(connection, get_indexed_context=mock.Mock(return_value=PulsoWebContext(body)))
 
                 result = self.make_station_link(connection).check_station_source()
 
@@ -301,7 +321,7 @@ class CheckStationSourceTests(SimpleTestCase):
     def test_message_reports_the_identifier_and_not_the_url(self):
         connection = make_connection()
         stub_client(connection,
-                    get_stations_metadata=mock.Mock(return_value=CONTEXT["stations"]))
+                    get_indexed_context=indexed(CONTEXT["stations"]))
 
         result = self.make_station_link(connection, code=99).check_station_source()
 
@@ -309,6 +329,73 @@ class CheckStationSourceTests(SimpleTestCase):
         self.assertNotIn("a-token", result.message)
 
 
+class CheckStationSourcesTests(SimpleTestCase):
+    """`check_station_sources()` checks many links of a connection from one
+    download of the station list."""
+
+    def make_station_links(self, connection, codes):
+        station_links = []
+
+        for code in codes:
+            station_link = PulsoWebStationLink(pulsoweb_station_code=code)
+            station_link.network_connection = connection
+            station_links.append(station_link)
+
+        return station_links
+
+    def test_one_uncached_download_answers_every_link(self):
+        connection = make_connection()
+        client, factory = stub_client(
+            connection, get_indexed_context=mock.Mock(return_value=PulsoWebContext(CONTEXT)))
+
+        results = connection.check_station_sources(self.make_station_links(connection, [5, 99, 5]))
+
+        factory.assert_called_once_with(use_cache=False, timeout=5, retries=0)
+        client.get_indexed_context.assert_called_once_with()
+        self.assertEqual([r.status for r in results],
+                         [SourceCheckStatus.OK, SourceCheckStatus.FAILED, SourceCheckStatus.OK])
+        self.assertEqual(results[1].category, "PATH_NOT_FOUND")
+        self.assertIn("Nairobi", results[0].message)
+
+    def test_results_match_the_single_check(self):
+        stations = [{"code": "5", "name": "Nairobi"}, {"code": 6}]
+        connection = make_connection()
+        stub_client(connection,
+                    get_indexed_context=indexed(stations))
+
+        station_links = self.make_station_links(connection, [5, 6, 7])
+        results = connection.check_station_sources(station_links)
+
+        def summary(result):
+            return result.status, result.category, str(result.message)
+
+        self.assertEqual([summary(r) for r in results],
+                         [summary(link.check_station_source()) for link in station_links])
+
+    def test_an_unreadable_list_fails_every_link_without_claiming_absence(self):
+        connection = make_connection()
+        stub_client(connection, get_indexed_context=mock.Mock(side_effect=requests.ReadTimeout("timed out")))
+
+        results = connection.check_station_sources(self.make_station_links(connection, [5, 6]))
+
+        self.assertEqual([(r.status, r.category) for r in results], [(SourceCheckStatus.FAILED, None)] * 2)
+
+    def test_a_body_without_a_station_list_fails_every_link_without_claiming_absence(self):
+        connection = make_connection()
+        stub_client(connection, get_indexed_context=mock.Mock(return_value=PulsoWebContext({"error": "nope"})))
+
+        results = connection.check_station_sources(self.make_station_links(connection, [5, 6]))
+
+        self.assertEqual([(r.status, r.category) for r in results], [(SourceCheckStatus.FAILED, None)] * 2)
+
+    def test_no_links_is_no_download(self):
+        connection = make_connection()
+        _, factory = stub_client(connection)
+
+        self.assertEqual(connection.check_station_sources([]), [])
+        factory.assert_not_called()
+
+
 class ClientTests(SimpleTestCase):
     """The client behaviour the checks and the classification rest on."""
 
@@ -327,7 +414,7 @@ class ClientTests(SimpleTestCase):
     def test_post_bounds_the_request(self):
         client = PulsoWebClient("https://app.pulsonic.com/rest", "a-token", 1)
 
-        with mock.patch("requests.post", return_value=self.make_response(body={})) as post:
+        with mock.patch.object(requests.Session, "post", return_value=self.make_response(body={})) as post:
             client.post("get_context")
 
         self.assertIsNotNone(post.call_args.kwargs["timeout"])
@@ -335,7 +422,7 @@ class ClientTests(SimpleTestCase):
     def test_post_raises_on_an_http_error(self):
         client = PulsoWebClient("https://app.pulsonic.com/rest", "a-token", 1)
 
-        with mock.patch("requests.post", return_value=self.make_response(401)):
+        with mock.patch.object(requests.Session, "post", return_value=self.make_response(401)):
             with self.assertRaises(requests.HTTPError):
                 client.post("get_context")
 
@@ -348,9 +435,8 @@ class ClientTests(SimpleTestCase):
         client = PulsoWebClient("https://app.pulsonic.com/rest", "a-token", 1,
                                 use_cache=False, timeout=5, retries=0)
 
-        with mock.patch("requests.Session") as session:
-            session.return_value.__enter__.return_value.post.return_value = \
-                self.make_response(body=CONTEXT)
+        with mock.patch.object(requests.Session, "post",
+                               return_value=self.make_response(body=CONTEXT)):
             context = client.get_context()
 
         self.assertEqual(context, CONTEXT)
@@ -364,13 +450,52 @@ class ClientTests(SimpleTestCase):
 
         client = PulsoWebClient("https://app.pulsonic.com/rest", "a-token", 2)
 
-        with mock.patch("requests.post", return_value=self.make_response(body=CONTEXT)) as post:
+        with mock.patch.object(requests.Session, "post", return_value=self.make_response(body=CONTEXT)) as post:
             client.get_context()
             client.get_context()
 
         self.assertEqual(post.call_count, 1)
 
 
+class SessionPoolTests(SimpleTestCase):
+    """Every client of a connection posts through one long-lived session, so
+    the handshake is paid once per process rather than once per call."""
+
+    def setUp(self):
+        self.addCleanup(close_sessions)
+
+    def test_clients_of_one_connection_share_a_session(self):
+        first = PulsoWebClient("https://app.pulsonic.com/rest", "a-token", 1)
+        second = PulsoWebClient("https://app.pulsonic.com/rest", "a-token", 1)
+
+        with mock.patch.object(requests.Session, "post", autospec=True,
+                               return_value=mock.Mock(status_code=200)) as post:
+            first.post("get_context")
+            second.post("get_context")
+
+        self.assertIs(post.call_args_list[0].args[0], post.call_args_list[1].args[0])
+
+    def test_a_check_does_not_share_the_ingestion_retry_policy(self):
+        ingestion = get_session(1, "https://app.pulsonic.com/rest")
+        check = get_session(1, "https://app.pulsonic.com/rest", retries=0)
+
+        self.assertIsNot(ingestion, check)
+
+    def test_changed_settings_close_and_replace_the_session(self):
+        old = get_session(1, "https://app.pulsonic.com/rest")
+
+        with mock.patch.object(old, "close") as close:
+            new = get_session(1, "https://other.example.org/rest")
+
+        self.assertIsNot(old, new)
+        close.assert_called_once_with()
+
+    def test_the_pool_is_sized_as_configured(self):
+        session = get_session(1, "https://app.pulsonic.com/rest", pool_maxsize=25)
+
+        self.assertEqual(session.get_adapter("https://app.pulsonic.com/")._pool_maxsize, 25)
+
+
 class ExceptionStampingTests(SimpleTestCase):
     """`post()` is the single boundary every call routes through, and the one
     place holding the status code, so it is where the stamp lives."""
@@ -382,7 +507,7 @@ class ExceptionStampingTests(SimpleTestCase):
         response.status_code = status_code
         response.raise_for_status.side_effect = http_error(status_code)
 
-        with mock.patch("requests.post", return_value=response):
+        with mock.patch.object(requests.Session, "post", return_value=response):
             with self.assertRaises(requests.HTTPError) as caught:
                 client.post("get_context")
 
@@ -422,7 +547,7 @@ class ExceptionStampingTests(SimpleTestCase):
             with self.subTest(error=type(error).__name__):
                 client = PulsoWebClient("https://app.pulsonic.com/rest", "a-token", 1)
 
-                with mock.patch("requests.post", side_effect=error):
+                with mock.patch.object(requests.Session, "post", side_effect=error):
                     with self.assertRaises(type(error)) as caught:
                         client.post("get_context")
 
@@ -441,16 +566,51 @@ class ConnectionStub:
     def __init__(self, client):
         self.client = client
         self.get_api_client = mock.Mock(return_value=client)
+        self.logs_cursor = None
+
+        # A context naming no station prunes nothing: every mapped code is
+        # requested, as before the context was consulted.
+        if isinstance(client, mock.Mock):
+            client.get_indexed_context.return_value = PulsoWebContext({})
+
+    def save_logs_cursor(self, cursor):
+        self.logs_cursor = cursor
+
+    def get_latest_observation_times(self, station_links):
+        self.latest_times_queries = getattr(self, "latest_times_queries", 0) + 1
+
+        return {station_link.station_id: station_link.latest_observation_time for station_link in station_links
+                if station_link.latest_observation_time is not None}
 
 
 class StationLinkStub:
     """A station link with no ORM behind it. Core re-initialises
-    `adl_sources_count` to None at the start of every run."""
+    `adl_sources_count` to None at the start of every run. The backfill
+    checkpoint is read by the model's own method, and saved to the stub's
+    attributes only, as is the latest saved observation time."""
+
+    get_backfill_resume_date = PulsoWebStationLink.get_backfill_resume_date
 
     def __init__(self, connection=None, code=5):
         self.network_connection = connection
         self.pulsoweb_station_code = code
+        self.station_id = code
+        self.timezone = datetime.timezone.utc
         self.adl_sources_count = None
+        self.backfill_start = None
+        self.backfill_end = None
+        self.backfill_cursor = None
+        self.checkpoints_saved = []
+        self.latest_observation_time = None
+
+    def save_backfill_checkpoint(self, start_date=None, end_date=None, cursor=None):
+        self.backfill_start = start_date
+        self.backfill_end = end_date
+        self.backfill_cursor = cursor
+        self.checkpoints_saved.append((start_date, end_date, cursor))
+
+    def get_latest_observation_time(self):
+        return self.latest_observation_time
 
 
 def observation_response(client, response):
@@ -569,8 +729,10 @@ class OlderCoreImportSafetyTests(SimpleTestCase):
     """
 
     # Every module this plugin ships. Extend it as the plugin grows more.
-    MODULES = ["models.py", "plugins.py", "client.py", "apps.py", "views.py",
-               "validators.py", "wagtail_hooks.py"]
+    MODULES = ["models.py", "plugins.py", "client.py", "async_client.py", "backfill.py",
+               "breaker.py", "changes.py", "columns.py", "context.py", "context_cache.py", "instrumentation.py",
+               "mappings.py", "ratelimit.py", "signals.py", "singleflight.py", "snapshots.py", "tasks.py", "units.py",
+               "apps.py", "views.py", "validators.py", "wagtail_hooks.py"]
 
     DENIED = "adl.core.source_checks"
 
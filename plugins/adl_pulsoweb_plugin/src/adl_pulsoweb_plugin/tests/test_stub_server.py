@@ -0,0 +1,84 @@
+"""
+Tests for the fake PulsoWeb server and the load harness driving the plugin
+against it. No database: the harness's connection and links are unsaved
+stand-ins, and the server listens on a free local port.
+"""
+
+import datetime
+
+import requests
+from django.test import SimpleTestCase
+
+from adl_pulsoweb_plugin.benchmarks.load import percentile, run_load
+from adl_pulsoweb_plugin.benchmarks.stub_server import Latency, StubConfig, StubPulsoWebServer
+from adl_pulsoweb_plugin.client import PulsoWebClient
+
+START = datetime.datetime(2026, 8, 19, 10, 0)
+END = datetime.datetime(2026, 8, 19, 12, 0)
+
+
+class StubServerTests(SimpleTestCase):
+
+    def client_for(self, server, token=None):
+        return PulsoWebClient(server.url, token or server.config.token, "stub-tests", use_cache=False)
+
+    def test_the_client_reads_what_the_server_serves(self):
+        with StubPulsoWebServer(StubConfig(stations=7, observations=4, granularities=2)) as server:
+            client = self.client_for(server)
+
+            self.assertEqual(len(client.get_context()["stations"]), 7)
+
+            records, sources_count = client.get_observation_data(5, ["OBS0001", "OBS0002"],
+                                                                 START.strftime("%Y-%m-%dT%H:%M:%S"),
+                                                                 END.strftime("%Y-%m-%dT%H:%M:%S"))
+
+        # Two hours of ten-minute items, for two observations.
+        self.assertEqual(sources_count, 24)
+        self.assertEqual(len(records), 12)
+
+    def test_a_wrong_key_is_refused(self):
+        with StubPulsoWebServer() as server:
+            with self.assertRaises(requests.HTTPError) as raised:
+                self.client_for(server, token="wrong").get_context()
+
+        self.assertEqual(raised.exception.adl_category, "AUTH_FAILED")
+
+    def test_injected_errors_reach_the_client(self):
+        with StubPulsoWebServer(StubConfig(errors={503: 1.0})) as server:
+            with self.assertRaises(requests.HTTPError) as raised:
+                self.client_for(server).get_context()
+
+            self.assertEqual(server.stats, {"get_context 503": 1})
+
+        self.assertEqual(raised.exception.response.status_code, 503)
+
+    def test_latency_specs_parse(self):
+        self.assertEqual(Latency.parse("fixed:0.1"), Latency("fixed", 0.1))
+        self.assertEqual(Latency.parse("lognormal:0.2,0.5"), Latency("lognormal", 0.2, 0.5))
+
+        with self.assertRaises(ValueError):
+            Latency.parse("gaussian:1")
+
+
+class LoadHarnessTests(SimpleTestCase):
+
+    def test_a_run_reports_every_link(self):
+        config = StubConfig(latency=Latency("fixed", 0.005), errors={500: 0.25}, seed=1)
+
+        with StubPulsoWebServer(config) as server:
+            report = run_load(server.url, config.token, ["OBS0001", "OBS0002"], links=12, workers=4,
+                              start_date=START, end_date=END, use_cache=False)
+
+        self.assertEqual(report.fetches, 12)
+        self.assertEqual(len(report.latencies), 12)
+        self.assertEqual(report.requests, 12)
+        self.assertEqual(report.failures, report.calls.get("get_data 500", 0))
+        self.assertGreaterEqual(report.latency(0.5), 0.005)
+        self.assertGreater(report.peak_rss_bytes, 0)
+
+    def test_percentiles_are_nearest_rank(self):
+        values = list(range(1, 101))
+
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertIsNone(percentile([], 0.5))
@@ -0,0 +1,148 @@
+"""
+Tests for converting fetched values to each ADL parameter's unit inside the
+plugin. No database: mappings are plain stand-ins carrying the unit symbols,
+and the client is a mock.
+"""
+
+import datetime
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from adl_pulsoweb_plugin.client import PulsoWebClient
+from adl_pulsoweb_plugin.columns import ObservationColumns
+from adl_pulsoweb_plugin.plugins import PulsoWebPlugin
+from adl_pulsoweb_plugin.singleflight import single_flight
+from adl_pulsoweb_plugin.units import Conversion, convert_columns, get_conversion, get_conversions
+
+from .test_source_checks import ConnectionStub, StationLinkStub
+
+
+def mapping(code, from_symbol, to_symbol):
+    return SimpleNamespace(pulsoweb_parameter_code=code,
+                           pulsoweb_parameter_unit=SimpleNamespace(symbol=from_symbol),
+                           adl_parameter=SimpleNamespace(unit=SimpleNamespace(symbol=to_symbol)))
+
+
+class ConversionTests(SimpleTestCase):
+
+    def test_affine_conversions_are_compiled(self):
+        conversion = get_conversion("degF", "degC")
+
+        self.assertAlmostEqual(conversion.apply(212.0), 100.0)
+        self.assertAlmostEqual(get_conversion("km/h", "m/s").apply(36.0), 10.0)
+
+    def test_nothing_to_do_or_nothing_possible_is_left_to_core(self):
+        self.assertIsNone(get_conversion("degC", "degC"))
+        self.assertIsNone(get_conversion("degC", "m/s"))
+        self.assertIsNone(get_conversion("not-a-unit", "degC"))
+        self.assertIsNone(get_conversion(None, "degC"))
+
+    def test_only_converted_mappings_are_listed(self):
+        conversions = get_conversions([mapping("TEMP", "degF", "degC"), mapping("RH", "percent", "percent")])
+
+        self.assertEqual(list(conversions), ["TEMP"])
+
+    def test_columns_convert_whole_and_keep_gaps(self):
+        columns = ObservationColumns.from_series([
+            ("TEMP", ["2026-01-01T00:00:00", "2026-01-01T01:00:00"], [10.0, None]),
+            ("RH", ["2026-01-01T00:00:00"], [50.0]),
+        ])
+
+        converted = convert_columns(columns, {"TEMP": Conversion(2.0, 1.0)})
+
+        self.assertEqual(converted.values["TEMP"][0], 21.0)
+        self.assertTrue(np.isnan(converted.values["TEMP"][1]))
+        self.assertEqual(converted.to_records()[1], {"observation_time": datetime.datetime(2026, 1, 1, 1),
+                                                     "TEMP": None})
+        self.assertEqual(converted.values["RH"][0], 50.0)
+
+    def test_the_columns_passed_in_are_left_alone(self):
+        columns = ObservationColumns.from_series([("TEMP", ["2026-01-01T00:00:00"], [10.0])])
+
+        convert_columns(columns, {"TEMP": Conversion(2.0, 1.0)})
+
+        self.assertEqual(columns.values["TEMP"][0], 10.0)
+
+
+class StationLinkWithMappings(StationLinkStub):
+
+    def get_variable_mappings(self):
+        return [mapping("TEMP", "degF", "degC"), mapping("RH", "percent", "percent")]
+
+
+class PluginConversionTests(SimpleTestCase):
+
+    RESPONSE = [("TEMP", ["2026-08-19T10:00:00"], [212.0]), ("RH", ["2026-08-19T10:00:00"], [60.0])]
+
+    def fetch(self):
+        client = mock.Mock(spec=PulsoWebClient)
+        client.get_observation_data.side_effect = lambda *args, columnar=False, **kwargs: (
+            ObservationColumns.from_series(self.RESPONSE), 2)
+
+        station_link = StationLinkWithMappings(ConnectionStub(client))
+        records = PulsoWebPlugin().get_station_data(station_link, datetime.datetime(2026, 8, 19, 10),
+                                                    datetime.datetime(2026, 8, 19, 11))
+
+        return client, records
+
+    @override_settings(ADL_PULSOWEB_CONVERT_UNITS=True)
+    def test_values_come_back_in_the_adl_unit(self):
+        client, records = self.fetch()
+
+        self.assertTrue(client.get_observation_data.call_args.kwargs["columnar"])
+        self.assertEqual(len(records), 1)
+        self.assertAlmostEqual(records[0]["TEMP"], 100.0)
+        self.assertEqual(records[0]["RH"], 60.0)
+
+    def test_off_by_default(self):
+        client = mock.Mock(spec=PulsoWebClient)
+        client.get_observation_data.return_value = ([], 0)
+
+        PulsoWebPlugin().get_station_data(StationLinkWithMappings(ConnectionStub(client)),
+                                          datetime.datetime(2026, 8, 19, 10), datetime.datetime(2026, 8, 19, 11))
+
+        self.assertFalse(client.get_observation_data.call_args.kwargs["columnar"])
+
+    @override_settings(ADL_PULSOWEB_CONVERT_UNITS=True)
+    def test_callers_sharing_a_flight_each_convert_once(self):
+        # Both stations ask for the same window at once, so single_flight
+        # hands both the one ObservationColumns the source call returned.
+        release = threading.Event()
+        entered = threading.Event()
+
+        def held():
+            entered.set()
+            release.wait(5)
+            return ObservationColumns.from_series(self.RESPONSE), 2
+
+        client = mock.Mock(spec=PulsoWebClient)
+        client.get_observation_data.side_effect = lambda *args, **kwargs: single_flight(
+            "test-units-shared-flight", held, shared=False)
+
+        outcomes = []
+
+        def caller():
+            outcomes.append(PulsoWebPlugin().get_station_data(
+                StationLinkWithMappings(ConnectionStub(client)), datetime.datetime(2026, 8, 19, 10),
+                datetime.datetime(2026, 8, 19, 11)))
+
+        threads = [threading.Thread(target=caller) for _ in range(2)]
+        threads[0].start()
+        entered.wait(5)
+        threads[1].start()
+
+        # Time for the second caller to join the flight before it lands.
+        time.sleep(0.1)
+        release.set()
+
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(outcomes), 2)
+        for records in outcomes:
+            self.assertAlmostEqual(records[0]["TEMP"], 100.0)
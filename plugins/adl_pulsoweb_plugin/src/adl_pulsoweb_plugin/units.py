@@ -0,0 +1,116 @@
+import functools
+import logging
+from typing import NamedTuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Whether get_station_data() converts values to each ADL parameter's unit
+# itself, a whole column at a time, rather than leaving core to convert them
+# one by one. Off by default. A Django setting of the same name says
+# otherwise.
+CONVERT_UNITS = False
+
+
+def convert_units_enabled():
+    return getattr(settings, "ADL_PULSOWEB_CONVERT_UNITS", CONVERT_UNITS)
+
+
+class Conversion(NamedTuple):
+    """An affine unit conversion: value * factor + offset."""
+
+    factor: float
+    offset: float
+
+    def apply(self, values):
+        # A NumPy array in, a NumPy array out: NaN stays NaN.
+        return values * self.factor + self.offset
+
+
+@functools.lru_cache(maxsize=None)
+def _registry():
+    # Lazy: pint is core's dependency, and only a converting run needs it.
+    import pint
+
+    return pint.UnitRegistry()
+
+
+@functools.lru_cache(maxsize=256)
+def get_conversion(from_symbol, to_symbol):
+    """
+    Returns the Conversion between two unit symbols, or None where there is
+    nothing to do or nothing that can be done here: the same unit, a unit
+    pint cannot parse, units of different dimensions, or a conversion that
+    is not affine. Core still converts what is left to it.
+    """
+
+    if not from_symbol or not to_symbol or from_symbol == to_symbol:
+        return None
+
+    try:
+        registry = _registry()
+
+        def to(value):
+            return registry.Quantity(value, from_symbol).to(to_symbol).magnitude
+
+        offset = to(0.0)
+        factor = to(1.0) - offset
+        check = to(100.0)
+    except Exception as e:
+        logger.warning(f"[ADL_PULSOWEB_PLUGIN] Cannot convert {from_symbol} to {to_symbol}: {e}. "
+                       f"Leaving it to core.")
+        return None
+
+    if abs(factor * 100.0 + offset - check) > 1e-9 * max(abs(check), 1.0):
+        logger.warning(f"[ADL_PULSOWEB_PLUGIN] {from_symbol} to {to_symbol} is not affine. Leaving it to core.")
+        return None
+
+    return Conversion(factor, offset)
+
+
+def _symbol(unit):
+    return getattr(unit, "symbol", None) if unit is not None else None
+
+
+def get_mapping_conversion(mapping):
+    """
+    The Conversion from a mapping's PulsoWeb unit to its ADL parameter's
+    unit, or None where the plugin leaves the values as the source sent them.
+    """
+
+    return get_conversion(_symbol(mapping.pulsoweb_parameter_unit), _symbol(mapping.adl_parameter.unit))
+
+
+def get_conversions(mappings):
+    """Returns observation code -> Conversion for the mappings the plugin converts."""
+
+    conversions = {}
+
+    for mapping in mappings:
+        conversion = get_mapping_conversion(mapping)
+
+        if conversion is not None:
+            conversions[mapping.pulsoweb_parameter_code] = conversion
+
+    return conversions
+
+
+def convert_columns(columns, conversions):
+    """
+    Returns a new ObservationColumns with the values converted: one array
+    operation per converted observation, whatever the length of the window.
+
+    The columns passed in are left as they are: single_flight hands the same
+    result to every caller sharing a flight, and each converts its own copy.
+    """
+
+    from .columns import ObservationColumns
+
+    values = {**columns.values}
+
+    for code, conversion in conversions.items():
+        if code in values:
+            values[code] = conversion.apply(values[code])
+
+    return ObservationColumns(columns.observation_time, values, columns.present)
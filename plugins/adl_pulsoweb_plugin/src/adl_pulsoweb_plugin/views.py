@@ -1,18 +1,39 @@
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
 from rest_framework.generics import get_object_or_404
 
-from .models import PulsoWebConnection
+from .instrumentation import PrometheusSink, get_sink
+from .models import PulsoWebConnection, PulsoWebContextSnapshot
+from .snapshots import schedule_snapshot_refresh
 
 
-def get_pulsoweb_granularities(request, connection_id):
+def _get_snapshot(connection_id):
+    """
+    The connection's context snapshot, or None where none has been taken
+    yet, in which case one is queued. The pages never call the API.
+    """
+
     conn = get_object_or_404(PulsoWebConnection, pk=connection_id)
 
-    client = conn.get_api_client()
+    snapshot = PulsoWebContextSnapshot.objects.filter(connection=conn).first()
+
+    if snapshot is None:
+        schedule_snapshot_refresh(conn.pk)
 
-    data = client.get_granularities()
+    return snapshot
+
+
+def get_pulsoweb_granularities(request, connection_id):
+    snapshot = _get_snapshot(connection_id)
+
+    data = snapshot.granularities.all() if snapshot else []
 
     context = {
         "connection_id": connection_id,
+        "snapshot": snapshot,
         "data": data
     }
 
@@ -20,17 +41,20 @@ def get_pulsoweb_granularities(request, connection_id):
 
 
 def get_pulsoweb_granularity_observations(request, connection_id, gran_code):
-    conn = get_object_or_404(PulsoWebConnection, pk=connection_id)
-
-    client = conn.get_api_client()
+    snapshot = _get_snapshot(connection_id)
 
-    gran = client.get_granularity_by_code(gran_code)
+    gran = None
+    data = []
 
-    data = client.get_observations_for_granular(gran_code)
+    if snapshot:
+        gran = snapshot.granularities.filter(code=gran_code).first()
+        # Most reported first; ties keep the source's order.
+        data = snapshot.observations.filter(granularity_code=gran_code).order_by("-stations_count", "position")
 
     context = {
         "gran": gran,
         "connection_id": connection_id,
+        "snapshot": snapshot,
         "data": data
     }
 
@@ -38,18 +62,53 @@ def get_pulsoweb_granularity_observations(request, connection_id, gran_code):
 
 
 def get_pulsoweb_stations_for_observation(request, connection_id, obs_code):
-    conn = get_object_or_404(PulsoWebConnection, pk=connection_id)
-
-    client = conn.get_api_client()
+    snapshot = _get_snapshot(connection_id)
 
-    observation = client.get_observation_by_code(obs_code)
+    observation = snapshot.observations.filter(code=obs_code).first() if snapshot else None
 
-    stations = client.get_stations_with_obs(obs_code)
+    stations = list(snapshot.observation_stations.filter(observation_code=obs_code)) if snapshot else []
 
     context = {
         "connection_id": connection_id,
+        "snapshot": snapshot,
         "obs": observation,
         "stations": stations
     }
 
     return render(request, template_name="adl_pulsoweb_plugin/stations_list.html", context=context)
+
+
+def _metrics_authorized(request):
+    token = getattr(settings, "ADL_PULSOWEB_METRICS_TOKEN", None)
+
+    if token:
+        scheme, _, given = request.headers.get("Authorization", "").partition(" ")
+
+        return scheme.lower() == "bearer" and hmac.compare_digest(given.strip().encode(), token.encode())
+
+    user = getattr(request, "user", None)
+
+    return bool(user is not None and user.is_authenticated and user.is_staff)
+
+
+def pulsoweb_metrics(request):
+    """
+    Every worker's measurements, in Prometheus' text format. Found only when
+    the prometheus sink is configured.
+
+    Served outside the admin, but not openly: a scraper sends the token set
+    as ADL_PULSOWEB_METRICS_TOKEN in an "Authorization: Bearer" header. With
+    no token set, only a signed-in staff user is served.
+    """
+
+    sink = get_sink(PrometheusSink)
+
+    if sink is None:
+        raise Http404
+
+    if not _metrics_authorized(request):
+        response = HttpResponse("Unauthorized", status=401, content_type="text/plain")
+        response["WWW-Authenticate"] = 'Bearer realm="pulsoweb-metrics"'
+        return response
+
+    return HttpResponse(sink.render(), content_type="text/plain; version=0.0.4; charset=utf-8")